@@ -45,13 +45,14 @@ from gwpy.segments import (SegmentList, Segment, DataQualityFlag)
 
 from . import (globalv, mode)
 from .data import (get_channel, add_timeseries, add_spectrogram,
-                   add_coherence_component_spectrogram)
-from .triggers import (EventTable, add_triggers)
+                   add_spectrogram_buffer,
+                   add_coherence_component_spectrogram, add_coherence_matrix,
+                   CoherenceMatrix, RunLengthSeries, SpectrumHistogram)
+from .triggers import (EventTable, EventRateCube, LoudestEvents,
+                       add_triggers)
 
 __author__ = 'Duncan Macleod <duncan.macleod@ligo.org>'
 
-re_rate = re.compile('_EVENT_RATE_')
-
 
 def write_data_archive(outfile, channels=True, timeseries=True,
                        spectrogram=True, segments=True, triggers=True):
@@ -72,7 +73,7 @@ def write_data_archive(outfile, channels=True, timeseries=True,
         include `DataQualityFlag` data in archive
 
     triggers : `bool`, optional
-        include `EventTable` data in archive
+        include `EventTable` data, and binned event counts, in archive
     """
     from h5py import File
 
@@ -102,14 +103,17 @@ def write_data_archive(outfile, channels=True, timeseries=True,
             if timeseries:
                 tgroup = h5file.create_group('timeseries')
                 sgroup = h5file.create_group('statevector')
+                rgroup = h5file.create_group('runlength')
                 # loop over channels
                 for c, tslist in globalv.DATA.items():
                     c = get_channel(c)
-                    # ignore trigger rate TimeSeries
-                    if re_rate.search(str(c)):
-                        continue
                     # loop over time-series
                     for ts in tslist:
+                        # archive compressed state data as is
+                        if isinstance(ts, RunLengthSeries):
+                            name = '%s,%s' % (ts.channel.ndsname, ts.t0.value)
+                            archive_runlength(ts, name, rgroup)
+                            continue
                         # ignore fast channels who weren't used
                         # for a timeseries:
                         if (not isinstance(ts, StateVector) and
@@ -142,6 +146,20 @@ def write_data_archive(outfile, channels=True, timeseries=True,
                             name = '%s,%s' % (key, spec.t0.value)
                             _write_object(spec, group, path=name,
                                           format='hdf5')
+                group = h5file.create_group('spectrogram-buffer')
+                for key, ts in globalv.SPECTROGRAM_BUFFERS.items():
+                    _write_object(ts, group, path=key, format='hdf5')
+                group = h5file.create_group('coherence-matrix')
+                for i, key in enumerate(globalv.COHERENCE_MATRIX):
+                    matrix = globalv.COHERENCE_MATRIX[key]
+                    if matrix.times.size:
+                        archive_coherence_matrix(matrix, key, group,
+                                                 name=str(i))
+                group = h5file.create_group('spectrum-histogram')
+                for i, key in enumerate(globalv.SPECTRUM_HISTOGRAMS):
+                    archive_spectrum_histogram(
+                        globalv.SPECTRUM_HISTOGRAMS[key], key, group,
+                        name=str(i))
 
             # -- segments -----------------------
 
@@ -156,7 +174,16 @@ def write_data_archive(outfile, channels=True, timeseries=True,
             if triggers:
                 group = h5file.create_group('triggers')
                 for key in globalv.TRIGGERS:
-                    archive_table(globalv.TRIGGERS[key], key, group)
+                    archive_table(globalv.TRIGGERS[key].table, key, group)
+                group = h5file.create_group('rates')
+                for i, key in enumerate(globalv.TRIGGER_RATES):
+                    archive_rates(globalv.TRIGGER_RATES[key], key, group,
+                                  name=str(i))
+                group = h5file.create_group('loudest')
+                for i, key in enumerate(globalv.TRIGGER_LOUDEST):
+                    loudest = globalv.TRIGGER_LOUDEST[key]
+                    if loudest.candidates is not None:
+                        archive_loudest(loudest, key, group, name=str(i))
 
     except Exception:  # if it fails for any reason, reinstate the backup
         if backup:
@@ -223,6 +250,9 @@ def read_data_archive(sourcefile):
             sv.channel = get_channel(sv.channel)
             add_timeseries(sv, key=sv.channel.ndsname)
 
+        for group in h5file.get('runlength', {}).values():
+            load_runlength(group)
+
         # -- spectrogram ------------------------
 
         for tag, add_ in zip(
@@ -234,6 +264,17 @@ def read_data_archive(sourcefile):
                 spec.channel = get_channel(spec.channel)
                 add_(spec, key=key)
 
+        for key, dataset in h5file.get('spectrogram-buffer', {}).items():
+            ts = TimeSeries.read(dataset, format='hdf5')
+            ts.channel = get_channel(ts.channel)
+            add_spectrogram_buffer(ts, key=key)
+
+        for group in h5file.get('coherence-matrix', {}).values():
+            load_coherence_matrix(group)
+
+        for group in h5file.get('spectrum-histogram', {}).values():
+            load_spectrum_histogram(group)
+
         # -- segments ---------------------------
 
         for name, dataset in h5file.get('segments', {}).items():
@@ -246,6 +287,12 @@ def read_data_archive(sourcefile):
         for dataset in h5file.get('triggers', {}).values():
             load_table(dataset)
 
+        for dataset in h5file.get('rates', {}).values():
+            load_rates(dataset)
+
+        for dataset in h5file.get('loudest', {}).values():
+            load_loudest(dataset)
+
 
 def backup_existing_archive(filename, suffix='.h5',
                             prefix='gw_summary_archive_', dir=None):
@@ -374,5 +421,324 @@ def load_table(dataset):
         table.meta['segments'] = segments_from_array(table.meta['segments'])
     except KeyError:
         table.meta['segments'] = SegmentList()
+    if 'columns' in table.meta:  # columns that were read
+        table.meta['columns'] = [
+            c.decode('utf-8') if isinstance(c, bytes) else str(c) for
+            c in table.meta['columns']]
     add_triggers(table, dataset.name.split('/')[-1])
     return table
+
+
+def archive_rates(cube, key, parent, name=None):
+    """Add an `~gwsumm.triggers.EventRateCube` to the given HDF5 group
+
+    Parameters
+    ----------
+    cube : `~gwsumm.triggers.EventRateCube`
+        the event counts to archive
+
+    key : `str`
+        the key of these counts in `globalv.TRIGGER_RATES`
+
+    parent : `h5py.Group`
+        the h5py group in which to add this dataset
+
+    name : `str`, optional
+        the name of the new dataset, defaults to ``key``
+
+    Returns
+    -------
+    dataset : `h5py.Dataset`
+        the new dataset containing the counts
+    """
+    dataset = parent.create_dataset(name or key, data=cube.counts)
+    dataset.attrs['key'] = key
+    dataset.attrs['t0'] = cube.t0
+    dataset.attrs['stride'] = cube.stride
+    dataset.attrs['segments'] = segments_to_array(cube.segments)
+    return dataset
+
+
+def load_rates(dataset):
+    """Read an `~gwsumm.triggers.EventRateCube` from the given HDF5 dataset
+
+    The counts are read, stored in the memory archive, then returned
+
+    Parameters
+    ----------
+    dataset : `h5py.Dataset`
+        the dataset containing the counts to load
+
+    Returns
+    -------
+    cube : `~gwsumm.triggers.EventRateCube`
+        the event counts loaded from HDF5
+    """
+    attrs = dataset.attrs
+    cube = EventRateCube(dataset[()], attrs['t0'], attrs['stride'],
+                         segments=segments_from_array(attrs['segments']))
+    globalv.TRIGGER_RATES[str(attrs['key'])] = cube
+    return cube
+
+
+def archive_loudest(loudest, key, parent, name=None):
+    """Add a `~gwsumm.triggers.LoudestEvents` to the given HDF5 group
+
+    .. warning::
+
+       If there are no candidate events, they will not be archived
+
+    Parameters
+    ----------
+    loudest : `~gwsumm.triggers.LoudestEvents`
+        the candidate loudest events to archive
+
+    key : `str`
+        the key of these events in `globalv.TRIGGER_LOUDEST`
+
+    parent : `h5py.Group`
+        the h5py group in which to add this dataset
+
+    name : `str`, optional
+        the name of the new dataset, defaults to ``key``
+    """
+    table = loudest.candidates.copy(copy_data=False)
+    table.meta = dict(table.meta)
+    table.meta.update(key=key, rank=loudest.rank, n=loudest.n,
+                      dt=loudest.dt, threshold=loudest.threshold,
+                      complete=loudest.complete, segments=loudest.segments)
+    return archive_table(table, name or key, parent)
+
+
+def load_loudest(dataset):
+    """Read a `~gwsumm.triggers.LoudestEvents` from the given HDF5 dataset
+
+    The events are read, stored in the memory archive, then returned
+
+    Parameters
+    ----------
+    dataset : `h5py.Dataset`
+        the dataset containing the candidate events to load
+
+    Returns
+    -------
+    loudest : `~gwsumm.triggers.LoudestEvents`
+        the candidate loudest events loaded from HDF5
+    """
+    table = EventTable.read(dataset, format='hdf5')
+    meta = table.meta
+    loudest = LoudestEvents(
+        str(meta.pop('rank')), meta.pop('n'), dt=meta.pop('dt'),
+        candidates=table,
+        segments=segments_from_array(meta.pop('segments')),
+        threshold=meta.pop('threshold'), complete=meta.pop('complete'))
+    globalv.TRIGGER_LOUDEST[str(meta.pop('key'))] = loudest
+    return loudest
+
+
+def archive_runlength(series, key, parent):
+    """Add a `~gwsumm.data.RunLengthSeries` to the given HDF5 group
+
+    Parameters
+    ----------
+    series : `~gwsumm.data.RunLengthSeries`
+        the data to archive
+
+    key : `str`
+        the path (relative to ``parent``) at which to store the series
+
+    parent : `h5py.Group`
+        the h5py group in which to add this series
+
+    Returns
+    -------
+    group : `h5py.Group`
+        the new group containing the runs
+    """
+    group = parent.create_group(key)
+    for attr in ('values', 'starts', 'lengths'):
+        group.create_dataset(attr, data=getattr(series, attr))
+    group.attrs['t0'] = series.t0.value
+    group.attrs['dt'] = series.dt.value
+    group.attrs['series_class'] = series.series_class.__name__
+    group.attrs['channel'] = series.channel.ndsname
+    for attr in ('name', 'unit'):
+        if getattr(series, attr) is not None:
+            group.attrs[attr] = str(getattr(series, attr))
+    if series.bits is not None:
+        group.attrs['bits'] = [str(b) if b else '' for b in series.bits]
+    return group
+
+
+def load_runlength(group):
+    """Read a `~gwsumm.data.RunLengthSeries` from the given HDF5 group
+
+    The series is read, stored in the memory archive, then returned
+
+    Parameters
+    ----------
+    group : `h5py.Group`
+        the group containing the runs to load
+
+    Returns
+    -------
+    series : `~gwsumm.data.RunLengthSeries`
+        the series loaded from HDF5
+    """
+    attrs = group.attrs
+    if attrs['series_class'] == StateVector.__name__:
+        series_class = StateVector
+    else:
+        series_class = TimeSeries
+    try:
+        bits = [b or None for b in map(str, attrs['bits'])]
+    except KeyError:
+        bits = None
+    series = RunLengthSeries(
+        group['values'][()], group['starts'][()], group['lengths'][()],
+        attrs['t0'], attrs['dt'], series_class=series_class,
+        name=attrs.get('name', None), unit=attrs.get('unit', None),
+        channel=get_channel(attrs['channel']), bits=bits)
+    add_timeseries(series, key=series.channel.ndsname)
+    return series
+
+
+def archive_spectrum_histogram(hist, key, parent, name=None):
+    """Add a `~gwsumm.data.SpectrumHistogram` to the given HDF5 group
+
+    Parameters
+    ----------
+    hist : `~gwsumm.data.SpectrumHistogram`
+        the histogram to archive
+
+    key : `str`
+        the key of this histogram in `globalv.SPECTRUM_HISTOGRAMS`
+
+    parent : `h5py.Group`
+        the h5py group in which to add this histogram
+
+    name : `str`, optional
+        the name of the new group, defaults to ``key``
+
+    Returns
+    -------
+    group : `h5py.Group`
+        the new group containing the counts
+    """
+    group = parent.create_group(name or key)
+    for attr in ('frequencies', 'counts', 'offset', 'zeros'):
+        group.create_dataset(attr, data=getattr(hist, attr))
+    group.attrs['key'] = key
+    group.attrs['resolution'] = hist.resolution
+    group.attrs['segments'] = segments_to_array(hist.segments)
+    if hist.channel is not None:
+        group.attrs['channel'] = get_channel(hist.channel).ndsname
+    if hist.epoch is not None:
+        group.attrs['epoch'] = hist.epoch
+    for attr in ('name', 'unit'):
+        if getattr(hist, attr) is not None:
+            group.attrs[attr] = str(getattr(hist, attr))
+    return group
+
+
+def load_spectrum_histogram(group):
+    """Read a `~gwsumm.data.SpectrumHistogram` from the given HDF5 group
+
+    The histogram is read, then merged with any histogram for the same key
+    already in the memory archive (e.g. from another daily archive), and
+    returned
+
+    Parameters
+    ----------
+    group : `h5py.Group`
+        the group containing the counts to load
+
+    Returns
+    -------
+    hist : `~gwsumm.data.SpectrumHistogram`
+        the histogram loaded from HDF5
+    """
+    attrs = group.attrs
+    try:
+        channel = get_channel(attrs['channel'])
+    except KeyError:
+        channel = None
+    hist = SpectrumHistogram(
+        group['frequencies'][()], counts=group['counts'][()],
+        offset=group['offset'][()], zeros=group['zeros'][()],
+        resolution=attrs['resolution'],
+        segments=segments_from_array(attrs['segments']),
+        name=attrs.get('name', None), unit=attrs.get('unit', None),
+        epoch=attrs.get('epoch', None), channel=channel)
+    key = str(attrs['key'])
+    try:
+        existing = globalv.SPECTRUM_HISTOGRAMS[key]
+    except KeyError:
+        globalv.SPECTRUM_HISTOGRAMS[key] = hist
+    else:
+        if not existing.merge(hist):
+            warnings.warn("Cannot merge archived %r spectrum histogram, "
+                          "ignoring" % key)
+    return hist
+
+
+def archive_coherence_matrix(matrix, key, parent, name=None):
+    """Add a `~gwsumm.data.CoherenceMatrix` to the given HDF5 group
+
+    Parameters
+    ----------
+    matrix : `~gwsumm.data.CoherenceMatrix`
+        the coherence matrix to archive
+
+    key : `str`
+        the key of this matrix in `globalv.COHERENCE_MATRIX`
+
+    parent : `h5py.Group`
+        the h5py group in which to add this matrix
+
+    name : `str`, optional
+        the name of the new group, defaults to ``key``
+
+    Returns
+    -------
+    group : `h5py.Group`
+        the new group containing the coherence
+    """
+    group = parent.create_group(name or key)
+    for attr in ('value', 'times', 'frequencies'):
+        group.create_dataset(attr, data=getattr(matrix, attr))
+    group.attrs['key'] = key
+    group.attrs['dt'] = matrix.dt
+    group.attrs['channels'] = [c.ndsname for c in matrix.channels]
+    segments = group.create_group('segments')
+    for i, segs in enumerate(matrix.segments):
+        segments.create_dataset(str(i), data=segments_to_array(segs))
+    return group
+
+
+def load_coherence_matrix(group):
+    """Read a `~gwsumm.data.CoherenceMatrix` from the given HDF5 group
+
+    The matrix is read, then merged with any matrix for the same key
+    already in the memory archive (e.g. from another daily archive), and
+    returned
+
+    Parameters
+    ----------
+    group : `h5py.Group`
+        the group containing the coherence to load
+
+    Returns
+    -------
+    matrix : `~gwsumm.data.CoherenceMatrix`
+        the coherence matrix in memory for this key
+    """
+    attrs = group.attrs
+    channels = [c.decode('utf-8') if isinstance(c, bytes) else str(c) for
+                c in attrs['channels']]
+    matrix = CoherenceMatrix(
+        group['value'][()], group['times'][()], group['frequencies'][()],
+        attrs['dt'], channels,
+        segments=[segments_from_array(group['segments'][str(i)][()]) for
+                  i in range(len(channels) - 1)])
+    return add_coherence_matrix(matrix, key=str(attrs['key']))
@@ -23,24 +23,25 @@ from __future__ import division
 
 import operator
 import warnings
-from collections import OrderedDict
+from collections import (Counter, OrderedDict)
 
-from six import string_types
 from six.moves import (reduce, zip_longest)
 
 import numpy
 
 from astropy import units
 
-from gwpy.segments import (DataQualityFlag, SegmentList, Segment)
+from gwpy.segments import (DataQualityFlag, Segment, SegmentList)
 from gwpy.frequencyseries import FrequencySeries
 from gwpy.spectrogram import SpectrogramList
 
 from .. import globalv
-from ..utils import (vprint, safe_eval)
+from ..utils import vprint
 from ..channels import get_channel
 from .utils import (use_segmentlist, get_fftparams, make_globalv_key)
 from .timeseries import (get_timeseries, get_timeseries_dict)
+from .spectral import (stft_spectrogram, get_fft_frames, _stft_params,
+                       _average_frames)
 
 __author__ = 'Duncan Macleod <duncan.macleod@ligo.org>'
 
@@ -71,7 +72,7 @@ def _get_coherence_spectrogram(channel_pair, segments, config=None,
                                cache=None, query=True, nds=None,
                                return_=True, frametype=None, nproc=1,
                                datafind_error='raise', return_components=False,
-                               **fftparams):
+                               resampled=None, **fftparams):
 
     channel1 = get_channel(channel_pair[0])
     channel2 = get_channel(channel_pair[1])
@@ -83,21 +84,10 @@ def _get_coherence_spectrogram(channel_pair, segments, config=None,
     # key used to store the coherence spectrogram in globalv
     key = make_globalv_key(channel_pair, fftparams)
 
-    # keys used to store component spectrograms in globalv
-    components = ('Cxy', 'Cxx', 'Cyy')
-    ckeys = [
-        make_globalv_key([channel1, channel2], fftparams),
-        make_globalv_key(channel1, fftparams),
-        make_globalv_key(channel2, fftparams),
-    ]
-
-    # convert fftparams to regular dict
-    fftparams = fftparams.dict()
-
     # work out what new segments are needed
     # need to truncate to segments of integer numbers of strides
-    stride = float(fftparams.pop('stride'))
-    overlap = float(fftparams['overlap'])
+    stride = float(fftparams.stride)
+    overlap = float(fftparams.overlap)
     new = type(segments)()
     for seg in segments - globalv.SPECTROGRAMS.get(
             key, SpectrogramList()).segments:
@@ -106,35 +96,42 @@ def _get_coherence_spectrogram(channel_pair, segments, config=None,
             continue
         new.append(type(seg)(seg[0], seg[0]+dur))
 
-    # extract FFT params for TimeSeries.spectrogram
-    spec_fftparams = fftparams.copy()
-    for fftkey in ('method', 'scheme',):
-        fftparams.pop(fftkey, None)
-
     # if there are no existing spectrogram, initialize as a list
     globalv.SPECTROGRAMS.setdefault(key, SpectrogramList())
 
-    # XXX HACK: use dummy timeseries to find lower sampling rate
-    if len(segments) > 0:
-        s = segments[0].start
-        dts1 = get_timeseries(channel1, SegmentList([Segment(s, s+1)]),
-                              config=config, cache=cache, frametype=frametype,
-                              nproc=nproc, query=query,
-                              datafind_error=datafind_error, nds=nds)
-        dts2 = get_timeseries(channel2, SegmentList([Segment(s, s+1)]),
-                              config=config, cache=cache, frametype=frametype,
-                              nproc=nproc, query=query,
-                              datafind_error=datafind_error, nds=nds)
-        sampling = min(dts1[0].sample_rate.value, dts2[0].sample_rate.value)
-    else:
-        sampling = None
+    # get data if query=True or if there are new segments
+    query &= abs(new) != 0
+
+    # find the lower sampling rate of the two channels, reading the data
+    # if it isn't already known
+    dataargs = {'config': config, 'cache': cache, 'frametype': frametype,
+                'nproc': nproc, 'query': query,
+                'datafind_error': datafind_error, 'nds': nds}
+    sampling = get_coherence_sample_rate(channel1, channel2)
+    if sampling is None and query:
+        get_timeseries_dict([channel1, channel2], new, return_=False,
+                            **dataargs)
+        sampling = get_coherence_sample_rate(channel1, channel2)
+    query &= sampling is not None
+
+    # keys used to store component spectrograms in globalv, the
+    # auto-spectra are shared by all pairs with the same sampling rate
+    components = ('Cxy', 'Cxx', 'Cyy')
+    ckeys = get_coherence_component_keys(channel1, channel2, fftparams,
+                                         sampling)
 
     # initialize component lists if they don't exist yet
     for ck in ckeys:
         globalv.COHERENCE_COMPONENTS.setdefault(ck, SpectrogramList())
 
-    # get data if query=True or if there are new segments
-    query &= abs(new) != 0
+    # convert fftparams to regular dict
+    fftparams = fftparams.dict()
+    fftparams.pop('stride')
+
+    # extract FFT params for TimeSeries.spectrogram
+    spec_fftparams = fftparams.copy()
+    for fftkey in ('method', 'scheme',):
+        fftparams.pop(fftkey, None)
 
     if query:
 
@@ -142,106 +139,67 @@ def _get_coherence_spectrogram(channel_pair, segments, config=None,
         intersection = None
 
         # loop over components needed to calculate coherence
-        for comp in components:
-
-            # key used to store this component in globalv (incl sample rate)
-            ckey = ckeys[components.index(comp)]
-
-            try:
-                filter_ = channel1.frequency_response
-            except AttributeError:
-                filter_ = None
-            else:
-                if isinstance(filter_, string_types):
-                    filter_ = safe_eval(filter_, strict=True)
+        for comp, ckey in zip(components, ckeys):
 
             # check how much of this component still needs to be calculated
             req = new - globalv.COHERENCE_COMPONENTS.get(
                             ckey, SpectrogramList()).segments
 
             # get data if there are new segments
-            if abs(req) != 0:
-
-                # calculate intersection of segments lazily
-                # this should occur on first pass (Cxy)
-                if intersection is None:
-                    total1 = get_timeseries(
-                                 channel1, req, config=config,
-                                 cache=cache, frametype=frametype,
-                                 nproc=nproc, query=query,
-                                 datafind_error=datafind_error,
-                                 nds=nds)
-                    total2 = get_timeseries(
-                                 channel2, req, config=config,
-                                 cache=cache, frametype=frametype,
-                                 nproc=nproc, query=query,
-                                 datafind_error=datafind_error,
-                                 nds=nds)
-                    intersection = total1.segments & total2.segments
-
-                # get required timeseries data (using intersection)
-                tslist1, tslist2 = [], []
-                if comp in ('Cxy', 'Cxx'):
-                    tslist1 = get_timeseries(
-                                  channel1, intersection, config=config,
-                                  cache=cache, frametype=frametype,
-                                  nproc=nproc, query=query,
-                                  datafind_error=datafind_error,
-                                  nds=nds)
-                if comp in ('Cxy', 'Cyy'):
-                    tslist2 = get_timeseries(
-                                  channel2, intersection, config=config,
-                                  cache=cache, frametype=frametype,
-                                  nproc=nproc, query=query,
-                                  datafind_error=datafind_error,
-                                  nds=nds)
-
-                # calculate component
-                if len(tslist1) + len(tslist2):
-                    vprint("    Calculating component %s for coherence "
-                           "spectrogram for %s and %s @ %d Hz" % (
-                               comp, str(channel1), str(channel2), sampling))
-
-                for ts1, ts2 in zip_longest(tslist1, tslist2):
-
-                    # ensure there is enough data to do something with
-                    if comp in ('Cxx', 'Cxy') and abs(ts1.span) < stride:
-                        continue
-                    elif comp in ('Cyy', 'Cxy') and abs(ts2.span) < stride:
-                        continue
+            if abs(req) == 0:
+                continue
+
+            # calculate intersection of segments lazily
+            if intersection is None:
+                total1 = get_timeseries(channel1, new, **dataargs)
+                total2 = get_timeseries(channel2, new, **dataargs)
+                intersection = total1.segments & total2.segments
+
+            # get required timeseries data (using intersection),
+            # resampled to the common sampling rate
+            tslist1, tslist2 = [], []
+            if comp in ('Cxy', 'Cxx'):
+                tslist1 = _get_coherence_data(
+                    channel1, intersection & req, sampling,
+                    resampled=resampled, **dataargs)
+            if comp in ('Cxy', 'Cyy'):
+                tslist2 = _get_coherence_data(
+                    channel2, intersection & req, sampling,
+                    resampled=resampled, **dataargs)
+
+            # calculate component
+            if len(tslist1) + len(tslist2):
+                vprint("    Calculating component %s for coherence "
+                       "spectrogram for %s and %s @ %d Hz" % (
+                           comp, str(channel1), str(channel2), sampling))
+
+            for ts1, ts2 in zip_longest(tslist1, tslist2):
+
+                # ensure there is enough data to do something with
+                if comp in ('Cxx', 'Cxy') and abs(ts1.span) < stride:
+                    continue
+                elif comp in ('Cyy', 'Cxy') and abs(ts2.span) < stride:
+                    continue
+
+                # calculate the component spectrogram, the FFTs of each
+                # series are shared between components
+                if comp == 'Cxy':
+                    specgram = stft_spectrogram(
+                        ts1, stride, other=ts2, method='csd',
+                        nproc=nproc, **fftparams)
+                elif comp == 'Cxx':
+                    specgram = stft_spectrogram(ts1, stride, nproc=nproc,
+                                                **spec_fftparams)
+                elif comp == 'Cyy':
+                    specgram = stft_spectrogram(ts2, stride, nproc=nproc,
+                                                **spec_fftparams)
+
+                add_coherence_component_spectrogram(specgram, key=ckey)
 
-                    # downsample if necessary
-                    if ts1 is not None and ts1.sample_rate.value != sampling:
-                        ts1 = ts1.resample(sampling)
-                    if ts2 is not None and ts2.sample_rate.value != sampling:
-                        ts2 = ts2.resample(sampling)
-
-                    # ignore units when calculating coherence
-                    if ts1 is not None:
-                        ts1._unit = units.Unit('count')
-                    if ts2 is not None:
-                        ts2._unit = units.Unit('count')
-
-                    # calculate the component spectrogram
-                    if comp == 'Cxy':
-                        specgram = ts1.csd_spectrogram(
-                            ts2, stride, nproc=nproc, **fftparams)
-                    elif comp == 'Cxx':
-                        specgram = ts1.spectrogram(stride, nproc=nproc,
-                                                   **spec_fftparams)
-                    elif comp == 'Cyy':
-                        specgram = ts2.spectrogram(stride, nproc=nproc,
-                                                   **spec_fftparams)
-
-                    if filter_:
-                        specgram = (specgram**(1/2.)).filter(*filter_,
-                                                             inplace=True) ** 2
-                    add_coherence_component_spectrogram(specgram, key=ckey)
-
-                    vprint('.')
-
-                if len(tslist1) + len(tslist2):
-                    vprint('\n')
+                vprint('.')
+
+            if len(tslist1) + len(tslist2):
+                vprint('\n')
 
         # calculate coherence from the components and store in globalv
         for seg in new:
@@ -424,6 +382,26 @@ def get_coherence_spectrograms(channel_pairs, segments, config=None,
                             nproc=nproc, frametype=frametype,
                             datafind_error=datafind_error, nds=nds,
                             return_=False)
+        # calculate coherence for all pairs, resampling each channel only
+        # once for each sampling rate, and keeping the resampled data only
+        # as long as they are needed
+        rates = [get_coherence_sample_rate(c1, c2) for c1, c2 in pairs]
+        order = sorted(range(len(pairs)), key=lambda i: (
+            str(rates[i]), pairs[i][0].ndsname))
+        uses = Counter((c.ndsname, rates[i]) for i in order for
+                       c in pairs[i])
+        resampled = {}
+        for i in order:
+            _get_coherence_spectrogram(
+                pairs[i], segments, config=config, cache=cache,
+                query=query, nds=nds, return_=False, frametype=frametype,
+                nproc=nproc, datafind_error=datafind_error,
+                resampled=resampled, **fftparams)
+            for c in pairs[i]:
+                uses[(c.ndsname, rates[i])] -= 1
+                if not uses[(c.ndsname, rates[i])]:
+                    resampled.pop((c.ndsname, rates[i]), None)
+
     # loop over channels and generate spectrograms
     out = OrderedDict()
 
@@ -435,6 +413,374 @@ def get_coherence_spectrograms(channel_pairs, segments, config=None,
     return out
 
 
+def get_coherence_sample_rate(channel1, channel2):
+    """Return the sampling rate at which to calculate coherence
+
+    This is the lower sample rate of the data for the two channels, taken
+    from the data in memory, or, if no data have been read, from the
+    ``resample`` option or sample rate of each channel.
+
+    Returns
+    -------
+    rate : `float`
+        the sampling rate (Hz), or `None` if either sample rate is not known
+    """
+    rates = []
+    for channel in map(get_channel, (channel1, channel2)):
+        data = globalv.DATA.get(make_globalv_key(channel))
+        if data:  # use the data actually stored, which may be resampled
+            rates.append(data[0].sample_rate.to('Hz').value)
+        elif getattr(channel, 'resample', None) is not None:
+            rates.append(float(channel.resample))
+        elif channel.sample_rate is not None:
+            rates.append(channel.sample_rate.to('Hz').value)
+        else:
+            return None
+    return min(rates)
+
+
+def get_coherence_component_keys(channel1, channel2, fftparams, sampling):
+    """Return the keys used to store the components of a coherence
+
+    The keys for the auto-spectra (``Cxx``, ``Cyy``) include the sampling
+    rate, so that these are shared by all pairs including the same channel
+    at the same rate.
+
+    Returns
+    -------
+    keys : `tuple` of `str`
+        the keys for ``Cxy``, ``Cxx`` and ``Cyy``
+    """
+    return (
+        make_globalv_key([channel1, channel2], fftparams),
+        '%s;%s' % (make_globalv_key(channel1, fftparams), sampling),
+        '%s;%s' % (make_globalv_key(channel2, fftparams), sampling),
+    )
+
+
+def _get_coherence_data(channel, segments, sampling, resampled=None,
+                        **kwargs):
+    """Internal function to get data for coherence at the given rate
+
+    Resampled data are stored in the ``resampled`` `dict`, keyed by
+    channel and rate, so that each channel is only resampled once for
+    all of its pairs
+    """
+    if resampled is None:
+        resampled = {}
+    store = resampled.setdefault((get_channel(channel).ndsname, sampling),
+                                 {})
+    out = []
+    for ts in get_timeseries(channel, segments, **kwargs):
+        if ts.sample_rate.value != sampling:
+            span = tuple(ts.span)
+            if span not in store:
+                store[span] = ts.resample(sampling)
+            ts = store[span]
+        # ignore units when calculating coherence
+        ts._unit = units.Unit('count')
+        out.append(ts)
+    return out
+
+
+# -- coherence matrix ---------------------------------------------------------
+
+class CoherenceMatrix(object):
+    """The coherence of one channel with each of many others, over time
+
+    Parameters
+    ----------
+    value : `numpy.ndarray`
+        the coherence, of shape ``(len(channels) - 1, len(times),
+        len(frequencies))``, with `NaN` where the coherence of a pair
+        wasn't calculated, e.g. above the Nyquist frequency of that pair
+
+    times : `numpy.ndarray`
+        the GPS start time of each time bin
+
+    frequencies : `numpy.ndarray`
+        the frequency of each bin
+
+    dt : `float`
+        the duration (seconds) of each time bin
+
+    channels : `list`
+        the reference channel, followed by each of the other channels
+
+    segments : `list` of `~gwpy.segments.SegmentList`, optional
+        the segments for which the coherence of the reference with each
+        other channel has been calculated
+    """
+    def __init__(self, value, times, frequencies, dt, channels,
+                 segments=None):
+        self.times = numpy.asarray(times, dtype='float64')
+        self.frequencies = numpy.asarray(frequencies, dtype='float64')
+        self.value = numpy.asarray(value, dtype='float64').reshape(
+            len(channels) - 1, self.times.size, self.frequencies.size)
+        self.dt = float(dt)
+        self.channels = list(map(get_channel, channels))
+        if segments is None:
+            segments = [[]] * (len(self.channels) - 1)
+        self.segments = [SegmentList(segs) for segs in segments]
+
+    @property
+    def reference(self):
+        """The channel whose coherence with each other is calculated
+        """
+        return self.channels[0]
+
+    def append(self, other):
+        """Add the time bins of another `CoherenceMatrix` to this one
+
+        For each channel, only the bins of ``other`` in its segments for
+        that channel, and not in the segments of this matrix, are added.
+        Both matrices should be for the same channels; if the frequencies
+        of one start those of the other (e.g. if the highest sampling rate
+        wasn't known when one was calculated), the coherence is padded
+        with `NaN` up to the highest frequency.
+        """
+        new = [theirs - ours for ours, theirs in
+               zip(self.segments, other.segments)]
+        masks = numpy.zeros(other.value.shape[:2], dtype=bool)
+        for i, segs in enumerate(new):
+            for seg in segs:
+                masks[i] |= ((other.times >= seg[0]) &
+                             (other.times + other.dt <= seg[1]))
+        if not masks.any():
+            return self
+
+        short, long_ = sorted((self.frequencies, other.frequencies), key=len)
+        if not numpy.allclose(short, long_[:short.size]):
+            raise ValueError("Cannot append CoherenceMatrix with different "
+                             "frequencies")
+        times = numpy.union1d(self.times, other.times[masks.any(axis=0)])
+        value = numpy.full((len(new), times.size, long_.size), numpy.nan)
+        value[:, numpy.searchsorted(times, self.times),
+              :self.frequencies.size] = self.value
+        index = numpy.searchsorted(times, other.times)
+        for i, segs in enumerate(new):
+            value[i, index[masks[i]], :other.frequencies.size] = (
+                other.value[i, masks[i]])
+            self.segments[i] = (self.segments[i] | segs).coalesce()
+        self.times = times
+        self.frequencies = long_
+        self.value = value
+        return self
+
+    def crop(self, segments):
+        """Return a new `CoherenceMatrix` of the time bins in some segments
+        """
+        segments = SegmentList(segments)
+        keep = numpy.zeros(self.times.size, dtype=bool)
+        for seg in segments:
+            keep |= (self.times >= seg[0]) & (self.times < seg[1])
+        return type(self)(self.value[:, keep], self.times[keep],
+                          self.frequencies, self.dt, self.channels,
+                          segments=[s & segments for s in self.segments])
+
+    def percentile(self, q):
+        """Calculate the percentile of the coherence over time
+
+        Returns
+        -------
+        percentile : `numpy.ndarray`
+            an array of shape ``(len(channels) - 1, len(frequencies))``
+        """
+        if not self.times.size:
+            return numpy.full((self.value.shape[0], self.frequencies.size),
+                              numpy.nan)
+        with warnings.catch_warnings():  # ignore all-NaN frequencies
+            warnings.simplefilter('ignore', RuntimeWarning)
+            return numpy.nanpercentile(self.value, q, axis=1)
+
+    def spectrum(self, channel, q=50):
+        """Return the percentile coherence of the reference with a channel
+
+        Parameters
+        ----------
+        channel : `str`, `int`
+            the channel, or the index of that channel after the reference
+
+        q : `float`, optional
+            the percentile to return
+
+        Returns
+        -------
+        spectrum : `~gwpy.frequencyseries.FrequencySeries`
+            the coherence spectrum
+        """
+        if not isinstance(channel, int):
+            names = [c.ndsname for c in self.channels[1:]]
+            channel = names.index(get_channel(channel).ndsname)
+        value = self.percentile(q)[channel]
+        other = self.channels[channel + 1]
+        return FrequencySeries(
+            value, frequencies=self.frequencies, unit=units.Unit(''),
+            channel=other, name='%s\n%s' % (self.reference.ndsname,
+                                            other.ndsname))
+
+
+@use_segmentlist
+def get_coherence_matrix(channels, segments, config=None, cache=None,
+                         query=True, nds=None, return_=True, frametype=None,
+                         nproc=1, datafind_error='raise', **fftparams):
+    """Calculate the coherence of one channel with each of many others
+
+    The first channel is the reference, the data for all other channels
+    with the same sampling rate are transformed together, and each
+    channel is resampled only once.
+
+    Returns
+    -------
+    matrix : `CoherenceMatrix`
+        the coherence for the given segments
+    """
+    channels = list(map(get_channel, channels))
+    reference = channels[0]
+
+    # clean fftparams dict using reference default values
+    fftparams.setdefault('method', 'welch')
+    fftparams = get_fftparams(reference, **fftparams)
+    stride = float(fftparams.stride)
+    overlap = float(fftparams.overlap or 0)
+
+    # key used to store the coherence matrix in globalv
+    key = make_globalv_key(channels, fftparams)
+    matrix = globalv.COHERENCE_MATRIX.setdefault(
+        key, CoherenceMatrix([], [], [], stride, channels))
+
+    # work out what new segments are needed for each channel
+    # need to truncate to segments of integer numbers of strides
+    need = [segments - known for known in matrix.segments]
+    new = type(segments)()
+    for seg in reduce(operator.or_, need, type(segments)()).coalesce():
+        dur = float(abs(seg)) // stride * stride
+        if dur < stride + overlap:
+            continue
+        new.append(type(seg)(seg[0], seg[0]+dur))
+    query &= abs(new) != 0
+
+    if query:
+        get_timeseries_dict(channels, new, config=config, cache=cache,
+                            frametype=frametype, nproc=nproc, nds=nds,
+                            datafind_error=datafind_error, return_=False)
+        rates = [get_coherence_sample_rate(reference, c) for
+                 c in channels[1:]]
+        nfreq = int(max(r or 0 for r in rates) * fftparams.fftlength) // 2
+        frequencies = numpy.arange(nfreq + 1) / fftparams.fftlength
+        refsegs = get_timeseries(reference, new, query=False).segments
+        vprint("    Calculating coherence of %s with %d channels"
+               % (str(reference), len(channels) - 1))
+
+        resampled = {}
+        for seg in new:
+            times = numpy.arange(seg[0], seg[1] - stride / 2., stride)
+            value = numpy.full((len(channels) - 1, times.size, nfreq + 1),
+                               numpy.nan)
+            covered = [SegmentList() for c in channels[1:]]
+
+            # group channels by sampling rate and the span of data (aligned
+            # to the strides of this segment) common with the reference,
+            # and not yet calculated for that channel
+            groups = OrderedDict()
+            for i, (channel, rate) in enumerate(zip(channels[1:], rates)):
+                if rate is None:
+                    continue
+                have = get_timeseries(channel, [seg], query=False).segments
+                for start, end in (refsegs & have & need[i] &
+                                   SegmentList([seg])):
+                    start = seg[0] + numpy.ceil(
+                        (start - seg[0]) / stride) * stride
+                    end = start + (end - start) // stride * stride
+                    if end - start >= stride + overlap:
+                        groups.setdefault((rate, start, end), []).append(i)
+
+            # calculate the coherence for each group
+            for (rate, start, end), index in groups.items():
+                span = SegmentList([Segment(start, end)])
+                ref, = _get_coherence_data(reference, span, rate,
+                                           resampled=resampled, query=False)
+                others = [_get_coherence_data(channels[i+1], span, rate,
+                                              query=False)[0] for i in index]
+                coh = _coherence_together(
+                    ref, others, stride, fftparams.fftlength, overlap,
+                    window=fftparams.window or 'hann', nproc=nproc)
+                j = int(round((start - seg[0]) / stride))
+                value[index, j:j+coh.shape[1], :coh.shape[2]] = coh
+                for i in index:
+                    covered[i].append(
+                        Segment(start, start + coh.shape[1] * stride))
+                vprint('.')
+            resampled.clear()
+
+            matrix.append(CoherenceMatrix(value, times, frequencies, stride,
+                                          channels, segments=covered))
+        vprint('\n')
+
+    if return_:
+        return matrix.crop(segments)
+
+
+def add_coherence_matrix(matrix, key=None):
+    """Add a `CoherenceMatrix` to the global memory cache
+
+    Time bins for segments already in memory are ignored.
+    """
+    if key is None:
+        key = make_globalv_key(matrix.channels)
+    try:
+        existing = globalv.COHERENCE_MATRIX[key]
+    except KeyError:
+        globalv.COHERENCE_MATRIX[key] = matrix
+    else:
+        existing.append(matrix)
+    return globalv.COHERENCE_MATRIX[key]
+
+
+def _coherence_together(reference, others, stride, fftlength, overlap,
+                        window='hann', nproc=1):
+    """Internal function to calculate the coherence of one series with many
+
+    All series should have the same sample rate and span, the FFTs of all
+    series are calculated together.
+
+    Returns
+    -------
+    coherence : `numpy.ndarray`
+        an array of shape ``(len(others), ntimes, nfreqs)``
+    """
+    params = _stft_params(reference, stride, fftlength, overlap, 'welch')
+
+    # calculate each pair separately, if the FFTs can't be shared
+    if params is None:
+        kwargs = {'fftlength': fftlength, 'overlap': overlap,
+                  'window': window, 'nproc': nproc}
+        pxx = stft_spectrogram(reference, stride, method='welch',
+                               **kwargs).value
+        out = []
+        for ts in others:
+            pyy = stft_spectrogram(ts, stride, method='welch', **kwargs)
+            pxy = stft_spectrogram(reference, stride, method='csd', other=ts,
+                                   **kwargs)
+            out.append(numpy.abs(pxy.value) ** 2 / pxx / pyy.value)
+        return numpy.array(out)
+
+    positions, nfft = params
+    nfreq = nfft // 2 + 1
+    out = numpy.zeros((len(others), positions.shape[0], nfreq))
+    batch = max(1, 2 ** 26 // ((len(others) + 1) * positions.shape[1] *
+                               nfreq * 16))
+    for i in range(0, positions.shape[0], batch):
+        frames = get_fft_frames([reference] + list(others),
+                                positions[i:i+batch], nfft, window=window,
+                                nproc=nproc)
+        pxx = _average_frames(frames[0], 'welch')
+        pyy = _average_frames(frames[1:], 'welch')
+        pxy = (frames[0].conj() * frames[1:]).mean(axis=-2)
+        out[:, i:i+batch] = (pxy.real ** 2 + pxy.imag ** 2) / pxx / pyy
+    return out
+
+
 def _get_from_list(serieslist, segment):
     """Internal function to crop a series from a serieslist
 
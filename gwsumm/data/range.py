@@ -20,9 +20,16 @@
 """
 
 import re
+import operator
+from collections import OrderedDict
+from math import pi
+
+from six.moves import reduce
 
 import numpy
 
+from astropy import (constants, units)
+
 from gwpy import astro
 from gwpy.timeseries import (TimeSeries, TimeSeriesList)
 from gwpy.frequencyseries import FrequencySeries
@@ -36,12 +43,14 @@ from .spectral import get_spectrogram
 
 __author__ = 'Duncan Macleod <duncan.macleod@ligo.org>'
 
+DEFAULT_RANGE_KWARGS = {'mass1': 1.4, 'mass2': 1.4}
+
 
 def get_range_channel(channel, **rangekwargs):
     """Return the meta-channel name used to store range data
     """
     if not rangekwargs:
-        rangekwargs = {'mass1': 1.4, 'mass2': 1.4}
+        rangekwargs = DEFAULT_RANGE_KWARGS.copy()
     re_float = re.compile(r'[.-]')
     rkey = '_'.join(['%s_%s' % (re_cchar.sub('_', key),
                                 re_float.sub('_', str(val))) for key, val in
@@ -58,18 +67,60 @@ def get_range(channel, segments, config=None, cache=None,
               method=None, **rangekwargs):
     """Calculate the sensitive distance for a given strain channel
     """
-    if not rangekwargs:
-        rangekwargs = {'mass1': 1.4, 'mass2': 1.4}
-    if 'energy' in rangekwargs:
-        range_func = astro.burst_range
-    else:
-        range_func = astro.inspiral_range
+    out = get_range_dict(channel, segments, [rangekwargs], config=config,
+                         cache=cache, query=query, nds=nds, return_=return_,
+                         nproc=nproc, datafind_error=datafind_error,
+                         frametype=frametype, stride=stride,
+                         fftlength=fftlength, overlap=overlap, method=method)
+    if return_:
+        return list(out.values())[0]
+
+
+@use_segmentlist
+def get_range_dict(channel, segments, rangekwargs, config=None, cache=None,
+                   query=True, nds=None, return_=True, nproc=1,
+                   datafind_error='raise', frametype=None,
+                   stride=None, fftlength=None, overlap=None,
+                   method=None):
+    """Calculate the sensitive distance for multiple source parameter sets
+
+    All parameter sets are calculated from the same set of PSDs, such that
+    the spectrogram for ``channel`` is read (and generated) only once.
+
+    Parameters
+    ----------
+    channel : `str`, `~gwpy.detector.Channel`
+        the strain channel to process
+
+    segments : `~gwpy.segments.SegmentList`
+        the segments over which to calculate the range
+
+    rangekwargs : `list` of `dict`
+        a list of range parameter sets (e.g. ``mass1``, ``mass2``, ``snr``,
+        ``energy``, ``fmin``, ``fmax``), an empty `dict` uses the default
+        1.4-1.4 solar mass binary inspiral
+
+    **kwargs
+        other keyword arguments are passed to
+        :func:`~gwsumm.data.get_spectrogram`
+
+    Returns
+    -------
+    rangedict : `~collections.OrderedDict`
+        `dict` of (key, `~gwpy.timeseries.TimeSeriesList`) pairs, one for
+        each element of ``rangekwargs``, only returned if ``return_=True``
+    """
+    rangekwargs = [rkw or DEFAULT_RANGE_KWARGS.copy() for rkw in rangekwargs]
     channel = get_channel(channel)
-    key = make_globalv_key(get_range_channel(channel, **rangekwargs))
+    keys = [make_globalv_key(get_range_channel(channel, **rkw)) for
+            rkw in rangekwargs]
+
     # get old segments
-    havesegs = globalv.DATA.get(key, TimeSeriesList()).segments
-    new = segments - havesegs
+    news = [segments - globalv.DATA.get(key, TimeSeriesList()).segments for
+            key in keys]
+    new = reduce(operator.or_, news).coalesce()
     query &= abs(new) != 0
+
     # calculate new range
     if query:
         # get spectrograms
@@ -79,15 +130,161 @@ def get_range(channel, segments, config=None, cache=None,
                                        datafind_error=datafind_error, nds=nds,
                                        stride=stride, fftlength=fftlength,
                                        overlap=overlap, method=method)
-        # calculate range for each PSD in each spectrogram
+        # calculate range for all parameter sets from each spectrogram
         for sg in spectrograms:
-            ts = TimeSeries(numpy.zeros(sg.shape[0],), unit='Mpc',
-                            epoch=sg.epoch, dx=sg.dx, channel=key)
-            for i in range(sg.shape[0]):
-                psd = sg[i]
-                psd = FrequencySeries(psd.value, f0=psd.x0, df=psd.dx)
-                ts[i] = range_func(psd, **rangekwargs)
-            add_timeseries(ts, key=key)
+            ranges = range_from_spectrogram(sg, *rangekwargs)
+            for key, knew, values in zip(keys, news, ranges):
+                ts = TimeSeries(values, unit='Mpc', epoch=sg.epoch,
+                                dx=sg.dx, channel=key)
+                for seg in knew:
+                    if not ts.span.intersects(seg):
+                        continue
+                    cropped = ts.crop(*(ts.span & seg))
+                    if cropped.size:
+                        add_timeseries(cropped, key=key)
 
     if return_:
-        return get_timeseries(key, segments, query=False)
+        return OrderedDict((key, get_timeseries(key, segments, query=False))
+                           for key in keys)
+
+
+# -- range calculation --------------------------------------------------------
+
+def range_from_spectrogram(specgram, *rangekwargs):
+    """Calculate the sensitive distance for each PSD in a spectrogram
+
+    The range integrand for each parameter set is evaluated only once on
+    the frequency grid of ``specgram``, with all PSDs (and all parameter
+    sets) then integrated with a single matrix product.
+
+    Parameters
+    ----------
+    specgram : `~gwpy.spectrogram.Spectrogram`
+        the strain power spectral density spectrogram
+
+    *rangekwargs : `dict`
+        one or more sets of keyword arguments to pass to
+        :func:`gwpy.astro.inspiral_range` or, if ``energy`` is given,
+        :func:`gwpy.astro.burst_range`
+
+    Returns
+    -------
+    ranges : `list` of `numpy.ndarray`
+        one array of range values (in Mpc) per set of ``rangekwargs``,
+        each with one element per row of ``specgram``
+    """
+    if not rangekwargs:
+        rangekwargs = (DEFAULT_RANGE_KWARGS.copy(),)
+    frequencies = specgram.frequencies.to('Hz').value
+    psd = numpy.asarray(specgram.value, dtype=float)
+    if psd.ndim == 1:  # single row
+        psd = psd.reshape((1, psd.size))
+    kernels = [RangeKernel.get(frequencies, **rkw) for rkw in rangekwargs]
+
+    # integrate each group of kernels with a common PSD exponent together
+    out = [None] * len(kernels)
+    for power in set(k.power for k in kernels):
+        idx = [i for i, k in enumerate(kernels) if k.power == power]
+        weights = numpy.column_stack([kernels[i].weights for i in idx])
+        # only evaluate the PSD where at least one kernel is non-zero
+        fidx = weights.any(axis=1)
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            integral = numpy.dot(psd[:, fidx] ** power, weights[fidx])
+        for j, i in enumerate(idx):
+            out[i] = kernels[i].finalize(integral[:, j])
+    return out
+
+
+def _trapz_weights(x):
+    """Return the weights ``w`` such that ``(w * y).sum() == trapz(y, x)``
+    """
+    w = numpy.zeros(x.size)
+    if x.size < 2:
+        return w
+    dx = numpy.diff(x)
+    w[:-1] += dx / 2.
+    w[1:] += dx / 2.
+    return w
+
+
+def _isco_frequency(mass1, mass2):
+    """Return the innermost stable circular orbit frequency (in Hz) for
+    a binary of the given component masses (in solar masses)
+    """
+    mtotal = units.Quantity(mass1 + mass2, 'solMass').to('kg')
+    return (constants.c ** 3 /
+            (constants.G * 6**1.5 * pi * mtotal)).to('Hz').value
+
+
+class RangeKernel(object):
+    """Frequency-domain integration kernel for a sensitive distance
+
+    The kernel holds the waveform-dependent part of the range integrand
+    (including the integration weights) for a fixed frequency grid, such
+    that the range for a PSD ``S(f)`` is given by
+    ``finalize(sum(weights * S(f) ** power))``.
+
+    Parameters
+    ----------
+    frequencies : `numpy.ndarray`
+        the frequency grid (in Hz) on which PSDs will be given
+
+    **rangekwargs
+        keyword arguments to pass to :func:`gwpy.astro.inspiral_range`
+        or, if ``energy`` is given, :func:`gwpy.astro.burst_range`
+    """
+    #: cache of kernels, keyed by frequency grid and range parameters
+    _CACHE = {}
+
+    def __init__(self, frequencies, **rangekwargs):
+        frequencies = numpy.asarray(frequencies, dtype=float)
+        rangekwargs = rangekwargs.copy()
+        self.burst = 'energy' in rangekwargs
+        fmin = rangekwargs.pop('fmin', None)
+        fmax = rangekwargs.pop('fmax', None)
+        # unit PSD, used to evaluate the waveform part of the integrand
+        ones = FrequencySeries(numpy.ones(frequencies.size), unit='1/Hz',
+                               frequencies=frequencies)
+        if self.burst:
+            fmin = 100 if fmin is None else fmin
+            fmax = 500 if fmax is None else fmax
+            self.power = -3/2.
+            self.norm = fmax - fmin
+            spec = astro.burst_range_spectrum(ones, **rangekwargs) ** 3
+        else:
+            fisco = _isco_frequency(rangekwargs.get('mass1', 1.4),
+                                    rangekwargs.get('mass2', 1.4))
+            fmin = fmin or (frequencies[1] - frequencies[0])
+            fmax = min(fmax or fisco, fisco)
+            self.power = -1
+            self.norm = 1
+            spec = astro.inspiral_range_psd(ones, **rangekwargs)
+        # build kernel, the range functions ignore the DC component
+        frange = (frequencies >= fmin) & (frequencies < fmax)
+        frange &= frequencies > 0
+        if self.burst:
+            self.unit = spec.unit
+        else:
+            self.unit = spec.unit * units.Hertz
+        self.weights = numpy.zeros(frequencies.size)
+        self.weights[frange] = (spec.value[frange[frequencies > 0]] *
+                                _trapz_weights(frequencies[frange]))
+
+    @classmethod
+    def get(cls, frequencies, **rangekwargs):
+        """Return the (cached) kernel for this frequency grid and parameters
+        """
+        key = (frequencies.size, frequencies[0], frequencies[-1],
+               tuple(sorted((k, str(v)) for (k, v) in rangekwargs.items())))
+        try:
+            return cls._CACHE[key]
+        except KeyError:
+            cls._CACHE[key] = kernel = cls(frequencies, **rangekwargs)
+            return kernel
+
+    def finalize(self, integral):
+        """Convert the integrated kernel into a sensitive distance in Mpc
+        """
+        root = 1/3. if self.burst else 1/2.
+        value = units.Quantity(integral / self.norm, self.unit) ** root
+        return value.to('Mpc').value
@@ -23,6 +23,9 @@ from __future__ import division
 
 import os.path
 import operator
+import pickle
+import socket
+import tempfile
 import warnings
 from collections import OrderedDict
 
@@ -35,12 +38,24 @@ from math import pi  # noqa: F401
 import numpy
 
 from scipy import interpolate
+from scipy.signal import get_window
+
+try:  # scipy >= 1.4
+    from scipy import fft as scipy_fft
+except ImportError:
+    scipy_fft = None
+
+try:  # FFTW plans and wisdom
+    import pyfftw
+except ImportError:
+    pyfftw = None
 
 from astropy import units
 
-from gwpy.segments import DataQualityFlag
+from gwpy.segments import (DataQualityFlag, Segment, SegmentList)
 from gwpy.frequencyseries import FrequencySeries
-from gwpy.spectrogram import SpectrogramList
+from gwpy.signal.window import canonical_name
+from gwpy.spectrogram import (Spectrogram, SpectrogramList)
 
 from .. import (globalv, io)
 from ..utils import (vprint, safe_eval)
@@ -99,22 +114,8 @@ def _get_spectrogram(channel, segments, config=None, cache=None,
                      frametype=None, nproc=1,
                      datafind_error='raise', **fftparams):
     channel = get_channel(channel)
-
-    # if we aren't given a method, check to see whether data have already
-    # been processed, if so, choose that one
-    if fftparams.get('method', None) is None:
-        methods = set([key.split(';')[1] for key in globalv.SPECTROGRAMS
-                       if key.startswith('%s;' % channel.ndsname)])
-        try:
-            fftparams['method'] = list(methods)[0]
-        except IndexError:
-            fftparams['method'] = 'welch'
-
-    # clean fftparams dict using channel default values
-    fftparams = get_fftparams(channel, **fftparams)
-    # override special-case methods
-    if format in ['rayleigh']:
-        fftparams.method = format
+    fftparams = _get_spectrogram_fftparams(channel, format=format,
+                                           **fftparams)
 
     # key used to store the coherence spectrogram in globalv
     key = make_globalv_key(channel, fftparams)
@@ -153,36 +154,43 @@ def _get_spectrogram(channel, segments, config=None, cache=None,
             elif isinstance(filter_, string_types):
                 filter_ = safe_eval(filter_, strict=True)
 
-        # get time-series data
-        timeserieslist = get_timeseries(channel, new, config=config,
+        # get time-series data, starting with the samples left over from
+        # the previous spectrogram, if they lead into the new segments
+        buffer = globalv.SPECTROGRAM_BUFFERS.get(key, None)
+        if buffer is not None and buffer.span in new:
+            readsegs = new - SegmentList([buffer.span])
+            globalv.SPECTROGRAM_BUFFERS.pop(key)
+        else:
+            readsegs = new
+            buffer = None
+        timeserieslist = get_timeseries(channel, readsegs, config=config,
                                         cache=cache, frametype=frametype,
                                         nproc=nproc, query=query,
                                         datafind_error=datafind_error, nds=nds)
+        if buffer is not None:
+            timeserieslist = join_spectrogram_buffer(buffer, timeserieslist)
         # calculate spectrograms
         if len(timeserieslist):
             vprint("    Calculating (%s) spectrograms for %s"
                    % (fftparams['method'], str(channel)))
         for ts in timeserieslist:
-            # if too short for a single segment, continue
+            # if too short for a single segment, keep it for next time
             if abs(ts.span) < (stride + fftparams.get('overlap', 0)):
+                add_spectrogram_buffer(ts, key=key)
                 continue
             # truncate timeseries to integer number of strides
             d = size_for_spectrogram(ts.duration.to('s').value, stride,
                                      fftparams['fftlength'],
                                      fftparams.get('overlap', 0))
+            data = ts
             ts = ts.crop(ts.span[0], ts.span[0] + d, copy=False)
             # calculate spectrogram
             try:
-                # rayleigh spectrogram has its own instance method
-                if fftparams.get('method', None) == 'rayleigh':
-                    spec_kw = fftparams.copy()
-                    for fftkey in ('method', 'scheme',):  # remove ASD keys
-                        spec_kw.pop(fftkey, None)
-                    spec_func = ts.rayleigh_spectrogram
-                else:
-                    spec_kw = fftparams
-                    spec_func = ts.spectrogram
-                specgram = spec_func(stride, nproc=nproc, **spec_kw)
+                spec_kw = fftparams.copy()
+                if spec_kw.get('method', None) == 'rayleigh':
+                    spec_kw.pop('scheme', None)  # remove ASD keys
+                specgram = stft_spectrogram(ts, stride, nproc=nproc,
+                                            **spec_kw)
             except ZeroDivisionError:
                 if stride == 0:
                     raise ZeroDivisionError("Spectrogram stride is 0")
@@ -198,6 +206,10 @@ def _get_spectrogram(channel, segments, config=None, cache=None,
                     specgram._unit = unit ** 2 / units.Hertz
                 else:
                     raise
+            # keep the samples after the last stride for next time
+            if specgram.span[1] < data.span[1]:
+                add_spectrogram_buffer(
+                    data.crop(specgram.span[1], data.span[1]), key=key)
             if isinstance(filter_, FrequencySeries) and (
                     fftparams['method'] not in ['rayleigh']):
                 specgram = apply_transfer_function_series(specgram, filter_)
@@ -241,6 +253,27 @@ def _get_spectrogram(channel, segments, config=None, cache=None,
     return out.coalesce()
 
 
+def _get_spectrogram_fftparams(channel, format='power', **fftparams):
+    """Get the `FftParams` with which to calculate a spectrogram
+    """
+    # if we aren't given a method, check to see whether data have already
+    # been processed, if so, choose that one
+    if fftparams.get('method', None) is None:
+        methods = set([key.split(';')[1] for key in globalv.SPECTROGRAMS
+                       if key.startswith('%s;' % channel.ndsname)])
+        try:
+            fftparams['method'] = list(methods)[0]
+        except IndexError:
+            fftparams['method'] = 'welch'
+
+    # clean fftparams dict using channel default values
+    fftparams = get_fftparams(channel, **fftparams)
+    # override special-case methods
+    if format in ['rayleigh']:
+        fftparams.method = format
+    return fftparams
+
+
 def add_spectrogram(specgram, key=None, coalesce=True):
     """Add a `Spectrogram` to the global memory cache
     """
@@ -258,15 +291,15 @@ def get_spectrograms(channels, segments, config=None, cache=None, query=True,
                      nproc=1, datafind_error='raise', **fftparams):
     """Get spectrograms for multiple channels
     """
-    channels = map(get_channel, channels)
+    channels = list(map(get_channel, channels))
 
     # get timeseries data in bulk
     if query:
         # get underlying list of data channels to read
-        qchannels = map(get_channel,
-                        set([c for group in
-                             map(split_channel_combination, channels)
-                             for c in group]))
+        qchannels = list(map(get_channel,
+                             set([c for group in
+                                  map(split_channel_combination, channels)
+                                  for c in group])))
 
         # work out FFT params and storage keys for each data channel
         keys = []
@@ -285,11 +318,31 @@ def get_spectrograms(channels, segments, config=None, cache=None, query=True,
             key, SpectrogramList()).segments for key in keys))
         new = segments - havesegs
 
-        # read data for new segments
-        get_timeseries_dict(qchannels, new, config=config, cache=cache,
+        # read data for new segments, except for samples left over from
+        # the previous spectrograms of all channels
+        bufsegs = reduce(operator.and_, (SegmentList(
+            [globalv.SPECTROGRAM_BUFFERS[key].span] if
+            key in globalv.SPECTROGRAM_BUFFERS else []) for key in keys))
+        get_timeseries_dict(qchannels, new - bufsegs, config=config,
+                            cache=cache,
                             nproc=nproc, frametype=frametype,
                             datafind_error=datafind_error, nds=nds,
                             return_=False)
+
+        # calculate spectrograms for batches of data channels with the
+        # same sample rate and FFT parameters, transforming their data
+        # together
+        for batch in _group_spectrogram_channels(qchannels, new,
+                                                 format=format, **fftparams):
+            if len(batch) > 1:
+                _transform_together(batch, nproc=nproc)
+            for channel, _, _ in batch:
+                _get_spectrogram(
+                    channel, segments, config=config, cache=cache,
+                    query=query, nds=nds, format=format, return_=False,
+                    frametype=frametype, nproc=nproc,
+                    datafind_error=datafind_error, **fftparams)
+
     # loop over channels and generate spectrograms
     out = OrderedDict()
     for channel in channels:
@@ -301,6 +354,137 @@ def get_spectrograms(channels, segments, config=None, cache=None, query=True,
     return out
 
 
+def _group_spectrogram_channels(channels, segments, format='power',
+                                **fftparams):
+    """Group channels whose data can be transformed together
+
+    Channels are grouped by sample rate and FFT parameters, then split
+    into batches whose FFT frames fit in `globalv.FFT_FRAMES`.
+
+    Returns
+    -------
+    batches : `list` of `list`
+        each batch is a list of ``(channel, tslist, fftparams)`` tuples,
+        where ``tslist`` is the list of data (cropped to an integer number
+        of strides) to transform with `stft_spectrogram`
+    """
+    groups = OrderedDict()
+    for channel in channels:
+        fftparams_ = _get_spectrogram_fftparams(channel, format=format,
+                                                **fftparams.copy())
+        buffer = globalv.SPECTROGRAM_BUFFERS.get(
+            make_globalv_key(channel, fftparams_), None)
+        fftparams_ = fftparams_.dict()
+        stride = fftparams_.pop('stride')
+        fftlength = fftparams_['fftlength']
+        overlap = fftparams_.get('overlap', 0) or 0
+        tslist = []
+        data = get_timeseries(channel, segments, query=False)
+        if buffer is not None and buffer.span in segments:
+            data = join_spectrogram_buffer(buffer, data)
+        for ts in data:
+            if abs(ts.span) < (stride + overlap):
+                continue
+            d = size_for_spectrogram(ts.duration.to('s').value, stride,
+                                     fftlength, overlap)
+            tslist.append(ts.crop(ts.span[0], ts.span[0] + d, copy=False))
+        if not tslist or set(fftparams_) - {'method', 'fftlength',
+                                            'overlap', 'window'}:
+            groups[channel] = [(channel, tslist, fftparams_)]
+            continue
+        fftparams_['stride'] = stride
+        key = (tslist[0].sample_rate.value, str(sorted(fftparams_.items())))
+        groups.setdefault(key, []).append((channel, tslist, fftparams_))
+
+    # split groups into batches that fit in the FFT cache
+    batches = []
+    for group in groups.values():
+        size = 0
+        batches.append([])
+        for channel, tslist, fftparams_ in group:
+            csize = sum(ts.size * 16 for ts in tslist)
+            if batches[-1] and size + csize > globalv.FFT_CACHE_SIZE // 2:
+                batches.append([])
+                size = 0
+            batches[-1].append((channel, tslist, fftparams_))
+            size += csize
+    return batches
+
+
+def _transform_together(batch, nproc=1):
+    """Transform the data for a batch of channels together
+
+    The FFT frames are stored in `globalv.FFT_FRAMES`, ready for
+    `stft_spectrogram`.
+    """
+    _, _, fftparams = batch[0]
+    fftparams = fftparams.copy()
+    stride = fftparams.pop('stride')
+    window = fftparams.get('window', 'hann')
+
+    # group series with the same span across channels
+    spans = OrderedDict()
+    for _, tslist, _ in batch:
+        for ts in tslist:
+            spans.setdefault((ts.t0.value, ts.size), []).append(ts)
+
+    for serieslist in spans.values():
+        params = _stft_params(
+            serieslist[0], stride, fftparams['fftlength'],
+            fftparams.get('overlap'), fftparams['method'])
+        if len(serieslist) < 2 or params is None:
+            continue
+        positions, nfft = params
+        positions = numpy.unique(positions)
+        chunk = max(1, 2 ** 26 // (len(serieslist) * nfft * 16))
+        for i in range(0, positions.size, chunk):
+            get_fft_frames(serieslist, positions[i:i+chunk], nfft,
+                           window=window, nproc=nproc)
+
+
+def add_spectrogram_buffer(timeseries, key=None):
+    """Keep the data left over from a spectrogram in the global memory cache
+
+    These are the samples after the last complete stride, from which the
+    next spectrogram for the same ``key`` should start, only the latest
+    such samples are kept for each key.
+    """
+    if key is None:
+        key = timeseries.name or str(timeseries.channel)
+    old = globalv.SPECTROGRAM_BUFFERS.get(key, None)
+    if old is None or timeseries.span[1] >= old.span[1]:
+        globalv.SPECTROGRAM_BUFFERS[key] = timeseries.copy()
+
+
+def join_spectrogram_buffer(buffer, timeserieslist):
+    """Prepend the samples left over from a spectrogram to new data
+
+    Parameters
+    ----------
+    buffer : `~gwpy.timeseries.TimeSeries`
+        the samples left over from the previous spectrogram
+
+    timeserieslist : `~gwpy.timeseries.TimeSeriesList`
+        the new data
+
+    Returns
+    -------
+    timeserieslist : `~gwpy.timeseries.TimeSeriesList`
+        a new list, with the buffer joined to the series that directly
+        follows it, or added on its own
+    """
+    out = type(timeserieslist)()
+    for ts in timeserieslist:
+        if buffer is not None and buffer.is_contiguous(ts) == 1:
+            ts = buffer.append(ts, inplace=False)
+            buffer = None
+        out.append(ts)
+    if buffer is not None:
+        out.append(buffer)
+        out.sort(key=lambda ts: ts.span[0])
+    return out
+
+
 def size_for_spectrogram(size, stride, fftlength, overlap):
     if size < stride:
         return None
@@ -326,6 +510,623 @@ def apply_transfer_function_series(specgram, tfunc):
     return (specgram ** (1/2.) * itfunc) ** 2
 
 
+class SpectrumHistogram(object):
+    """A histogram of spectrogram values at each frequency
+
+    Values are counted in logarithmically-spaced bins, so that the
+    percentiles of a long spectrogram can be estimated from the counts,
+    which are updated as each new spectrogram is generated, rather than
+    by joining and sorting the full spectrogram.
+
+    Parameters
+    ----------
+    frequencies : `numpy.ndarray`
+        the frequency of each row of counts
+
+    counts : `numpy.ndarray`, optional
+        2-D array of counts, one row per frequency, and one column per bin
+
+    offset : `numpy.ndarray`, optional
+        the index of the first bin in each row of ``counts``, the
+        bin with index ``i`` holds values in the range
+        ``[10 ** (i / resolution), 10 ** ((i + 1) / resolution))``
+
+    zeros : `numpy.ndarray`, optional
+        the number of values less than or equal to zero at each frequency
+
+    resolution : `int`, optional
+        the number of bins per decade
+
+    segments : `~gwpy.segments.SegmentList`, optional
+        the segments for which values have been counted
+
+    **metadata
+        other metadata to attach to each percentile, e.g. ``name``,
+        ``channel``, ``unit``, or ``epoch``
+    """
+    _metadata = ('name', 'channel', 'unit', 'epoch')
+
+    def __init__(self, frequencies, counts=None, offset=None, zeros=None,
+                 resolution=50, segments=None, **metadata):
+        self.frequencies = numpy.asarray(frequencies, dtype='float64')
+        nfreq = self.frequencies.size
+        if counts is None:
+            counts = numpy.zeros((nfreq, 0))
+        self.counts = numpy.array(counts, dtype='uint32', ndmin=2)
+        self.offset = numpy.zeros(nfreq, dtype='int64')
+        if offset is not None:
+            self.offset[:] = offset
+        self.zeros = numpy.zeros(nfreq, dtype='uint32')
+        if zeros is not None:
+            self.zeros[:] = zeros
+        self.resolution = int(resolution)
+        self.segments = SegmentList(segments or [])
+        for attr in self._metadata:
+            setattr(self, attr, metadata.pop(attr, None))
+        if metadata:
+            raise TypeError("unexpected keyword argument %r"
+                            % list(metadata)[0])
+
+    @classmethod
+    def from_spectrogram(cls, specgram, resolution=50):
+        """Create a new, empty, histogram matching the given `Spectrogram`
+        """
+        return cls(specgram.frequencies.value, resolution=resolution,
+                   name=specgram.name, channel=specgram.channel,
+                   unit=specgram.unit, epoch=specgram.t0.value)
+
+    def add(self, specgram):
+        """Count the values of a `Spectrogram`
+
+        Only those times not already in `segments` are counted.
+        """
+        times = specgram.times.value
+        new = numpy.ones(times.size, dtype=bool)
+        for seg in self.segments:
+            new &= (times < seg[0]) | (times >= seg[1])
+        if new.any():
+            self._count(specgram.value[new])
+        self.segments = (self.segments | SegmentList([
+            Segment(*specgram.span)])).coalesce()
+
+    def merge(self, other):
+        """Add the counts from another `SpectrumHistogram`
+
+        Returns `False` if the counts cannot be merged, i.e. if they
+        overlap in time, or are binned differently.
+        """
+        if (other.frequencies.shape != self.frequencies.shape or
+                not numpy.allclose(other.frequencies, self.frequencies) or
+                other.resolution != self.resolution or
+                abs(other.segments & self.segments)):
+            return False
+        filled = other.counts.any(axis=1)
+        width = other.counts.shape[1]
+        self._extend(other.offset, other.offset + width - 1, filled)
+        rows = numpy.flatnonzero(filled)
+        cols = ((other.offset - self.offset)[rows, None] +
+                numpy.arange(width))
+        self.counts[rows[:, None], cols] += other.counts[rows]
+        self.zeros += other.zeros
+        self.segments = (self.segments | other.segments).coalesce()
+        return True
+
+    def _count(self, values):
+        values = numpy.asarray(values, dtype='float64')
+        valid = numpy.isfinite(values)
+        positive = valid & (values > 0)
+        self.zeros += (valid & ~positive).sum(axis=0).astype('uint32')
+        if not positive.any():
+            return
+        idx = numpy.floor(numpy.log10(numpy.where(positive, values, 1)) *
+                          self.resolution).astype('int64')
+        limits = numpy.iinfo('int64')
+        low = numpy.where(positive, idx, limits.max).min(axis=0)
+        high = numpy.where(positive, idx, limits.min).max(axis=0)
+        self._extend(low, high, positive.any(axis=0))
+        nfreq, width = self.counts.shape
+        flat = (numpy.arange(nfreq) * width + idx - self.offset)[positive]
+        self.counts += numpy.bincount(
+            flat, minlength=nfreq * width).reshape(
+                nfreq, width).astype('uint32')
+
+    def _extend(self, low, high, mask):
+        """Extend the bins to hold indices ``low`` to ``high`` (inclusive)
+        for each frequency in ``mask``
+        """
+        nfreq, width = self.counts.shape
+        filled = self.counts.any(axis=1)
+        if not (mask & (~filled | (low < self.offset) |
+                        (high >= self.offset + width))).any():
+            return
+        start = numpy.where(filled, self.offset, numpy.where(mask, low, 0))
+        end = numpy.where(filled, self.offset + width, start)
+        start = numpy.where(mask, numpy.minimum(start, low), start)
+        end = numpy.where(mask, numpy.maximum(end, high + 1), end)
+        counts = numpy.zeros((nfreq, (end - start).max()), dtype='uint32')
+        rows = numpy.flatnonzero(filled)
+        cols = (self.offset - start)[rows, None] + numpy.arange(width)
+        counts[rows[:, None], cols] = self.counts[rows]
+        self.counts = counts
+        self.offset = start
+
+    def percentile(self, percentile):
+        """Estimate the given percentile of the values at each frequency
+
+        The value is interpolated (logarithmically) within the bin
+        holding the requested rank.
+
+        Parameters
+        ----------
+        percentile : `float`
+            the percentile to return, between 0 and 100
+
+        Returns
+        -------
+        spectrum : `~gwpy.frequencyseries.FrequencySeries`
+            the given percentile at each frequency
+        """
+        nfreq, width = self.counts.shape
+        counts = self.counts.astype('float64')
+        total = counts.sum(axis=1) + self.zeros
+        rank = percentile / 100. * total - self.zeros
+        out = numpy.zeros(nfreq)
+        if width:
+            cumsum = counts.cumsum(axis=1)
+            rows = numpy.arange(nfreq)
+            idx = numpy.minimum((cumsum < rank[:, None]).sum(axis=1),
+                                width - 1)
+            below = cumsum[rows, idx] - counts[rows, idx]
+            with numpy.errstate(divide='ignore', invalid='ignore'):
+                frac = numpy.clip((rank - below) / counts[rows, idx], 0, 1)
+            out = 10 ** ((self.offset + idx + numpy.nan_to_num(frac)) /
+                         float(self.resolution))
+        out[(self.zeros > 0) & (rank <= 0)] = 0
+        out[total == 0] = numpy.nan
+        return FrequencySeries(
+            out, frequencies=self.frequencies, name=self.name,
+            channel=self.channel, unit=self.unit, epoch=self.epoch)
+
+
+# -- short-time Fourier transforms --------------------------------------------
+
+STFT_METHODS = ('welch', 'median', 'rayleigh', 'csd')
+
+# number of frames in each FFT, so that every FFT of a given length has
+# the same shape, and its plan is reused
+FFT_BATCH = 64
+
+
+def stft_spectrogram(timeseries, stride, fftlength=None, overlap=None,
+                     window='hann', method='median', other=None, nproc=1,
+                     **kwargs):
+    """Calculate an average spectrogram from (cached) short-time FFTs
+
+    The windowed FFT of each frame of data is stored in
+    `globalv.FFT_FRAMES`, so that the median, Welch, and Rayleigh
+    spectrograms, and the cross-spectral density, of the same data all
+    share a single set of FFTs.
+    Each time bin is calculated from the same data as for
+    :meth:`gwpy.timeseries.TimeSeries.spectrogram`, methods (or options)
+    not supported here are passed to that method instead.
+
+    Parameters
+    ----------
+    timeseries : `~gwpy.timeseries.TimeSeries`
+        the data to transform
+
+    stride : `float`
+        the duration (seconds) of each time bin
+
+    fftlength : `float`
+        the duration (seconds) of each FFT
+
+    overlap : `float`
+        the overlap (seconds) between FFTs
+
+    window : `str`, `tuple`, `numpy.ndarray`, optional
+        the window to apply to each FFT
+
+    method : `str`, optional
+        the average method, one of `STFT_METHODS`
+
+    other : `~gwpy.timeseries.TimeSeries`, optional
+        the second series for the cross-spectral density (``method='csd'``)
+
+    nproc : `int`, optional
+        the number of parallel FFT workers
+
+    **kwargs
+        other keyword arguments are passed to the `TimeSeries` method
+        if the spectrogram can't be calculated from short-time FFTs
+
+    Returns
+    -------
+    specgram : `~gwpy.spectrogram.Spectrogram`
+        the average spectrogram
+    """
+    fftlength = fftlength or stride
+    params = None
+    if not kwargs and (other is None or other.size == timeseries.size):
+        params = _stft_params(timeseries, stride, fftlength, overlap, method)
+
+    # pass unsupported options back to gwpy
+    if params is None and method == 'csd':
+        return timeseries.csd_spectrogram(
+            other, stride, fftlength=fftlength, overlap=overlap,
+            window=window, nproc=nproc, **kwargs)
+    if params is None and method == 'rayleigh':
+        return timeseries.rayleigh_spectrogram(
+            stride, fftlength=fftlength, overlap=overlap, window=window,
+            nproc=nproc, **kwargs)
+    if params is None:
+        return timeseries.spectrogram(
+            stride, fftlength=fftlength, overlap=overlap, window=window,
+            method=method, nproc=nproc, **kwargs)
+
+    positions, nfft = params
+    rate = timeseries.sample_rate.to('Hz').value
+    nfreq = nfft // 2 + 1
+    if method == 'csd':
+        data = numpy.zeros((positions.shape[0], nfreq), dtype=complex)
+    else:
+        data = numpy.zeros((positions.shape[0], nfreq))
+
+    # get FFTs for each time bin, in batches to limit memory use
+    batch = max(1, 2 ** 26 // (positions.shape[1] * nfreq * 16))
+    for i in range(0, positions.shape[0], batch):
+        pos = positions[i:i+batch]
+        frames = get_fft_frames(timeseries, pos, nfft, window=window,
+                                nproc=nproc)
+        if method == 'csd':
+            frames2 = get_fft_frames(other, pos, nfft, window=window,
+                                     nproc=nproc)
+            data[i:i+batch] = (frames.conj() * frames2).mean(axis=1)
+        else:
+            data[i:i+batch] = _average_frames(frames, method)
+
+    if method == 'rayleigh':
+        unit = units.Unit('')
+        name = 'Rayleigh spectrum of %s' % timeseries.name
+    else:
+        unit = (timeseries.unit ** 2 if timeseries.unit else 1) / units.Hertz
+        name = timeseries.name
+    if method == 'csd':
+        name = '%s---%s' % (timeseries.name, other.name)
+    return Spectrogram(data, epoch=timeseries.t0.value, dt=stride, f0=0,
+                       df=rate / nfft, unit=unit, name=name,
+                       channel=timeseries.channel)
+
+
+def _rfft(array, nproc=1):
+    """Real FFT along the last axis, using `scipy.fft` if available
+    """
+    if scipy_fft is None:  # scipy < 1.4
+        return numpy.fft.rfft(array, axis=-1)
+    return scipy_fft.rfft(array, axis=-1, workers=nproc)
+
+
+def _rfft_frames(frames, nproc=1):
+    """Real FFT of each of the given frames, `FFT_BATCH` frames at a time
+
+    The last batch is padded with zeros, so that all FFTs of frames of the
+    same length have the same shape, and can use the same plan.
+    """
+    nfft = frames.shape[-1]
+    rows = frames.reshape((-1, nfft))
+    out = numpy.empty((rows.shape[0], nfft // 2 + 1), dtype='complex128')
+    for i in range(0, rows.shape[0], FFT_BATCH):
+        batch = rows[i:i+FFT_BATCH]
+        n = batch.shape[0]
+        if n < FFT_BATCH:
+            batch = numpy.concatenate(
+                (batch, numpy.zeros((FFT_BATCH - n, nfft))))
+        out[i:i+n] = _rfft(batch, nproc=nproc)[:n]
+    return out.reshape(frames.shape[:-1] + out.shape[-1:])
+
+
+def get_fft_frames(timeseries, positions, nfft, window='hann', nproc=1):
+    """Get the windowed FFT of frames of one or more `TimeSeries`
+
+    Each frame has its mean removed, and is windowed and scaled such
+    that ``abs(frame) ** 2`` is its one-sided power spectral density.
+    Frames are stored in `globalv.FFT_FRAMES`, for each channel, sample
+    rate, start time, FFT length and window, such that each frame is
+    transformed only once.
+
+    Parameters
+    ----------
+    timeseries : `~gwpy.timeseries.TimeSeries`, `list`
+        the data to transform, or a list of series with the same sample
+        rate and size, whose frames are transformed together
+
+    positions : `numpy.ndarray`
+        the index of the first sample in each frame
+
+    nfft : `int`
+        the number of samples in each frame
+
+    window : `str`, `tuple`, `numpy.ndarray`, optional
+        the window to apply to each frame
+
+    nproc : `int`, optional
+        the number of parallel FFT workers
+
+    Returns
+    -------
+    frames : `numpy.ndarray`
+        an array of complex FFTs, of shape ``positions.shape + (nfreq,)``,
+        with an extra first axis if a list of series is given
+    """
+    if isinstance(timeseries, (list, tuple)):
+        serieslist = timeseries
+    else:
+        serieslist = [timeseries]
+    positions = numpy.asarray(positions, dtype=int)
+    rate = serieslist[0].sample_rate.to('Hz').value
+    if isinstance(window, string_types):
+        window = canonical_name(window)
+    if isinstance(window, (string_types, tuple)):
+        win = get_window(window, nfft)
+    else:
+        win = numpy.asarray(window, dtype='float64')
+        window = None
+
+    caches = []
+    for series in serieslist:
+        name = series.channel or series.name
+        if name is None or window is None:
+            caches.append({})
+            continue
+        key = (str(name), rate, series.t0.value, nfft, window)
+        caches.append(globalv.FFT_FRAMES.pop(key, {}))
+        globalv.FFT_FRAMES[key] = caches[-1]  # most recently used last
+
+    # transform new frames, for all series at once
+    nfreq = nfft // 2 + 1
+    new = reduce(numpy.union1d, (numpy.setdiff1d(positions, list(cache))
+                                 for cache in caches))
+    if new.size:
+        idx = new[:, None] + numpy.arange(nfft)
+        segs = numpy.array([series.value[idx] for series in serieslist],
+                           dtype='float64')
+        segs -= segs.mean(axis=-1, keepdims=True)
+        segs *= win
+        fft = _rfft_frames(segs, nproc=nproc)
+        fft *= (1. / (rate * (win ** 2).sum())) ** (1/2.)
+        fft[..., 1:nfreq - (1 - nfft % 2)] *= 2 ** (1/2.)
+        for cache, frames in zip(caches, fft):
+            cache.update(zip(new.tolist(), frames))
+        # drop the least recently used frames
+        while globalv.FFT_FRAMES and sum(
+                len(c) * c[next(iter(c))].nbytes for c in
+                globalv.FFT_FRAMES.values() if c) > globalv.FFT_CACHE_SIZE:
+            globalv.FFT_FRAMES.popitem(last=False)
+
+    shape = (len(caches),) + positions.shape + (nfreq,)
+    positions = positions.ravel().tolist()
+    out = numpy.array([[cache[p] for p in positions] for cache in caches])
+    out = out.reshape(shape)
+    if serieslist is timeseries:
+        return out
+    return out[0]
+
+
+def _stft_params(timeseries, stride, fftlength, overlap, method):
+    """Find the frames of each time bin for `stft_spectrogram`
+
+    Returns the first sample of each frame (one row per time bin), and
+    the number of samples in each frame, or `None` if the spectrogram
+    can't be calculated from short-time FFTs.
+    """
+    if method not in STFT_METHODS or overlap is None:
+        return None
+    rate = timeseries.sample_rate.to('Hz').value
+    nstride = int(stride * rate)
+    nfft = int(fftlength * rate)
+    noverlap = int(overlap * rate)
+    chunks = _stft_chunks(timeseries.size, nstride, noverlap)
+    if chunks is None or nfft > nstride or noverlap >= nfft:
+        return None
+    step = nfft - noverlap
+    nframes = nstride // step
+    if method == 'rayleigh':  # follow gwpy.signal.spectral.rayleigh
+        if noverlap:
+            nframes = 1 + (nstride + noverlap - nfft) // noverlap
+        else:
+            nframes = (nstride + noverlap) // nfft
+        if (nframes - 1) * step + nfft > nstride + noverlap:
+            return None
+    return chunks[:, None] + numpy.arange(nframes) * step, nfft
+
+
+def _average_frames(frames, method):
+    """Average the power of FFT frames along the second-to-last axis
+    """
+    power = frames.real ** 2 + frames.imag ** 2
+    if method == 'welch':
+        return power.mean(axis=-2)
+    if method == 'median':
+        return (numpy.median(power, axis=-2) /
+                _median_bias(power.shape[-2]))
+    return power.std(axis=-2) / power.mean(axis=-2)
+
+
+def _stft_chunks(size, nstride, noverlap):
+    """Find the first sample of each spectrogram time bin
+
+    This follows :meth:`gwpy.timeseries.TimeSeries.spectrogram`, in
+    which each bin uses ``nstride + noverlap`` samples, with the last
+    pinned to the end of the data, returning `None` if the data are
+    too short.
+    """
+    starts = []
+    x = 0
+    step = nstride - noverlap // 2
+    nchunk = nstride + noverlap
+    while x + nstride <= size:
+        if x + nchunk >= size:
+            x = size - nchunk
+        if x < 0:
+            return None
+        starts.append(x)
+        x += step
+        step = nstride
+    return numpy.array(starts, dtype=int)
+
+
+def _median_bias(n):
+    """Bias of the median of ``n`` periodograms, see `scipy.signal.welch`
+    """
+    ii_2 = 2 * numpy.arange(1., (n - 1) // 2 + 1)
+    return 1 + numpy.sum(1. / (ii_2 + 1) - 1. / ii_2)
+
+
+# -- FFT plans ----------------------------------------------------------------
+
+FFTW_PLANNER_EFFORT = ('FFTW_ESTIMATE', 'FFTW_MEASURE', 'FFTW_PATIENT',
+                       'FFTW_EXHAUSTIVE')
+
+
+def configure_fft_plans(level=1):
+    """Configure the FFT backend used for short-time FFTs
+
+    If `pyfftw` is available, it is registered as the `scipy.fft` backend,
+    with its planner effort given by ``level``, and with plans kept for
+    the lifetime of the process.
+
+    Parameters
+    ----------
+    level : `int`, optional
+        the FFTW planning level, from ``0`` (estimate) to ``3``
+        (exhaustive), matching the LAL FFT plan levels
+
+    Returns
+    -------
+    fftw : `bool`
+        `True` if FFTW is used, otherwise `False`
+    """
+    if pyfftw is None or scipy_fft is None:
+        return False
+    pyfftw.config.PLANNER_EFFORT = FFTW_PLANNER_EFFORT[level]
+    pyfftw.interfaces.cache.enable()
+    pyfftw.interfaces.cache.set_keepalive_time(3600)
+    scipy_fft.set_global_backend(pyfftw.interfaces.scipy_fft)
+    return True
+
+
+def fft_wisdom_file(directory=None):
+    """Return the default path of the FFT wisdom cache for this host
+
+    FFTW plans are only portable between identical machines, so the cache
+    is kept per host, in ``$XDG_CACHE_HOME/gwsumm`` (``~/.cache/gwsumm``)
+    by default.
+    """
+    if directory is None:
+        directory = os.path.join(
+            os.environ.get('XDG_CACHE_HOME',
+                           os.path.join(os.path.expanduser('~'), '.cache')),
+            'gwsumm')
+    return os.path.join(directory,
+                        'fftw-wisdom-%s.pickle' % socket.gethostname())
+
+
+def load_fft_wisdom(filename):
+    """Import FFT wisdom from a file written by `save_fft_wisdom`
+
+    Returns
+    -------
+    loaded : `bool`
+        `True` if any wisdom was imported, otherwise `False`
+    """
+    if pyfftw is None or not os.path.isfile(filename):
+        return False
+    try:
+        with open(filename, 'rb') as f:
+            wisdom = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError) as e:
+        warnings.warn("Failed to read FFT wisdom from %s: %s"
+                      % (filename, str(e)))
+        return False
+    return any(pyfftw.import_wisdom(wisdom))
+
+
+def save_fft_wisdom(filename):
+    """Export FFT wisdom to a file, to be loaded by `load_fft_wisdom`
+
+    The file is replaced atomically, so runs on the same host can share
+    the same cache.
+
+    Returns
+    -------
+    saved : `bool`
+        `True` if wisdom was written, otherwise `False`
+    """
+    if pyfftw is None:
+        return False
+    directory = os.path.dirname(os.path.abspath(filename))
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(pyfftw.export_wisdom(), f)
+        os.rename(tmp, filename)
+    except Exception:
+        os.remove(tmp)
+        raise
+    return True
+
+
+def get_fft_sizes(channels, **fftparams):
+    """Find the FFT length (samples) used for each of the given channels
+
+    Channels without a known sample rate are ignored.
+
+    Parameters
+    ----------
+    channels : `list`
+        the channels to be transformed
+
+    **fftparams
+        the default FFT parameters, see `get_fftparams`
+
+    Returns
+    -------
+    sizes : `set` of `int`
+        the set of FFT lengths
+    """
+    sizes = set()
+    for channel in channels:
+        channel = get_channel(channel)
+        if channel.sample_rate is None:
+            continue
+        fftlength = get_fftparams(channel, **fftparams).fftlength
+        if fftlength:
+            sizes.add(int(fftlength * channel.sample_rate.to('Hz').value))
+    return sizes
+
+
+def prewarm_fft_plans(sizes, nproc=1):
+    """Plan the real FFT of each of the given lengths
+
+    Each FFT is planned for a batch of `FFT_BATCH` frames, the shape used
+    by `get_fft_frames`. With FFTW (see `configure_fft_plans`) this
+    records the plans in the wisdom to be saved with `save_fft_wisdom`.
+
+    Parameters
+    ----------
+    sizes : `list` of `int`
+        the FFT lengths to plan
+
+    nproc : `int`, optional
+        the number of parallel FFT workers
+    """
+    for nfft in sorted(sizes):
+        vprint("    Planning FFT of length %d\n" % nfft)
+        _rfft(numpy.zeros((FFT_BATCH, nfft)), nproc=nproc)
+
+
 # -- spectrum -----------------------------------------------------------------
 
 @use_segmentlist
@@ -392,29 +1193,26 @@ def _get_spectrum(channel, segments, config=None, cache=None, query=True,
             if 'stride' not in fftparams and 'fftlength' in fftparams:
                 fftparams.setdefault('stride', fftparams['fftlength'])
 
+            # amplitude percentiles are taken from the power histogram,
+            # since the square root doesn't change the ranking
+            if format in ['amplitude', 'asd']:
+                hformat, power = 'power', 1/2.
+            else:
+                hformat, power = format, 1
             speclist = get_spectrogram(channel, segments, config=config,
                                        cache=cache, query=query, nds=nds,
-                                       format=format, **fftparams)
-            try:
-                specgram = speclist.join(gap='ignore')
-            except ValueError as e:
-                if 'units do not match' in str(e):
-                    warnings.warn(str(e))
-                    for spec in speclist[1:]:
-                        spec.unit = speclist[0].unit
-                    specgram = speclist.join(gap='ignore')
-                else:
-                    raise
-            try:
-                globalv.SPECTRUM[name] = specgram.percentile(50)
-            except (ValueError, IndexError):
+                                       format=hformat, **fftparams)
+            hist = get_spectrum_histogram(
+                '%s,%s' % (name.rsplit(',', 1)[0], hformat), speclist)
+            if hist is None:
                 globalv.SPECTRUM[name] = FrequencySeries(
                     [], channel=channel, f0=0, df=1, unit=units.Unit(''))
                 globalv.SPECTRUM[cmin] = globalv.SPECTRUM[name]
                 globalv.SPECTRUM[cmax] = globalv.SPECTRUM[name]
             else:
-                globalv.SPECTRUM[cmin] = specgram.percentile(5)
-                globalv.SPECTRUM[cmax] = specgram.percentile(95)
+                globalv.SPECTRUM[name] = hist.percentile(50) ** power
+                globalv.SPECTRUM[cmin] = hist.percentile(5) ** power
+                globalv.SPECTRUM[cmax] = hist.percentile(95) ** power
 
     if not return_:
         return
@@ -429,3 +1227,40 @@ def _get_spectrum(channel, segments, config=None, cache=None, query=True,
     if which == 'max':
         return globalv.SPECTRUM[cmax]
     raise ValueError("Unrecognised value for `which`: %r" % which)
+
+
+def get_spectrum_histogram(key, speclist):
+    """Update the `SpectrumHistogram` for the given key
+
+    The histogram is stored in `globalv.SPECTRUM_HISTOGRAMS`, and only
+    those times not already counted are added from the ``speclist``.
+
+    Parameters
+    ----------
+    key : `str`
+        the key against which to store the histogram
+
+    speclist : `~gwpy.spectrogram.SpectrogramList`
+        the spectrograms to count
+
+    Returns
+    -------
+    hist : `SpectrumHistogram`
+        the updated histogram, or `None` if no values have been counted
+    """
+    hist = globalv.SPECTRUM_HISTOGRAMS.get(key)
+    for specgram in speclist:
+        # start again if the frequencies have changed
+        if hist is None or not (
+                hist.frequencies.size == specgram.shape[1] and
+                numpy.allclose(hist.frequencies,
+                               specgram.frequencies.value)):
+            hist = globalv.SPECTRUM_HISTOGRAMS[key] = (
+                SpectrumHistogram.from_spectrogram(specgram))
+        elif specgram.unit != hist.unit:
+            warnings.warn("units do not match (%s vs %s) for %s spectrum"
+                          % (specgram.unit, hist.unit, key))
+        hist.add(specgram)
+    if hist is None or not hist.counts.any() and not hist.zeros.any():
+        return None
+    return hist
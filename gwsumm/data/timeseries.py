@@ -33,6 +33,8 @@ from configparser import (NoSectionError, NoOptionError)
 from six.moves import reduce
 from six.moves.urllib.parse import urlparse
 
+import numpy
+
 from astropy import units
 
 import gwdatafind
@@ -828,12 +830,12 @@ def get_timeseries(channel, segments, config=None, cache=None,
     return
 
 
-def add_timeseries(timeseries, key=None, coalesce=True):
+def add_timeseries(timeseries, key=None, coalesce=True, compress=None):
     """Add a `TimeSeries` to the global memory cache
 
     Parameters
     ----------
-    timeseries : `TimeSeries` or `StateVector`
+    timeseries : `TimeSeries`, `StateVector`, or `RunLengthSeries`
         the data series to add
 
     key : `str`, optional
@@ -842,13 +844,25 @@ def add_timeseries(timeseries, key=None, coalesce=True):
 
     coalesce : `bool`, optional
         coalesce contiguous series after adding, defaults to `True`
+
+    compress : `bool`, optional
+        store these data as a `RunLengthSeries`, defaults to `True`
+        for state data (state-vectors or Guardian channels) if
+        `globalv.COMPRESS_STATE_DATA` is `True`, otherwise `False`
     """
     if timeseries.channel is not None:
         # transfer parameters from timeseries.channel to the globalv channel
         update_missing_channel_params(timeseries.channel)
     if key is None:
         key = timeseries.name or timeseries.channel.ndsname
-    if isinstance(timeseries, StateVector):
+    if compress is None:
+        compress = globalv.COMPRESS_STATE_DATA and is_state_data(timeseries)
+    if compress or isinstance(timeseries, RunLengthSeries):
+        # convert existing data so that they can be coalesced
+        globalv.DATA[key] = RunLengthList(map(
+            RunLengthSeries.from_timeseries, globalv.DATA.get(key, [])))
+        timeseries = RunLengthSeries.from_timeseries(timeseries)
+    elif isinstance(timeseries, StateVector):
         globalv.DATA.setdefault(key, StateVectorList())
     else:
         globalv.DATA.setdefault(key, TimeSeriesList())
@@ -857,6 +871,229 @@ def add_timeseries(timeseries, key=None, coalesce=True):
         globalv.DATA[key].coalesce()
 
 
+def is_state_data(timeseries):
+    """Returns `True` if the given series represents state data
+
+    State data are any `~gwpy.timeseries.StateVector`, or the data for a
+    Guardian channel, which are both normally constant for long periods.
+    """
+    return (isinstance(timeseries, StateVector) or
+            ':GRD-' in str(timeseries.channel))
+
+
+# -- compressed state data ----------------------------------------------------
+
+class RunLengthSeries(object):
+    """A run-length encoded representation of a `TimeSeries`
+
+    This stores the value, first sample, and number of samples, for each
+    run of constant value, which for state data is normally orders of
+    magnitude smaller than the full-rate series.
+    Samples are only expanded when a (cropped) series is requested,
+    via :meth:`RunLengthSeries.crop` or :meth:`RunLengthSeries.expand`.
+
+    Parameters
+    ----------
+    values : `numpy.ndarray`
+        the value of each run
+
+    starts : `numpy.ndarray`
+        the index of the first sample of each run
+
+    lengths : `numpy.ndarray`
+        the number of samples in each run
+
+    t0 : `float`
+        the GPS time of the first sample
+
+    dt : `float`
+        the time (seconds) between samples
+
+    series_class : `type`, optional
+        the type of series to return when expanded, default:
+        `~gwpy.timeseries.StateVector`
+
+    **metadata
+        other metadata to attach to expanded series, e.g. ``name``,
+        ``channel``, ``unit``, or ``bits``
+    """
+    _metadata = ('name', 'channel', 'unit', 'bits')
+
+    def __init__(self, values, starts, lengths, t0, dt,
+                 series_class=StateVector, **metadata):
+        self.values = numpy.asarray(values)
+        self.starts = numpy.asarray(starts, dtype=int)
+        self.lengths = numpy.asarray(lengths, dtype=int)
+        self.t0 = units.Quantity(t0, 's')
+        self.dt = units.Quantity(dt, 's')
+        self.series_class = series_class
+        for attr in self._metadata:
+            setattr(self, attr, metadata.pop(attr, None))
+        if metadata:
+            raise TypeError("unexpected keyword argument %r"
+                            % list(metadata)[0])
+
+    @classmethod
+    def from_timeseries(cls, series):
+        """Encode a `TimeSeries` as a new `RunLengthSeries`
+
+        If ``series`` is already a `RunLengthSeries` it is returned as is.
+        """
+        if isinstance(series, cls):
+            return series
+        data = numpy.asarray(series.value)
+        starts = numpy.concatenate((
+            [0], numpy.flatnonzero(data[1:] != data[:-1]) + 1))[:data.size]
+        lengths = numpy.diff(numpy.append(starts, data.size))
+        return cls(data[starts], starts, lengths, series.t0.value,
+                   series.dt.value, series_class=type(series),
+                   **dict((attr, getattr(series, attr, None)) for
+                          attr in cls._metadata))
+
+    @property
+    def size(self):
+        """Number of samples represented by this series
+        """
+        return int(self.lengths.sum())
+
+    @property
+    def nbytes(self):
+        """Number of bytes used to store the runs
+        """
+        return self.values.nbytes + self.starts.nbytes + self.lengths.nbytes
+
+    @property
+    def sample_rate(self):
+        return (1 / self.dt).to('Hz')
+
+    @property
+    def span(self):
+        t0 = self.t0.value
+        return Segment(t0, t0 + self.size * self.dt.value)
+
+    def expand(self, start=0, stop=None):
+        """Expand these runs into a full-rate series
+
+        Parameters
+        ----------
+        start : `int`, optional
+            the index of the first sample to return
+
+        stop : `int`, optional
+            the index after the last sample to return, defaults
+            to the end of the series
+
+        Returns
+        -------
+        series : `~gwpy.timeseries.TimeSeries`
+            the expanded series, of type ``series_class``
+        """
+        size = self.size
+        if stop is None or stop > size:
+            stop = size
+        start = min(max(start, 0), stop)
+        # only expand runs that overlap the requested samples
+        i = max(numpy.searchsorted(self.starts, start, side='right') - 1, 0)
+        j = numpy.searchsorted(self.starts, stop, side='left')
+        data = numpy.repeat(self.values[i:j], self.lengths[i:j])
+        offset = start - (self.starts[i] if j > i else start)
+        data = data[offset:offset + stop - start]
+        metadata = dict((attr, getattr(self, attr)) for
+                        attr in self._metadata if attr != 'bits')
+        out = self.series_class(data, t0=self.t0.value +
+                                start * self.dt.value,
+                                dt=self.dt.value, **metadata)
+        if self.bits is not None:
+            out.bits = self.bits
+        return out
+
+    def crop(self, start=None, end=None, copy=False):
+        """Expand the samples between the given GPS times
+
+        See :meth:`gwpy.timeseries.TimeSeries.crop` for details, the
+        ``copy`` keyword is ignored, as the output is always new
+        """
+        t0 = self.t0.value
+        dt = self.dt.value
+        i = 0 if start is None else max(int((float(start) - t0) // dt), 0)
+        j = None if end is None else int((float(end) - t0) // dt)
+        return self.expand(i, j)
+
+    def is_contiguous(self, other, tol=1/2.**18):
+        """Check whether other is contiguous with self
+
+        Returns ``1`` if ``other`` follows this series, ``-1`` if it
+        precedes it, or ``0`` otherwise, as for
+        :meth:`gwpy.timeseries.TimeSeries.is_contiguous`
+        """
+        if abs(self.span[1] - other.span[0]) < tol:
+            return 1
+        if abs(other.span[1] - self.span[0]) < tol:
+            return -1
+        return 0
+
+    def append(self, other):
+        """Append a contiguous series to the end of this one, in place
+
+        Returns
+        -------
+        self : `RunLengthSeries`
+            this series, with the new runs added
+        """
+        other = self.from_timeseries(other)
+        if not numpy.isclose(self.dt.value, other.dt.value):
+            raise ValueError("Cannot append series with different sample "
+                             "spacing")
+        if self.is_contiguous(other) != 1:
+            raise ValueError("Cannot append discontiguous series")
+        values = other.values
+        starts = other.starts + self.size
+        lengths = other.lengths
+        # merge the boundary runs if they have the same value
+        if self.values.size and values.size and values[0] == self.values[-1]:
+            self.lengths = self.lengths.copy()
+            self.lengths[-1] += lengths[0]
+            values, starts, lengths = values[1:], starts[1:], lengths[1:]
+        self.values = numpy.concatenate((self.values, values))
+        self.starts = numpy.concatenate((self.starts, starts))
+        self.lengths = numpy.concatenate((self.lengths, lengths))
+        return self
+
+    def __len__(self):
+        return self.size
+
+    def __repr__(self):
+        return '<%s(%s, %d runs, span=%s)>' % (
+            type(self).__name__, self.name, self.values.size, self.span)
+
+
+class RunLengthList(list):
+    """List of `RunLengthSeries`, mirroring `~gwpy.timeseries.TimeSeriesList`
+    """
+    @property
+    def segments(self):
+        """The `span` of each series in this list
+        """
+        return SegmentList([item.span for item in self])
+
+    def append(self, item):
+        return super(RunLengthList, self).append(
+            RunLengthSeries.from_timeseries(item))
+
+    def coalesce(self):
+        """Merge contiguous elements of this list into single objects
+        """
+        self.sort(key=lambda ts: ts.t0.value)
+        out = []
+        for series in self:
+            if out and out[-1].is_contiguous(series) == 1:
+                out[-1].append(series)
+            else:
+                out.append(series)
+        self[:] = out
+        return self
+
+
 def resample_timeseries_dict(tsd, nproc=1, **sampling_dict):
     """Resample a `TimeSeriesDict`
 
@@ -21,6 +21,7 @@
 """
 
 import time
+from collections import OrderedDict
 
 from gwpy.time import to_gps
 from gwpy.segments import DataQualityDict
@@ -31,11 +32,19 @@ STATES = {}
 
 DATA = {}
 SPECTROGRAMS = {}
+SPECTROGRAM_BUFFERS = {}
 SPECTRUM = {}
+SPECTRUM_HISTOGRAMS = {}
+FFT_FRAMES = OrderedDict()
+FFT_CACHE_SIZE = 2 ** 30
 COHERENCE_COMPONENTS = {}
 COHERENCE_SPECTRUM = {}
+COHERENCE_MATRIX = {}
 SEGMENTS = DataQualityDict()
 TRIGGERS = {}
+TRIGGER_COLUMNS = {}
+TRIGGER_RATES = {}
+TRIGGER_LOUDEST = {}
 
 VERBOSE = False
 PROFILE = False
@@ -46,6 +55,7 @@ MODE = 0
 WRITTEN_PLOTS = []
 NOW = int(to_gps('now'))
 HTMLONLY = False
+COMPRESS_STATE_DATA = False
 
 # comments
 IFO = None
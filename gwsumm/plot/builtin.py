@@ -42,7 +42,7 @@ from ..mode import (Mode, get_mode)
 from ..utils import re_cchar
 from ..data import (get_timeseries, get_spectrogram,
                     get_coherence_spectrogram, get_spectrum,
-                    get_coherence_spectrum)
+                    get_coherence_spectrum, get_coherence_matrix)
 from ..state import ALLSTATE
 from .registry import (get_plot, register_plot)
 from .mixins import DataLabelSvgMixin
@@ -165,8 +165,7 @@ class TimeSeriesDataPlot(DataLabelSvgMixin, DataPlot):
         for clist, pargs in list(zip(groups, plotargs)):
             # get data
             valid = self._get_data_segments(clist[0])
-            data = [get_timeseries(c, valid, query=False)
-                    for c in clist]
+            data = [self._get_data(c, valid) for c in clist]
 
             if len(clist) > 1:
                 data = [tsl.join(gap='pad', pad=numpy.nan) for tsl in data]
@@ -232,6 +231,11 @@ class TimeSeriesDataPlot(DataLabelSvgMixin, DataPlot):
                 1/channel.sample_rate.value)])
         return SegmentList([self.span])
 
+    def _get_data(self, channel, segments):
+        """Get the data for a channel in this plot
+        """
+        return get_timeseries(channel, segments, query=False)
+
 
 register_plot(TimeSeriesDataPlot)
 
@@ -607,6 +611,129 @@ class CoherenceSpectrumDataPlot(SpectrumDataPlot):
 register_plot(CoherenceSpectrumDataPlot)
 
 
+class CoherenceMatrixDataPlot(SpectrumDataPlot):
+    """Coherence of one channel with many others for a `DataTab`
+
+    The first channel is the reference, the upper panel shows the median
+    coherence spectrum of each other channel with the reference, the lower
+    panel shows the same as a heat map of channel against frequency.
+    """
+    type = 'coherence-matrix'
+    data = 'coherence-matrix'
+    defaults = SpectrumDataPlot.defaults.copy()
+    defaults.update({
+        'yscale': 'linear',
+        'ylim': (0, 1),
+        'ylabel': 'Coherence',
+        'percentile': 50,
+        'cmap': 'viridis',
+        'clim': (0, 1),
+        'colorlabel': 'Coherence',
+        'rasterized': True,
+    })
+
+    def get_channel_groups(self):
+        """Hi-jacked method to return the non-reference channels
+
+        For the `CoherenceMatrixDataPlot` this method is only used in
+        determining how to separate lists of plotting argument given by
+        the user.
+        """
+        return [(c.texname, [c]) for c in self.channels[1:]]
+
+    def _draw(self):
+        """Load all data, and generate this `CoherenceMatrixDataPlot`
+        """
+        plot = self.init_plot(geometry=(2, 1), sharey=False)
+        specax, matax = plot.axes
+        specax.grid(b=True, axis='both', which='both')
+
+        if self.state:
+            self.pargs.setdefault(
+                'suptitle',
+                '[%s-%s, state: %s]' % (self.span[0], self.span[1],
+                                        usetex_tex(str(self.state))))
+        suptitle = self.pargs.pop('suptitle', None)
+        if suptitle:
+            plot.suptitle(suptitle, y=0.993, va='top')
+
+        # parse colorbar and matrix arguments
+        q = float(self.pargs.pop('percentile'))
+        cmap = self.pargs.pop('cmap')
+        clabel = self.pargs.pop('colorlabel')
+        vmin, vmax = self.pargs.pop('clim')
+        for key in ('format', 'no-percentiles', 'rasterized'):
+            self.pargs.pop(key, None)
+
+        # parse plotting arguments
+        plotargs = self.parse_plot_kwargs()
+        legendargs = self.parse_legend_kwargs()
+
+        # get data
+        if self.state and not self.all_data:
+            valid = self.state.active
+        else:
+            valid = SegmentList([self.span])
+        matrix = get_coherence_matrix(self.channels, valid, query=False)
+        frequencies = numpy.asarray(matrix.frequencies)
+        value = matrix.percentile(q)
+
+        # anticipate log problems
+        if self.logx and frequencies.size:
+            frequencies = frequencies[1:]
+            value = value[:, 1:]
+
+        # plot spectra
+        if frequencies.size:
+            for i, (channel, pargs) in enumerate(zip(self.channels[1:],
+                                                     plotargs)):
+                specax.plot(frequencies, value[i], **pargs)
+
+        # plot matrix, using bin edges half-way between frequencies
+        nchan = len(self.channels) - 1
+        if frequencies.size > 1:
+            edges = numpy.concatenate((
+                [frequencies[0] - (frequencies[1] - frequencies[0]) / 2.],
+                (frequencies[1:] + frequencies[:-1]) / 2.,
+                [frequencies[-1] + (frequencies[-1] - frequencies[-2]) / 2.],
+            ))
+            if self.logx:
+                edges[0] = frequencies[0] ** 2 / edges[1]
+            mesh = matax.pcolormesh(edges, numpy.arange(nchan + 1) - .5,
+                                    value, cmap=cmap, vmin=vmin, vmax=vmax,
+                                    rasterized=True)
+        else:
+            mesh = matax.pcolormesh([1, 10], [1, 10], [[vmin]], cmap=cmap,
+                                    vmin=vmin, vmax=vmax, visible=False)
+        matax.colorbar(mesh, label=clabel)
+        matax.set_ylim(nchan - .5, -.5)
+        matax.set_yticks(range(nchan))
+        matax.set_yticklabels([])
+        # label rows inside the axes, channel names are too long for ticks
+        transform = matax.get_yaxis_transform()
+        for i, channel in enumerate(self.channels[1:]):
+            matax.text(.01, i, usetex_tex(channel.ndsname), va='center',
+                       fontsize='x-small', transform=transform,
+                       bbox={'facecolor': 'white', 'alpha': .7,
+                             'edgecolor': 'none'})
+        matax.set_xscale(self.pargs.get('xscale', 'log'))
+        matax.set_xlabel('Frequency [Hz]')
+        matax.set_ylabel('')
+
+        # customise
+        self.add_hvlines()
+        self.apply_parameters(specax, **self.pargs)
+        if self.pargs.get('xlim') is not None:
+            matax.set_xlim(*self.pargs['xlim'])
+        if frequencies.size:
+            specax.legend(**legendargs)
+
+        return self.finalize()
+
+
+register_plot(CoherenceMatrixDataPlot)
+
+
 class TimeSeriesHistogramPlot(DataPlot):
     """HistogramPlot from a Series
     """
@@ -23,8 +23,6 @@ from __future__ import division
 
 import re
 from math import pi
-from heapq import nlargest
-from itertools import combinations
 
 from six import string_types
 
@@ -32,21 +30,21 @@ import numpy
 
 from matplotlib.ticker import MaxNLocator
 
-from gwpy.segments import (Segment, SegmentList)
+from gwpy.segments import SegmentList
 from gwpy.timeseries import TimeSeries
 
 from .registry import (get_plot, register_plot)
 from .utils import hash
 from ..data import (get_range_channel, get_range, get_timeseries)
-from ..segments import get_segments
+from ..segments import (get_segments, get_livetime,
+                        get_coincident_segments)
 from ..channels import split as split_channels
 
 __author__ = 'Duncan Macleod <duncan.macleod@ligo.org>'
 
 
 class RangePlotMixin(object):
-    data = 'spectrogram'
-    _threadsafe = False
+    data = 'range'
     defaults = {
         'snr': 8.0,
         'stride': 60.,
@@ -68,20 +66,40 @@ class RangePlotMixin(object):
                 value = [value]*len(self.channels)
             self.rangeparams[key] = value
 
+    def get_range_kwargs(self, index):
+        """Return the range parameters for the given channel index
+
+        Parameters
+        ----------
+        index : `int`
+            the index of the relevant channel in ``self.channels``
+
+        Returns
+        -------
+        rangekwargs : `dict`
+            `dict` of keyword arguments to pass to
+            :func:`~gwsumm.data.get_range`
+        """
+        return dict((key, self.rangeparams[key][index]) for
+                    key in self.rangeparams if
+                    self.rangeparams[key][index] is not None)
+
     def draw(self):
         """Read in all necessary data, and generate the figure.
+
+        The range data are calculated in the data-processing phase by
+        :meth:`gwsumm.tabs.DataTab.process_state`, this method only reads
+        them from memory.
         """
-        # generate data
+        # get data
         keys = []
         for i, channel in enumerate(self.channels):
-            kwargs = dict((key, self.rangeparams[key][i]) for
-                          key in self.rangeparams if
-                          self.rangeparams[key][i] is not None)
+            kwargs = self.get_range_kwargs(i)
             if self.state and not self.all_data:
                 valid = self.state.active
             else:
                 valid = SegmentList([self.span])
-            rlist = get_range(channel, valid, query=self.read, **kwargs)
+            rlist = get_range(channel, valid, query=False, **kwargs)
             try:
                 keys.append(rlist[0].channel)
             except IndexError:
@@ -174,15 +192,9 @@ class SimpleTimeVolumeDataPlot(get_plot('segments')):
         # override range units
         range.override_unit('Mpc')
 
-        # use float, not LIGOTimeGPS for speed
-        segments = type(segments)([type(s)(float(s[0]), float(s[1])) for
-                                  s in segments])
-
-        def livetime_(t):
-            return float(abs(SegmentList([Segment(t, t+dx)]) & segments))
-
-        livetime = numpy.vectorize(livetime_, otypes=[float])
-        ts[:] = livetime(ts.times.value) * ts.unit
+        # calculate livetime in each bin
+        times = ts.times.value
+        ts[:] = get_livetime(segments, times, times + dx) * ts.unit
         return (4/3. * pi * ts * range ** 3).to('Mpc^3 kyr')
 
     def combined_time_volume(self, allsegments, allranges):
@@ -195,16 +207,12 @@ class SimpleTimeVolumeDataPlot(get_plot('segments')):
                 x0=allranges[0].x0, dx=allranges[0].dx)
 
         # get coincident observing segments
-        pairs = list(combinations(allsegments, 2))
-        coincident = SegmentList()
-        for pair in pairs:
-            coincident.extend(pair[0] & pair[1])
-        coincident = coincident.coalesce()
-
-        # get effective network range
-        values = [r.value for r in allranges]
-        values = [min(nlargest(2, x)) for x in zip(*values)]
+        coincident = get_coincident_segments(allsegments, n=2)
+
+        # get effective network range (second-largest single-detector range)
         size = min([r.size for r in allranges])
+        values = numpy.sort(numpy.vstack(
+            [r.value[:size] for r in allranges]), axis=0)[-2]
         combined_range[:size] = values * combined_range.unit
 
         # compute time-volume
@@ -298,7 +306,6 @@ class GWpyTimeVolumeDataPlot(RangePlotMixin, SimpleTimeVolumeDataPlot):
     """TimeVolumeDataPlot where the range is calculated on-the-fly
     """
     type = 'strain-time-volume'
-    _threadsafe = False
 
 
 register_plot(GWpyTimeVolumeDataPlot)
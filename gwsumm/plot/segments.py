@@ -51,7 +51,8 @@ from ..mode import (Mode, get_mode)
 from ..utils import (re_quote, get_odc_bitmask, re_flagdiv, safe_eval)
 from ..channels import (get_channel, re_channel)
 from ..data import get_timeseries
-from ..segments import (get_segments, format_padding)
+from ..segments import (get_segments, format_padding, get_duty_factor,
+                        get_bit_segments, SegmentArray)
 from ..state import ALLSTATE
 from .core import (BarPlot, PiePlot, format_label)
 from .registry import (get_plot, register_plot)
@@ -425,6 +426,33 @@ class StateVectorDataPlot(TimeSeriesDataPlot):
             labels.append(None)
         return labels
 
+    def get_channel_bits(self):
+        """Return the bits to decode for each channel of this plot
+
+        Returns
+        -------
+        bits : `list` of `tuple`
+            a ``(channel, bits)`` pair for each channel, where ``bits``
+            is the name of each bit, with `None` for unused bits
+        """
+        bits = self.pargs.get('bits', None)
+        out = []
+        for channel in map(get_channel, self.channels):
+            if bits:
+                bits_ = [x if i in bits else None for
+                         (i, x) in enumerate(channel.bits)]
+            else:
+                try:
+                    bits_ = channel.bits
+                except AttributeError:
+                    m = list(re_channel.findall(str(channel)))
+                    if len(m) == 1 and hasattr(get_channel(m[0]), 'bits'):
+                        bits_ = get_channel(m[0]).bits
+                    else:
+                        raise
+            out.append((channel, bits_))
+        return out
+
     def parse_plot_kwargs(self, *args, **kwargs):
         self.get_segment_color()
         return super(StateVectorDataPlot, self).parse_plot_kwargs(
@@ -444,58 +472,28 @@ class StateVectorDataPlot(TimeSeriesDataPlot):
         ax = plot.gca()
 
         # get bit setting
-        bits = self.pargs.pop('bits', None)
-        if bits and len(self.channels) > 1:
+        if self.pargs.get('bits', None) and len(self.channels) > 1:
             raise ValueError("Specifying 'bits' doesn't work for a "
                              "state-vector plot including multiple channels")
+        chanbits = self.get_channel_bits()
+        self.pargs.pop('bits', None)
 
         # extract plotting arguments
         extraargs = self.parse_plot_kwargs()
 
         # plot segments
         nflags = 0
-        for channel, pargs in zip(self.channels[::-1], extraargs[::-1]):
+        for (channel, bits_), pargs in zip(chanbits[::-1], extraargs[::-1]):
             if self.state and not self.all_data:
                 valid = self.state.active
             else:
                 valid = SegmentList([self.span])
-            channel = get_channel(channel)
-            if bits:
-                bits_ = [x if i in bits else None for
-                         (i, x) in enumerate(channel.bits)]
-            else:
-                try:
-                    bits_ = channel.bits
-                except AttributeError:
-                    m = list(re_channel.findall(str(channel)))
-                    if len(m) == 1 and hasattr(get_channel(m[0]), 'bits'):
-                        bits_ = get_channel(m[0]).bits
-                    else:
-                        raise
             data = get_timeseries(str(channel), valid, query=False,
                                   statevector=True)
-            flags = None
-            for stateseries in data:
-                if not stateseries.size:
-                    stateseries.epoch = self.start
-                    stateseries.dx = 0
-                    if channel.sample_rate is not None:
-                        stateseries.sample_rate = channel.sample_rate
-                stateseries.bits = bits_
-                if 'int' not in str(stateseries.dtype):
-                    stateseries = stateseries.astype('uint32')
-                newflags = list(stateseries.to_dqflags().values())
-                if self.pargs.get('on-is-bad', False):
-                    for i, flag in enumerate(newflags):
-                        newflags[i] = ~newflags[i]
-                if flags is None:
-                    flags = newflags
-                else:
-                    for i, flag in enumerate(newflags):
-                        flags[i] += flag
-            if flags is None:
-                flags = [DataQualityFlag(b) for b in channel.bits if
-                         b not in [None, '']]
+            flags = list(get_bit_segments(str(channel), data, bits_,
+                                          query=False).values())
+            if self.pargs.get('on-is-bad', False):
+                flags = [~flag for flag in flags]
             nflags += len([m for m in bits_ if m is not None])
             labels = pargs.pop('label', [None]*len(flags))
             if isinstance(labels, str):
@@ -610,23 +608,14 @@ class DutyDataPlot(SegmentDataPlot):
             normalized = 100.
         else:
             normalized = float(normalized)
-        if not bins:
+        if bins is None:
             bins = self.get_bins()
         if isinstance(segments, DataQualityFlag):
-            segments = segments.known & segments.active
-        duty = numpy.zeros(len(bins))
-        mean = numpy.zeros(len(bins))
-        for i in range(len(bins)):
-            bin = SegmentList([Segment(self.start + float(sum(bins[:i])),
-                                       self.start + float(sum(bins[:i+1])))])
-            d = float(abs(segments & bin))
-            if normalized:
-                d *= normalized / bins[i]
-            duty[i] = d
-            mean[i] = duty[:i+1].mean()
-        if cumulative:
-            duty = duty.cumsum()
-        return duty, mean
+            segments = SegmentArray(segments.known) & segments.active
+        edges = float(self.start) + numpy.concatenate(
+            ([0], numpy.cumsum(bins, dtype=float)))
+        return get_duty_factor(segments, edges[:-1], edges[1:],
+                               normalized=normalized, cumulative=cumulative)
 
     def draw(self, outputfile=None):
         sep = self.pargs.pop('sep', False)
@@ -827,6 +816,22 @@ class ODCDataPlot(SegmentLabelSvgMixin, StateVectorDataPlot):
     def get_bitmask_channels(self):
         return type(self.channels)(list(map(get_channel, self.bitmask)))
 
+    def get_channel_bits(self):
+        """Return the bits to decode for each channel of this plot
+
+        The bits of each bitmask channel are named as for its ODC channel.
+
+        Returns
+        -------
+        bits : `list` of `tuple`
+            a ``(channel, bits)`` pair for each ODC and bitmask channel
+        """
+        out = []
+        for channel, bitmaskchan in zip(self.channels,
+                                        self.get_bitmask_channels()):
+            out.extend([(channel, channel.bits), (bitmaskchan, channel.bits)])
+        return out
+
     @property
     def pid(self):
         try:
@@ -875,26 +880,16 @@ class ODCDataPlot(SegmentLabelSvgMixin, StateVectorDataPlot):
                                   statevector=True)
             bitmask = get_timeseries(bitmaskchan, valid, query=False,
                                      statevector=True)
-            # plot bitmask
+            # decode bits for both the bitmask and the data
             flags = {}
-            # plot bits
-            for type_, svlist in zip(['bitmask', 'data'], [bitmask, data]):
-                flags[type_] = None
-                for stateseries in svlist:
-                    if not stateseries.size:
-                        stateseries.epoch = self.start
-                        stateseries.dx = 0
-                        if channel.sample_rate is not None:
-                            stateseries.sample_rate = channel.sample_rate
-                    stateseries.bits = channel.bits
-                    if 'int' not in str(stateseries.dtype):
-                        stateseries = stateseries.astype('uint32')
-                    newflags = stateseries.to_dqflags()
-                    if flags[type_] is None:
-                        flags[type_] = newflags
-                    else:
-                        for i, flag in newflags.items():
-                            flags[type_][i] += flag
+            for type_, chan, svlist in zip(['bitmask', 'data'],
+                                           [bitmaskchan, channel],
+                                           [bitmask, data]):
+                if svlist:
+                    flags[type_] = get_bit_segments(
+                        str(chan), svlist, channel.bits, query=False)
+                else:
+                    flags[type_] = None
             i = 0
             for i, bit in enumerate(channel.bits):
                 if bit is None or bit == '':
@@ -914,12 +909,15 @@ class ODCDataPlot(SegmentLabelSvgMixin, StateVectorDataPlot):
                     nflags += 2
                 # plot masks and separate masked/not masked
                 else:
+                    maskarr = SegmentArray(mask)
+                    known = SegmentArray(segs.known)
+                    active = SegmentArray(segs.active)
                     maskon = segs.copy()
-                    maskon.known &= mask
-                    maskon.active &= mask
+                    maskon.known = (known & maskarr).to_segmentlist()
+                    maskon.active = (active & maskarr).to_segmentlist()
                     maskoff = segs.copy()
-                    maskoff.known -= mask
-                    maskoff.active -= mask
+                    maskoff.known = (known - maskarr).to_segmentlist()
+                    maskoff.active = (active - maskarr).to_segmentlist()
                     # plot mask
                     ax.plot(mask, y=-nflags, facecolor=inmaskcolor,
                             edgecolor='none', height=1., label=None,
@@ -1026,6 +1024,7 @@ class SegmentPiePlot(PiePlot, SegmentDataPlot):
                 valid = SegmentList([self.span])
             segs = get_segments(flag, validity=valid, query=False,
                                 padding=self.padding).coalesce()
+            # one total per flag, so there are no bins for get_duty_factor
             data.append(float(abs(segs.active)))
         if future:
             total = sum(data)
@@ -1248,6 +1247,7 @@ class SegmentBarPlot(BarPlot, SegmentDataPlot):
                 valid = SegmentList([self.span])
             segs = get_segments(flag, validity=valid, query=False,
                                 padding=self.padding).coalesce()
+            # one total per flag, so there are no bins for get_duty_factor
             livetime = float(abs(segs.active))
             if scale == 'percent':
                 try:
@@ -33,13 +33,14 @@ from astropy.units import Quantity
 
 from gwpy.detector import (Channel, ChannelList)
 from gwpy.segments import SegmentList
+from gwpy.timeseries import TimeSeriesList
+from gwpy.table.filter import parse_column_filters
 from gwpy.plot.gps import GPSTransform
 from gwpy.plot.utils import (color_cycle, marker_cycle)
 
-from .. import globalv
 from ..utils import re_cchar
-from ..data import (get_channel, get_timeseries, add_timeseries)
-from ..triggers import (get_triggers, get_time_column)
+from ..data import (get_channel, get_timeseries)
+from ..triggers import (get_triggers, get_binned_rates)
 from .registry import (get_plot, register_plot)
 from .utils import (get_column_string, hash, usetex_tex)
 
@@ -83,6 +84,14 @@ class TriggerPlotMixin(object):
             self._pid = hash(chans + filts)
             return self.pid
 
+    @property
+    def trigger_columns(self):
+        """The `set` of table columns needed to draw this plot
+        """
+        if self.filterstr:
+            return set(f[0] for f in parse_column_filters(self.filterstr))
+        return set()
+
 
 class TriggerDataPlot(TriggerPlotMixin, TimeSeriesDataPlot):
     """Standard event trigger plot
@@ -136,6 +145,13 @@ class TriggerDataPlot(TriggerPlotMixin, TimeSeriesDataPlot):
     def pid(self, id_):
         self._pid = str(id_)
 
+    @property
+    def trigger_columns(self):
+        columns = super(TriggerDataPlot, self).trigger_columns
+        columns.update(self.columns + [self.pargs.get('loudest-by')])
+        columns.discard(None)
+        return columns
+
     def draw(self):
         # get columns
         xcolumn, ycolumn, ccolumn = self.columns
@@ -413,6 +429,13 @@ class TriggerHistogramPlot(TriggerPlotMixin, get_plot('histogram')):
         self.etg = self.pargs.pop('etg')
         self.column = self.pargs.pop('column')
 
+    @property
+    def trigger_columns(self):
+        columns = super(TriggerHistogramPlot, self).trigger_columns
+        columns.update([self.column])
+        columns.discard(None)
+        return columns
+
     @property
     def pid(self):
         try:
@@ -529,6 +552,13 @@ class TriggerRateDataPlot(TriggerPlotMixin, TimeSeriesDataPlot):
         self.etg = self.pargs.pop('etg')
         self.column = self.pargs.pop('column')
 
+    @property
+    def trigger_columns(self):
+        columns = super(TriggerRateDataPlot, self).trigger_columns
+        columns.update([self.column, self.pargs.get('timecolumn')])
+        columns.discard(None)
+        return columns
+
     @property
     def pid(self):
         try:
@@ -544,12 +574,43 @@ class TriggerRateDataPlot(TriggerPlotMixin, TimeSeriesDataPlot):
     def pid(self, id_):
         self._pid = str(id_)
 
+    def get_rate_args(self):
+        """Return the arguments to `get_binned_rates` for each channel
+
+        Returns
+        -------
+        rates : `list` of `tuple`
+            a ``(key, segments, ratekwargs)`` tuple for each channel,
+            where ``ratekwargs`` is a `dict` of keyword arguments to pass
+            to :func:`~gwsumm.triggers.get_binned_rates`
+        """
+        if self.state and not self.all_data:
+            valid = self.state.active
+        else:
+            valid = SegmentList([self.span])
+        ratekwargs = {'stride': self.pargs['stride'], 'start': self.start,
+                      'end': self.end, 'filterstr': self.filterstr,
+                      'timecolumn': self.pargs.get('timecolumn', None)}
+        if self.column:
+            ratekwargs.update(column=self.column, bins=self.pargs['bins'],
+                              operator=self.pargs.get('operator', '>='))
+        out = []
+        for channel in self.channels:
+            if '#' in str(channel) or '@' in str(channel):
+                key = '%s,%s' % (str(channel),
+                                 str(self.state) if self.state else 'All')
+            else:
+                key = str(channel)
+            out.append((key, valid, ratekwargs))
+        return out
+
     def draw(self):
         """Read in all necessary data, and generate the figure.
         """
 
         # get rate arguments
-        stride = self.pargs.pop('stride')
+        rateargs = self.get_rate_args()
+        self.pargs.pop('stride')
         if self.column:
             cname = get_column_string(self.column)
             bins = self.pargs.pop('bins')
@@ -579,38 +640,21 @@ class TriggerRateDataPlot(TriggerPlotMixin, TimeSeriesDataPlot):
         self.pargs['labels'] = [str(s).strip('\n ') for s in labels]
 
         # get time column
-        tcol = self.pargs.pop('timecolumn', None)
+        self.pargs.pop('timecolumn', None)
 
-        # generate data
+        # generate data from the counts made when the triggers were read
         keys = []
-        for channel in self.channels:
-            if self.state and not self.all_data:
-                valid = self.state.active
-            else:
-                valid = SegmentList([self.span])
-            if '#' in str(channel) or '@' in str(channel):
-                key = '%s,%s' % (str(channel),
-                                 str(self.state) if self.state else 'All')
-            else:
-                key = str(channel)
-            table_ = get_triggers(key, self.etg, valid, query=False)
-            if self.filterstr is not None:
-                table_ = table_.filter(self.filterstr)
-            tcol_ = tcol or get_time_column(table_, self.etg)
-            if self.column:
-                rates = list(table_.binned_event_rates(
-                    stride, self.column, bins, operator=operator,
-                    start=self.start, end=self.end, timecolumn=tcol_).values())
-            else:
-                rates = [table_.event_rate(stride, start=self.start,
-                                           end=self.end, timecolumn=tcol_)]
+        self._rates = {}
+        for channel, (key, valid, ratekwargs) in zip(self.channels,
+                                                     rateargs):
+            rates = get_binned_rates(key, self.etg, valid, query=False,
+                                     **ratekwargs)
             for bin, rate in zip(bins, rates):
                 rate.channel = channel
                 keys.append('%s_%s_EVENT_RATE_%s_%s'
                             % (str(channel), str(self.etg),
                                str(self.column), bin))
-                if keys[-1] not in globalv.DATA:
-                    add_timeseries(rate, keys[-1])
+                self._rates[keys[-1]] = rate
 
         # reset channel lists and generate time-series plot
         channels = self.channels
@@ -620,5 +664,18 @@ class TriggerRateDataPlot(TriggerPlotMixin, TimeSeriesDataPlot):
         self.channels = channels
         return out
 
+    def _get_data(self, channel, segments):
+        """Get the rate for a given bin, restricted to the segments
+        """
+        rate = self._rates[str(channel)]
+        out = TimeSeriesList()
+        for seg in segments:
+            if abs(seg) < rate.dt.value or not rate.span.intersects(seg):
+                continue
+            cropped = rate.crop(*map(float, rate.span & seg))
+            if cropped.size:
+                out.append(cropped)
+        return out.coalesce()
+
 
 register_plot(TriggerRateDataPlot)
@@ -21,9 +21,13 @@
 
 from __future__ import (division, print_function)
 import operator
+import os
+import sqlite3
 import sys
 import warnings
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
 from configparser import (
     DEFAULTSECT,
     ConfigParser,
@@ -34,6 +38,8 @@ from configparser import (
 from six import string_types
 from six.moves import reduce
 
+import numpy
+
 from astropy.io.registry import IORegistryError
 
 from gwpy.segments import (DataQualityFlag, DataQualityDict,
@@ -41,6 +47,7 @@ from gwpy.segments import (DataQualityFlag, DataQualityDict,
 
 from . import globalv
 from .utils import (
+    mkdir,
     re_flagdiv,
     vprint,
     WARNC,
@@ -49,6 +56,9 @@ from .utils import (
 
 __author__ = 'Duncan Macleod <duncan.macleod@ligo.org>'
 
+#: format of the key in `globalv.SEGMENTS` for each state-vector bit
+STATE_VECTOR_BIT_TAG = '%s bit %d'
+
 SEGDB_URLS = [
     'https://segdb.ligo.caltech.edu',
     'https://metaserver.phy.syr.edu',
@@ -59,7 +69,7 @@ SEGDB_URLS = [
 
 def get_segments(flag, validity=None, config=ConfigParser(), cache=None,
                  query=True, return_=True, coalesce=True, padding=None,
-                 segdb_error='raise', url=None):
+                 segdb_error='raise', url=None, store=None, nproc=1):
     """Retrieve the segments for a given flag
 
     Segments will be loaded from global memory if already defined,
@@ -87,6 +97,8 @@ def get_segments(flag, validity=None, config=ConfigParser(), cache=None,
           not given
         - ``url`` (the remote hostname for the segment database) if
           the ``url`` keyword is not given
+        - ``store`` (the path of a local segment store) if the ``store``
+          keyword is not given
 
     cache : :class:`glue.lal.Cache`, optional
         a cache of files from which to read segments, otherwise segments
@@ -111,6 +123,15 @@ def get_segments(flag, validity=None, config=ConfigParser(), cache=None,
     url : `str`, optional
         the remote hostname for the target segment database
 
+    store : `str`, `SegmentStore`, optional
+        the path of a local `SegmentStore`, if given segments are read
+        from the store first, and the segment database is only queried
+        for times that haven't been stored before
+
+    nproc : `int`, optional, default: `1`
+        the maximum number of concurrent segment database queries,
+        flags are queried one per request
+
     return_ : `bool`, optional, default: `True`
         internal flag to enable (True) or disable (False) actually returning
         anything. This is useful if you want to download/read segments now
@@ -144,20 +165,11 @@ def get_segments(flag, validity=None, config=ConfigParser(), cache=None,
 
     # check validity
     if validity is None:
-        start = config.get(DEFAULTSECT, 'gps-start-time')
-        end = config.get(DEFAULTSECT, 'gps-end-time')
-        span = SegmentList([Segment(start, end)])
+        start = config.getfloat(DEFAULTSECT, 'gps-start-time')
+        end = config.getfloat(DEFAULTSECT, 'gps-end-time')
+        validity = SegmentList([Segment(start, end)])
     elif isinstance(validity, DataQualityFlag):
         validity = validity.active
-        try:
-            span = SegmentList([validity.extent()])
-        except ValueError:
-            span = SegmentList()
-    else:
-        try:
-            span = SegmentList([SegmentList(validity).extent()])
-        except ValueError:
-            span = SegmentList()
     validity = SegmentList(validity)
 
     # generate output object
@@ -169,9 +181,9 @@ def get_segments(flag, validity=None, config=ConfigParser(), cache=None,
 
     # read segments from global memory and get the union of needed times
     try:
-        old = reduce(
-            operator.and_,
-            (globalv.SEGMENTS.get(f, DataQualityFlag(f)).known for f in flags))
+        old = reduce(operator.and_, (
+            globalv.SEGMENTS.get(f, DataQualityFlag(f)).known for
+            f in allflags))
     except TypeError:
         old = SegmentList()
     newsegs = validity - old
@@ -201,40 +213,9 @@ def get_segments(flag, validity=None, config=ConfigParser(), cache=None,
                        % (len(new[f].active), f,
                           float(abs(new[f].known))/float(abs(newsegs))*100))
         else:
-            if len(newsegs) >= 10:
-                qsegs = span
-            else:
-                qsegs = newsegs
-            # parse configuration for query
-            kwargs = {}
-            if url is not None:
-                kwargs['url'] = url
-            else:
-                try:
-                    kwargs['url'] = config.get('segment-database', 'url')
-                except (NoSectionError, NoOptionError):
-                    pass
-            if kwargs.get('url', None) in SEGDB_URLS:
-                query_func = DataQualityDict.query_segdb
-            else:
-                query_func = DataQualityDict.query_dqsegdb
-            try:
-                new = query_func(allflags, qsegs, on_error=segdb_error,
-                                 **kwargs)
-            except Exception as e:
-                # ignore error from SegDB
-                if segdb_error in ['ignore', None]:
-                    pass
-                # convert to warning
-                elif segdb_error in ['warn']:
-                    print('%sWARNING: %sCaught %s: %s [gwsumm.segments]'
-                          % (WARNC, ENDC, type(e).__name__, str(e)),
-                          file=sys.stderr)
-                    warnings.warn('%s: %s' % (type(e).__name__, str(e)))
-                # otherwise raise as normal
-                else:
-                    raise
-                new = DataQualityDict()
+            new = _query_flags([(f, newsegs, url) for f in allflags],
+                               config=config, store=store,
+                               segdb_error=segdb_error, nproc=nproc)
             for f in new:
                 new[f].known &= newsegs
                 new[f].active &= newsegs
@@ -250,27 +231,24 @@ def get_segments(flag, validity=None, config=ConfigParser(), cache=None,
 
     # return what was asked for
     if return_:
+        valid = SegmentArray(validity)
         for compound in flags:
             union, intersection, exclude, notequal = split_compound_flag(
                 compound)
             if len(union + intersection) == 1:
                 out[compound].description = globalv.SEGMENTS[f].description
                 out[compound].padding = padding.get(f, (0, 0))
+            # evaluate the compound flag using array-backed segment lists
+            segs = (valid, valid)
             for flist, op in zip([exclude, intersection, union, notequal],
-                                 [operator.sub, operator.and_, operator.or_,
-                                  not_equal]):
+                                 [_flag_sub, _flag_and, _flag_or,
+                                  _flag_not_equal]):
                 for f in flist:
-                    pad = padding.get(f, (0, 0))
-                    segs = globalv.SEGMENTS[f].copy()
-                    if isinstance(pad, (float, int)):
-                        segs = segs.pad(pad, pad)
-                    elif pad is not None:
-                        segs = segs.pad(*pad)
-                    if coalesce:
-                        segs = segs.coalesce()
-                    out[compound] = op(out[compound], segs)
-            out[compound].known &= validity
-            out[compound].active &= validity
+                    segs = op(segs, _get_flag_arrays(
+                        globalv.SEGMENTS[f], padding.get(f, (0, 0)),
+                        coalesce=coalesce))
+            out[compound].known = (segs[0] & valid).to_segmentlist()
+            out[compound].active = (segs[1] & valid).to_segmentlist()
             if coalesce:
                 out[compound].coalesce()
         if isinstance(flag, string_types):
@@ -279,10 +257,39 @@ def get_segments(flag, validity=None, config=ConfigParser(), cache=None,
             return out
 
 
-def not_equal(a, b, f):
-    diff1 = a - b
-    diff2 = b - a
-    return diff1 | diff2
+def _get_flag_arrays(flag, pad=None, coalesce=True):
+    """Return the padded (known, active) `SegmentArray` for a flag
+    """
+    known = SegmentArray(flag.known)
+    active = SegmentArray(flag.active)
+    if isinstance(pad, (float, int)):
+        pad = (pad, pad)
+    if pad is not None:
+        known = known.pad(*pad)
+        active = active.pad(*pad)
+    if coalesce:
+        active &= known
+    return known, active
+
+
+# operations on (known, active) pairs, matching those of `DataQualityFlag`
+
+def _flag_and(a, b):
+    return a[0] & b[0], a[1] & b[1]
+
+
+def _flag_or(a, b):
+    return a[0] | b[0], a[1] | b[1]
+
+
+def _flag_sub(a, b):
+    known = a[0] & b[0]
+    return known, (a[1] - b[1]) & known
+
+
+def _flag_not_equal(a, b):
+    known = a[0] & b[0]
+    return known, (a[1] ^ b[1]) & known
 
 
 def split_compound_flag(compound):
@@ -334,3 +341,878 @@ def format_padding(flags, padding):
         return OrderedDict((c, padding) for c in flags)
     else:
         return padding
+
+
+def _get_segdb_url(url, config):
+    """Return the segment database URL to use for a query
+    """
+    if url is not None:
+        return url
+    try:
+        return config.get('segment-database', 'url')
+    except (NoSectionError, NoOptionError):
+        return None
+
+
+def _query_flag(name, segments, url=None, store=None, segdb_error='raise'):
+    """Query the segment database for a single flag
+
+    Errors are handled according to ``segdb_error``, in which case
+    only segments from the local ``store`` (if given) are returned.
+    """
+    segments = SegmentList(segments)
+    kwargs = {'on_error': segdb_error}
+    if url is not None:
+        kwargs['url'] = url
+    if url in SEGDB_URLS:
+        query_func = DataQualityDict.query_segdb
+    else:
+        query_func = DataQualityDict.query_dqsegdb
+    try:
+        if store is not None:
+            new = store.query([name], segments, query_func, **kwargs)
+        else:
+            if len(segments) >= 10:
+                qsegs = SegmentList([segments.extent()])
+            else:
+                qsegs = segments
+            new = query_func([name], qsegs, **kwargs)
+        flag = new.get(name, DataQualityFlag(name))
+    except Exception as e:
+        # ignore error from SegDB
+        if segdb_error in ['ignore', None]:
+            pass
+        # convert to warning
+        elif segdb_error in ['warn']:
+            print('%sWARNING: %sCaught %s: %s [gwsumm.segments]'
+                  % (WARNC, ENDC, type(e).__name__, str(e)),
+                  file=sys.stderr)
+            warnings.warn('%s: %s' % (type(e).__name__, str(e)))
+        # otherwise raise as normal
+        else:
+            raise
+        # fall back to whatever has been stored locally
+        if store is not None:
+            flag = store.get(name, segments, url=url)
+        else:
+            flag = DataQualityFlag(name)
+    flag.known &= segments
+    flag.active &= segments
+    return flag
+
+
+def _query_flags(requests, config=ConfigParser(), store=None,
+                 segdb_error='raise', nproc=1):
+    """Query the segment database for a number of flags concurrently
+
+    Parameters
+    ----------
+    requests : `list` of `tuple`
+        ``(name, segments, url)`` triplets, one per flag, a `None` url
+        is replaced by the ``[segment-database]`` ``url`` option
+
+    nproc : `int`, optional
+        the maximum number of concurrent requests
+
+    Returns
+    -------
+    flagdict : `~gwpy.segments.DataQualityDict`
+        the dict of flags as returned from the segment database(s)
+    """
+    store = _get_segment_store(store, config)
+
+    def _query(request):
+        name, segments, url = request
+        return _query_flag(name, segments, url=_get_segdb_url(url, config),
+                           store=store, segdb_error=segdb_error)
+
+    requests = list(requests)
+    if nproc > 1 and len(requests) > 1:
+        with ThreadPoolExecutor(max_workers=min(nproc, len(requests))) as ex:
+            flags = list(ex.map(_query, requests))
+    else:
+        flags = list(map(_query, requests))
+    out = DataQualityDict()
+    for (name, _, _), flag in zip(requests, flags):
+        if name in out:
+            out[name] += flag
+        else:
+            out[name] = flag
+    return out
+
+
+# -- array-based utilities ----------------------------------------------------
+
+def _coalesced_bounds(segmentlist):
+    """Return the sorted, coalesced (start, end) arrays for a segment list
+    """
+    if isinstance(segmentlist, SegmentArray):
+        return segmentlist.start, segmentlist.end
+    bounds = numpy.array([(float(a), float(b)) for (a, b) in segmentlist],
+                         dtype=float).reshape((-1, 2))
+    return _coalesce(bounds[:, 0], bounds[:, 1])
+
+
+def _coalesce(start, end):
+    """Sort and merge overlapping or touching ``[start, end)`` intervals
+    """
+    keep = end > start
+    start, end = start[keep], end[keep]
+    if not start.size:
+        return start, end
+    order = numpy.argsort(start, kind='mergesort')
+    start, end = start[order], end[order]
+    # a new segment starts wherever the start is beyond all previous ends
+    maxend = numpy.maximum.accumulate(end)
+    new = numpy.ones(start.size, dtype=bool)
+    new[1:] = start[1:] > maxend[:-1]
+    first = numpy.flatnonzero(new)
+    last = numpy.append(first[1:], start.size) - 1
+    return start[first], maxend[last]
+
+
+def _sweep(bounds, n):
+    """Find the intervals during which at least ``n`` of the given
+    coalesced ``(start, end)`` array pairs are active
+    """
+    times = numpy.concatenate([b for pair in bounds for b in pair])
+    steps = numpy.concatenate([
+        s for (a, b) in bounds for s in (numpy.ones(a.size, dtype=int),
+                                         -numpy.ones(b.size, dtype=int))])
+    # sort by time, closing segments before opening new ones
+    order = numpy.lexsort((steps, times))
+    times = times[order]
+    active = numpy.cumsum(steps[order]) >= n
+    # record transitions into and out of coincidence
+    edges = numpy.diff(numpy.concatenate(([0], active.astype(int))))
+    return _coalesce(times[edges == 1], times[edges == -1])
+
+
+class SegmentArray(object):
+    """A sorted, coalesced list of ``[start, end)`` segments, stored as
+    arrays of GPS start and end times
+
+    This provides vectorised versions of the common `SegmentList`
+    operations, for use with large segment lists, conversion to and from
+    `~gwpy.segments.SegmentList` should only be done at API boundaries.
+
+    Parameters
+    ----------
+    segments : `~gwpy.segments.SegmentList`, `SegmentArray`, optional
+        any iterable of ``(start, end)`` pairs, these do not need to be
+        sorted or coalesced
+
+    Examples
+    --------
+    >>> from gwsumm.segments import SegmentArray
+    >>> a = SegmentArray([(0, 10), (5, 20), (30, 40)])
+    >>> b = SegmentArray([(15, 35)])
+    >>> (a & b).to_segmentlist()
+    [Segment(15.0, 20.0), Segment(30.0, 35.0)]
+    """
+    __slots__ = ('start', 'end')
+
+    def __init__(self, segments=()):
+        self.start, self.end = _coalesced_bounds(segments)
+
+    @classmethod
+    def _from_bounds(cls, start, end):
+        """Create a new `SegmentArray` from already-coalesced arrays
+        """
+        new = cls.__new__(cls)
+        new.start = start
+        new.end = end
+        return new
+
+    def to_segmentlist(self):
+        """Convert this `SegmentArray` into a `~gwpy.segments.SegmentList`
+        """
+        return SegmentList(map(Segment, self.start.tolist(),
+                               self.end.tolist()))
+
+    def copy(self):
+        return self._from_bounds(self.start.copy(), self.end.copy())
+
+    def coalesce(self):
+        """Return this `SegmentArray`, which is always coalesced
+        """
+        return self
+
+    def extent(self):
+        """Return the `~gwpy.segments.Segment` enclosing all segments
+        """
+        if not self.start.size:
+            raise ValueError("empty list")
+        return Segment(self.start[0], self.end[-1])
+
+    def pad(self, start, end):
+        """Pad the start and end of each segment and coalesce the result
+
+        As for `~gwpy.segments.DataQualityFlag.pad`, a positive value pads
+        forward in time, segments that are contracted to zero duration
+        are removed.
+        """
+        return self._from_bounds(*_coalesce(self.start + float(start),
+                                            self.end + float(end)))
+
+    def round(self, contract=False):
+        """Round each segment to integer boundaries
+
+        Parameters
+        ----------
+        contract : `bool`, optional
+            if `False` (default) expand each segment to the containing
+            integer boundaries, otherwise contract each segment to the
+            contained boundaries
+        """
+        if contract:
+            bounds = numpy.ceil(self.start), numpy.floor(self.end)
+        else:
+            bounds = numpy.floor(self.start), numpy.ceil(self.end)
+        return self._from_bounds(*_coalesce(*bounds))
+
+    def __len__(self):
+        return self.start.size
+
+    def __iter__(self):
+        return iter(zip(self.start.tolist(), self.end.tolist()))
+
+    def __abs__(self):
+        return float((self.end - self.start).sum())
+
+    def __bool__(self):
+        return bool(self.start.size)
+    __nonzero__ = __bool__
+
+    def __eq__(self, other):
+        if not isinstance(other, SegmentArray):
+            other = type(self)(other)
+        return (numpy.array_equal(self.start, other.start) and
+                numpy.array_equal(self.end, other.end))
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return '<%s(%d segments)>' % (type(self).__name__, len(self))
+
+    def __or__(self, other):
+        other = _as_segment_array(other)
+        return self._from_bounds(*_coalesce(
+            numpy.concatenate((self.start, other.start)),
+            numpy.concatenate((self.end, other.end))))
+
+    def __and__(self, other):
+        other = _as_segment_array(other)
+        return self._from_bounds(*_sweep(
+            [(self.start, self.end), (other.start, other.end)], 2))
+
+    def __invert__(self):
+        start = numpy.concatenate(([-numpy.inf], self.end))
+        end = numpy.concatenate((self.start, [numpy.inf]))
+        keep = end > start
+        return self._from_bounds(start[keep], end[keep])
+
+    def __sub__(self, other):
+        return self & ~_as_segment_array(other)
+
+    def __xor__(self, other):
+        other = _as_segment_array(other)
+        return (self - other) | (other - self)
+
+
+def _as_segment_array(segments):
+    if isinstance(segments, SegmentArray):
+        return segments
+    return SegmentArray(segments)
+
+
+def get_livetime(segmentlist, starts, ends):
+    """Calculate the livetime of a segment list in each of a set of bins
+
+    This is equivalent to
+    ``[abs(SegmentList([Segment(a, b)]) & segmentlist) for a, b in
+    zip(starts, ends)]``, but uses the cumulative coverage of
+    ``segmentlist`` so that the cost scales with the number of bins, not
+    the number of bins times the number of segments.
+
+    Parameters
+    ----------
+    segmentlist : `~gwpy.segments.SegmentList`, `SegmentArray`
+        the list of segments whose livetime to count
+
+    starts : `numpy.ndarray`
+        the GPS start times of each bin
+
+    ends : `numpy.ndarray`
+        the GPS end times of each bin
+
+    Returns
+    -------
+    livetime : `numpy.ndarray`
+        the duration (in seconds) of the overlap between each bin and
+        ``segmentlist``
+    """
+    segstart, segend = _coalesced_bounds(segmentlist)
+    cumulative = numpy.concatenate(([0.], numpy.cumsum(segend - segstart)))
+
+    def _coverage(t):
+        # total livetime before each time t
+        t = numpy.asarray(t, dtype=float)
+        idx = numpy.searchsorted(segstart, t, side='right')
+        over = numpy.zeros(t.shape)
+        inseg = idx > 0
+        over[inseg] = numpy.clip(segend[idx[inseg]-1] - t[inseg], 0, None)
+        return cumulative[idx] - over
+
+    return _coverage(ends) - _coverage(starts)
+
+
+def get_duty_factor(segmentlist, starts, ends, normalized=100.,
+                    cumulative=False):
+    """Calculate the duty factor of a segment list in each of a set of bins
+
+    Parameters
+    ----------
+    segmentlist : `~gwpy.segments.SegmentList`, `SegmentArray`
+        the list of segments whose duty factor to calculate
+
+    starts : `numpy.ndarray`
+        the GPS start times of each bin
+
+    ends : `numpy.ndarray`
+        the GPS end times of each bin
+
+    normalized : `float`, optional
+        the value representing a 100% duty factor, e.g. ``100.`` to
+        return percentages, or `False` to return the livetime (in seconds)
+        in each bin
+
+    cumulative : `bool`, optional
+        return the cumulative duty factor, default: `False`
+
+    Returns
+    -------
+    duty : `numpy.ndarray`
+        the duty factor in each bin
+
+    mean : `numpy.ndarray`
+        the running mean of the (non-cumulative) duty factor up to and
+        including each bin
+    """
+    starts = numpy.asarray(starts, dtype=float)
+    ends = numpy.asarray(ends, dtype=float)
+    duty = get_livetime(segmentlist, starts, ends)
+    if normalized:
+        duty *= float(normalized) / (ends - starts)
+    total = duty.cumsum()
+    mean = total / numpy.arange(1, duty.size + 1)
+    if cumulative:
+        duty = total
+    return duty, mean
+
+
+def get_coincident_segments(segmentlists, n=2):
+    """Find the times at which at least ``n`` segment lists are active
+
+    Parameters
+    ----------
+    segmentlists : `list` of `~gwpy.segments.SegmentList`
+        the segment lists to combine
+
+    n : `int`, optional
+        the minimum number of simultaneously-active segment lists
+
+    Returns
+    -------
+    coincident : `~gwpy.segments.SegmentList`
+        the (coalesced) list of coincident segments
+    """
+    bounds = [_coalesced_bounds(segs) for segs in segmentlists]
+    return SegmentArray._from_bounds(*_sweep(bounds, n)).to_segmentlist()
+
+
+# -- run-length encoding ------------------------------------------------------
+
+def run_length_encode(series):
+    """Convert a series into runs of constant value
+
+    Parameters
+    ----------
+    series : `~gwpy.timeseries.TimeSeries`
+        the series to encode, normally an integer state-number series
+
+    Returns
+    -------
+    values : `numpy.ndarray`
+        the value of each run
+
+    starts : `numpy.ndarray`
+        the GPS start time of each run
+
+    ends : `numpy.ndarray`
+        the GPS end time of each run, i.e. the time of the first sample
+        not in the run
+
+    Examples
+    --------
+    >>> from gwpy.timeseries import TimeSeries
+    >>> from gwsumm.segments import run_length_encode
+    >>> run_length_encode(TimeSeries([1, 1, 2, 2, 2, 1], t0=0, dt=1))
+    (array([1, 2, 1]), array([0., 2., 5.]), array([2., 5., 6.]))
+    """
+    data = numpy.asarray(series.value)
+    # index of the first sample of each run
+    first = numpy.concatenate((
+        [0], numpy.flatnonzero(data[1:] != data[:-1]) + 1))[:data.size]
+    last = numpy.append(first[1:], data.size)[:first.size]
+    t0 = float(series.t0.value)
+    dt = float(series.dt.value)
+    return data[first], t0 + first * dt, t0 + last * dt
+
+
+def group_runs(values, starts, ends):
+    """Group runs by value into segment lists
+
+    Parameters
+    ----------
+    values : `numpy.ndarray`
+        the value of each run
+
+    starts : `numpy.ndarray`
+        the GPS start time of each run
+
+    ends : `numpy.ndarray`
+        the GPS end time of each run
+
+    Returns
+    -------
+    segments : `dict` of `SegmentArray`
+        the segments for each unique value, keyed by that value
+
+    See Also
+    --------
+    run_length_encode
+        for details on how to generate the runs for a series
+    """
+    order = numpy.argsort(values, kind='mergesort')
+    uniq, index = numpy.unique(values[order], return_index=True)
+    out = OrderedDict()
+    for value, idx in zip(uniq.tolist(),
+                          numpy.split(order, index[1:])):
+        out[value] = SegmentArray._from_bounds(*_coalesce(starts[idx],
+                                                          ends[idx]))
+    return out
+
+
+def decode_bits(series, nbits=32):
+    """Find the segments during which each bit of a state-vector is set
+
+    The series is first run-length encoded, so that the bits are only
+    unpacked for each change in value, not for each sample.
+
+    Parameters
+    ----------
+    series : `~gwpy.timeseries.StateVector`
+        the state-vector data to decode
+
+    nbits : `int`, optional
+        the number of bits to decode, up to 32
+
+    Returns
+    -------
+    segments : `list` of `SegmentArray`
+        the active segments for each bit
+    """
+    values, starts, ends = run_length_encode(series)
+    words = values.astype('<u4').view(numpy.uint8).reshape((-1, 4))
+    # unpack each byte, least significant bit first (the `bitorder`
+    # keyword of numpy.unpackbits needs numpy >= 1.17)
+    planes = numpy.unpackbits(words[:, :, None], axis=2)[:, :, ::-1].reshape(
+        (-1, 32))[:, :nbits]
+    return [SegmentArray._from_bounds(*_coalesce(starts[on], ends[on])) for
+            on in planes.T.astype(bool)]
+
+
+def get_bit_segments(channel, data, bits, query=True):
+    """Get the segments for each bit of a state-vector channel
+
+    The segments for each bit are cached in `globalv.SEGMENTS` so that
+    data are only decoded once, and only data for times that haven't
+    been decoded before are processed.
+
+    Parameters
+    ----------
+    channel : `str`
+        the name of the state-vector channel
+
+    data : `list` of `~gwpy.timeseries.StateVector`
+        the data to decode
+
+    bits : `list` of `str`
+        the names of each bit of the state-vector, with `None` or
+        ``''`` for unused bits
+
+    query : `bool`, optional
+        decode the data for times that haven't been decoded before,
+        default: `True`, otherwise only return the segments already
+        in `globalv.SEGMENTS`
+
+    Returns
+    -------
+    flags : `~gwpy.segments.DataQualityDict`
+        a `~gwpy.segments.DataQualityFlag` for each named bit, restricted
+        to the span of the given ``data``
+    """
+    data = [ts for ts in data if ts.size]
+    names = [(i, bit) for (i, bit) in enumerate(bits) if bit]
+    tags = [STATE_VECTOR_BIT_TAG % (channel, i) for (i, _) in names]
+    span = SegmentArray(Segment(*ts.span) for ts in data)
+
+    # decode new data
+    if query:
+        for tag in tags:
+            globalv.SEGMENTS.setdefault(tag, DataQualityFlag(tag))
+        try:
+            done = reduce(operator.and_, (
+                SegmentArray(globalv.SEGMENTS[tag].known) for tag in tags))
+        except TypeError:
+            done = SegmentArray()
+        for ts in data:
+            t0 = ts.t0.value
+            dt = ts.dt.value
+            for start, end in SegmentArray([ts.span]) - done:
+                ts2 = ts[int(round((start - t0) / dt)):
+                         int(round((end - t0) / dt))]
+                if not ts2.size:
+                    continue
+                new = SegmentArray([ts2.span])
+                bitsegs = decode_bits(ts2, nbits=len(bits))
+                for (i, _), tag in zip(names, tags):
+                    flag = globalv.SEGMENTS[tag]
+                    flag.known = (SegmentArray(flag.known) |
+                                  new).to_segmentlist()
+                    flag.active = (SegmentArray(flag.active) |
+                                   bitsegs[i]).to_segmentlist()
+
+    # return flags for the requested times
+    out = DataQualityDict()
+    for (_, bit), tag in zip(names, tags):
+        flag = globalv.SEGMENTS.get(tag, DataQualityFlag(tag))
+        out[bit] = DataQualityFlag(
+            bit, known=(span & flag.known).to_segmentlist(),
+            active=(span & flag.active).to_segmentlist())
+    return out
+
+
+# -- persistent segment store -------------------------------------------------
+
+class SegmentStore(object):
+    """An on-disk store of the known and active segments for a set of flags
+
+    Segments are stored in an SQLite database, with one row per
+    (segment server, flag) holding the known and active segments as
+    arrays of GPS ``(start, end)`` pairs, so that repeated queries only
+    need to ask the segment database for times that are not already
+    known.
+
+    Parameters
+    ----------
+    path : `str`
+        the path of the SQLite database file, this (and its parent
+        directory) will be created if it doesn't exist
+
+    timeout : `float`, optional
+        the number of seconds to wait for another process to release
+        a lock on the database
+
+    Examples
+    --------
+    >>> from gwpy.segments import DataQualityDict
+    >>> from gwsumm.segments import SegmentStore
+    >>> store = SegmentStore('segments.sqlite')
+    >>> flags = store.query(['L1:DMT-ANALYSIS_READY:1'], [(0, 100)],
+    ...                     DataQualityDict.query_dqsegdb)
+    """
+    def __init__(self, path, timeout=60):
+        self.path = path
+        self.timeout = timeout
+        mkdir(os.path.dirname(os.path.abspath(path)))
+        with self._connect() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS flags ('
+                         'url TEXT, name TEXT, description TEXT, '
+                         'known BLOB, active BLOB, PRIMARY KEY (url, name))')
+
+    def _connect(self):
+        return closing(sqlite3.connect(self.path, timeout=self.timeout))
+
+    @staticmethod
+    def _to_blob(segments):
+        return numpy.column_stack((segments.start, segments.end)).astype(
+            float).tobytes()
+
+    @staticmethod
+    def _from_blob(blob):
+        bounds = numpy.frombuffer(blob, dtype=float).reshape((-1, 2))
+        return SegmentArray._from_bounds(bounds[:, 0].copy(),
+                                         bounds[:, 1].copy())
+
+    def _read(self, conn, name, url):
+        row = conn.execute('SELECT description, known, active FROM flags '
+                           'WHERE url = ? AND name = ?',
+                           (url or '', name)).fetchone()
+        if row is None:
+            return None, SegmentArray(), SegmentArray()
+        return row[0], self._from_blob(row[1]), self._from_blob(row[2])
+
+    def flags(self, url=None):
+        """Return the names of all flags in this store for a server
+        """
+        with self._connect() as conn:
+            return [r[0] for r in conn.execute(
+                'SELECT name FROM flags WHERE url = ?', (url or '',))]
+
+    def get(self, name, segments=None, url=None):
+        """Get the stored segments for a flag
+
+        Parameters
+        ----------
+        name : `str`
+            the name of the flag
+
+        segments : `~gwpy.segments.SegmentList`, optional
+            the times of interest, if given the known and active segments
+            are restricted to these times
+
+        url : `str`, optional
+            the segment server from which the segments were queried
+
+        Returns
+        -------
+        flag : `~gwpy.segments.DataQualityFlag`
+            the stored segments for this flag, this will have no known
+            segments if the flag has not been stored
+        """
+        with self._connect() as conn:
+            description, known, active = self._read(conn, name, url)
+        if segments is not None:
+            segments = _as_segment_array(segments)
+            known &= segments
+            active &= segments
+        return DataQualityFlag(name, known=known.to_segmentlist(),
+                               active=(active & known).to_segmentlist(),
+                               description=description)
+
+    def add(self, flag, url=None):
+        """Add the known and active segments for a flag to this store
+
+        The new segments are combined with those already stored for
+        this flag from the same server.
+
+        Parameters
+        ----------
+        flag : `~gwpy.segments.DataQualityFlag`
+            the flag to store
+
+        url : `str`, optional
+            the segment server from which the segments were queried
+        """
+        known = SegmentArray(flag.known)
+        active = SegmentArray(flag.active) & known
+        with self._connect() as conn:
+            # lock the database for the whole read-modify-write cycle
+            conn.isolation_level = None
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                description, oldknown, oldactive = self._read(
+                    conn, flag.name, url)
+                # new segments supersede stored ones for the same times
+                active |= oldactive - known
+                known |= oldknown
+                if flag.description is not None:
+                    description = str(flag.description)
+                conn.execute('INSERT OR REPLACE INTO flags '
+                             '(url, name, description, known, active) '
+                             'VALUES (?, ?, ?, ?, ?)',
+                             (url or '', flag.name, description,
+                              self._to_blob(known), self._to_blob(active)))
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            else:
+                conn.execute('COMMIT')
+
+    def query(self, flags, segments, query_func, url=None, **kwargs):
+        """Get segments for flags, querying only for times not stored
+
+        Parameters
+        ----------
+        flags : `list` of `str`
+            the names of the flags to query
+
+        segments : `~gwpy.segments.SegmentList`
+            the times over which to get segments
+
+        query_func : `callable`
+            the function to call to query for new segments, this should
+            accept a list of flag names and a
+            `~gwpy.segments.SegmentList` and return a
+            `~gwpy.segments.DataQualityDict`, e.g.
+            :meth:`DataQualityDict.query_dqsegdb
+            <gwpy.segments.DataQualityDict.query_dqsegdb>`
+
+        url : `str`, optional
+            the segment server to query, segments are stored separately
+            for each server
+
+        **kwargs
+            other keyword arguments to pass to ``query_func``
+
+        Returns
+        -------
+        flagdict : `~gwpy.segments.DataQualityDict`
+            the segments for each flag, restricted to ``segments``
+        """
+        if url is not None:
+            kwargs['url'] = url
+        segments = SegmentArray(segments)
+        out = DataQualityDict()
+        missing = OrderedDict()
+        for name in flags:
+            out[name] = self.get(name, segments, url=url)
+            need = segments - out[name].known
+            if need:
+                missing[name] = need
+        if not missing:
+            return out
+        # query once for all flags over the union of uncovered times
+        need = reduce(operator.or_, missing.values())
+        if len(need) >= 10:
+            qsegs = SegmentList([need.extent()])
+        else:
+            qsegs = need.to_segmentlist()
+        new = query_func(list(missing), qsegs, **kwargs)
+        for name in new:
+            self.add(new[name], url=url)
+            out[name] = self.get(name, segments, url=url)
+        return out
+
+
+def _get_segment_store(store, config):
+    """Return the `SegmentStore` configured for this analysis, if any
+    """
+    if store is None:
+        try:
+            store = config.get('segment-database', 'store')
+        except (NoSectionError, NoOptionError):
+            return None
+    if isinstance(store, string_types):
+        store = SegmentStore(os.path.expanduser(store))
+    return store
+
+
+# -- segment request broker ---------------------------------------------------
+
+class SegmentBroker(object):
+    """Collect segment requests from many sources and fetch them together
+
+    Requests are accumulated with :meth:`SegmentBroker.add`, then
+    :meth:`SegmentBroker.fetch` queries each flag once (per server) for
+    the union of all requested times, with the queries running
+    concurrently, and records the results in `globalv.SEGMENTS`.
+    Later calls to `get_segments` for the same times then don't need
+    to query the segment database at all.
+
+    Examples
+    --------
+    >>> from gwsumm.segments import SegmentBroker
+    >>> broker = SegmentBroker()
+    >>> broker.add('L1:DMT-ANALYSIS_READY:1', [(0, 100)])
+    >>> broker.add('L1:DMT-ANALYSIS_READY:1&L1:DMT-CALIBRATED:1', [(50, 200)])
+    >>> broker.fetch(nproc=4)
+    """
+    def __init__(self):
+        self.requests = OrderedDict()
+
+    def __len__(self):
+        return len(self.requests)
+
+    def add(self, flags, segments, url=None):
+        """Request segments for one or more (compound) flags
+
+        Parameters
+        ----------
+        flags : `str`, `list` of `str`
+            the name of one flag, or a list of names, compound flags
+            are split into their component flags
+
+        segments : `~gwpy.segments.SegmentList`
+            the times for which segments are required
+
+        url : `str`, optional
+            the remote hostname for the target segment database, defaults
+            to the ``[segment-database]`` ``url`` configuration option
+        """
+        if isinstance(flags, string_types):
+            flags = flags.split(',')
+        segments = SegmentList(map(Segment, segments))
+        for compound in flags:
+            for name in re_flagdiv.split(str(compound))[::2]:
+                if not name:
+                    continue
+                key = (name, url)
+                self.requests[key] = (
+                    self.requests.get(key, SegmentList()) + segments
+                ).coalesce()
+
+    def fetch(self, config=ConfigParser(), cache=None, segdb_error='raise',
+              store=None, nproc=1):
+        """Fetch segments for all requests, and record them in
+        `globalv.SEGMENTS`
+
+        Only those times not already in memory are queried, all
+        requests are cleared once complete.
+
+        Parameters
+        ----------
+        config : `~configparser.ConfigParser`, optional
+            the configuration for your analysis
+
+        cache : :class:`glue.lal.Cache`, optional
+            a cache of files from which to read segments, otherwise
+            segments will be downloaded from the segment database
+
+        segdb_error : `str`, optional, default: ``'raise'``
+            how to handle errors returned from the segment database,
+            see `get_segments` for details
+
+        store : `str`, `SegmentStore`, optional
+            the path of a local `SegmentStore`
+
+        nproc : `int`, optional, default: `1`
+            the maximum number of concurrent segment database queries
+        """
+        todo = []
+        for (name, url), segments in self.requests.items():
+            known = globalv.SEGMENTS.get(name, DataQualityFlag(name)).known
+            segments = segments - known
+            if abs(segments):
+                todo.append((name, segments, url))
+        self.requests.clear()
+        if not todo:
+            return
+        # segment files are read in one go
+        if cache is not None:
+            get_segments([name for (name, _, _) in todo],
+                         reduce(operator.or_, (segs for (_, segs, _) in todo)),
+                         config=config, cache=cache, return_=False)
+            return
+        vprint("    Querying segments for %d flags... " % len(todo))
+        new = _query_flags(todo, config=config, store=store,
+                           segdb_error=segdb_error, nproc=nproc)
+        for name in new:
+            new[name].coalesce()
+            flag = globalv.SEGMENTS.setdefault(name, DataQualityFlag(name))
+            flag += new[name]
+            flag.description = str(new[name].description)
+        vprint("done\n")
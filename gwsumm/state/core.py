@@ -33,7 +33,7 @@ from gwpy.time import (to_gps, from_gps)
 from .. import globalv
 from ..config import (GWSummConfigParser)
 from ..utils import re_cchar
-from ..segments import get_segments
+from ..segments import (get_segments, SegmentArray)
 from ..data import get_timeseries
 
 MATHOPS = {
@@ -245,9 +245,11 @@ class SummaryState(DataQualityFlag):
     def _fetch_segments(self, config=GWSummConfigParser(), **kwargs):
         kwargs.setdefault('url', self.url)
         segs = get_segments([self.definition], self.known, config=config,
-                            **kwargs)[self.definition].round(contract=True)
-        self.known = segs.known
-        self.active = segs.active
+                            **kwargs)[self.definition]
+        known = SegmentArray(segs.known).round(contract=True)
+        active = SegmentArray(segs.active).round(contract=True) & known
+        self.known = known.to_segmentlist()
+        self.active = active.to_segmentlist()
         return self
 
     def _fetch_data(self, channel, thresh, op, config=GWSummConfigParser(),
@@ -263,14 +265,25 @@ class SummaryState(DataQualityFlag):
         ):
             kwargs.setdefault('pad', 0.)
         data = get_timeseries(channel, self.known, config=config, **kwargs)
+        known = []
+        active = []
         for ts in data:
             if isinstance(thresh, (float, int)) and ts.unit is not None:
                 thresh *= ts.unit
             segs = MATHOPS[op](ts, thresh).to_dqflag()
+            known.extend(segs.known)
+            active.extend(segs.active)
+        if data:
             try:
-                globalv.SEGMENTS[self.definition] += segs
+                flag = globalv.SEGMENTS[self.definition]
             except KeyError:
-                globalv.SEGMENTS[self.definition] = segs
+                flag = globalv.SEGMENTS[self.definition] = DataQualityFlag(
+                    self.definition)
+            # combine all new segments in one step
+            flag.known = (SegmentArray(flag.known) |
+                          SegmentArray(known)).to_segmentlist()
+            flag.active = (SegmentArray(flag.active) |
+                           SegmentArray(active)).to_segmentlist()
         return self._fetch_segments(query=False)
 
     def _read_segments(self, filename):
@@ -310,7 +323,8 @@ class SummaryState(DataQualityFlag):
         # fetch segments
         elif self.definition:
             self._fetch_segments(config=config, cache=segmentcache,
-                                 segdb_error=segdb_error, **kwargs)
+                                 segdb_error=segdb_error, nproc=nproc,
+                                 **kwargs)
         # fetch null
         else:
             start = config.getfloat(DEFAULTSECT, 'gps-start-time')
@@ -332,8 +346,10 @@ class SummaryState(DataQualityFlag):
                     segs_.append(Segment(t + h0 * 3600, t + h1*3600))
                 # increment and return
                 d += datetime.timedelta(1)
-            self.known &= segs_
-            self.active &= segs_
+            segs_ = SegmentArray(segs_)
+            self.known = (SegmentArray(self.known) & segs_).to_segmentlist()
+            self.active = (SegmentArray(self.active) &
+                           segs_).to_segmentlist()
         # FIXME
         self.ready = True
         return self
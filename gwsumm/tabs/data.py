@@ -33,6 +33,7 @@ from configparser import (
     NoOptionError,
     NoSectionError,
 )
+from collections import OrderedDict
 from copy import copy
 from datetime import timedelta
 
@@ -55,13 +56,16 @@ from ..channels import (re_channel,
                         split_combination as split_channel_combination)
 from ..config import GWSummConfigParser
 from ..mode import (Mode, get_mode)
-from ..data import (get_channel, get_timeseries_dict, get_spectrograms,
-                    get_coherence_spectrograms, get_spectrum, FRAMETYPE_REGEX)
+from ..data import (get_channel, get_timeseries, get_timeseries_dict,
+                    get_spectrograms, get_coherence_spectrograms,
+                    get_coherence_matrix, get_spectrum, get_range_dict,
+                    FRAMETYPE_REGEX)
 from ..data.utils import get_fftparams
 from ..plot import get_plot
-from ..segments import get_segments
+from ..segments import (get_segments, get_bit_segments)
 from ..state import (generate_all_state, ALLSTATE, get_state)
-from ..triggers import get_triggers
+from ..triggers import (get_triggers, get_binned_rates,
+                        add_trigger_columns)
 from ..utils import (re_flagdiv, vprint, safe_eval)
 
 from .registry import (get_tab, register_tab)
@@ -334,6 +338,48 @@ class DataTab(ProcessedTab, ParentTab):
         for state in self.states:
             state.fetch(config=config, segdb_error=segdb_error, **kwargs)
 
+    def request_segments(self, broker):
+        """Register the segments required by this tab with a broker
+
+        This includes the segments defining each state, and those for
+        all segment-based plots, so that all segments can be fetched
+        in bulk before any tab is processed.
+
+        Parameters
+        ----------
+        broker : `~gwsumm.segments.SegmentBroker`
+            the broker with which to register requests
+        """
+        if self.ismeta:
+            return
+        for state in self.states:
+            if (state.ready or state.filename or not state.definition or
+                    state.MATH_DEFINITION.search(str(state.definition))):
+                continue
+            broker.add(state.definition, state.known, url=state.url)
+        dqflags = set(self.get_flags('segments'))
+        dqflags.update(self.get_flags('timeseries', type='time-volume'))
+        dqflags.update(self.get_flags('range', type='strain-time-volume'))
+        if dqflags:
+            broker.add(dqflags, [self.span])
+
+    def request_trigger_columns(self):
+        """Register the trigger columns needed by this tab's plots
+
+        This should be called for all tabs before any are processed, so
+        that `get_triggers` only reads those columns needed by at least
+        one plot, see :func:`~gwsumm.triggers.add_trigger_columns`.
+        """
+        if self.ismeta:
+            return
+        for plot in self.plots + self.subplots:
+            if getattr(plot, 'data', None) != 'triggers':
+                continue
+            # plots that don't declare their columns need all of them
+            columns = getattr(plot, 'trigger_columns', None)
+            for channel in plot.channels:
+                add_trigger_columns(channel, plot.etg, columns)
+
     def process(self, config=ConfigParser(), nproc=1, **stateargs):
         """Process data for this tab
 
@@ -446,6 +492,12 @@ class DataTab(ProcessedTab, ParentTab):
                                 datafind_error=datafind_error, dtype='uint32')
             vprint("    All state-vector data loaded\n")
 
+        # decode the bits of each state-vector once for all plots
+        for channel, bits in self.get_state_vector_bits(all_data=all_data,
+                                                         read=True):
+            get_bit_segments(str(channel), get_timeseries(
+                str(channel), state, query=False, statevector=True), bits)
+
         # --------------------------------------------------------------------
         # process spectrograms
 
@@ -470,10 +522,14 @@ class DataTab(ProcessedTab, ParentTab):
         csgchannels = self.get_channels('coherence-spectrogram',
                                         all_data=all_data, read=True,
                                         unique=False, state=state)
+        # for coherence matrices, we need each reference with its channels
+        matrices = self.get_coherence_matrices(all_data=all_data, read=True,
+                                               state=state)
 
         # pad spectrogram segments to include final time bin
         specsegs = SegmentList(state.active)
-        specchannels = set.union(sgchannels, raychannels, csgchannels)
+        specchannels = set.union(sgchannels, raychannels, csgchannels,
+                                 [channels[0] for channels in matrices])
         if specchannels and specsegs and specsegs[-1][1] == self.end:
             stride = max(filter(
                 lambda x: x is not None,
@@ -510,6 +566,17 @@ class DataTab(ProcessedTab, ParentTab):
                 nproc=nproc, return_=False, cache=datacache,
                 datafind_error=datafind_error, **fp2)
 
+        if len(matrices):
+            vprint("    %d channel groups identified for Coherence Matrix\n"
+                   % len(matrices))
+            fp2 = fftparams.copy()
+            fp2['method'] = 'welch'
+            for channels in matrices:
+                get_coherence_matrix(
+                    channels, specsegs, config=config, nds=nds,
+                    nproc=nproc, return_=False, cache=datacache,
+                    datafind_error=datafind_error, **fp2)
+
         # --------------------------------------------------------------------
         # process spectra
 
@@ -524,6 +591,25 @@ class DataTab(ProcessedTab, ParentTab):
             fp2['method'] = fp2['format'] = 'rayleigh'
             get_spectrum(channel, state, config=config, return_=False, **fp2)
 
+        # --------------------------------------------------------------------
+        # process range
+
+        # group range requests by spectrogram, so that multiple parameter
+        # sets are calculated from the same PSDs
+        ranges = OrderedDict()
+        for channel, rangekwargs in self.get_ranges(all_data=all_data):
+            rangekwargs = rangekwargs.copy()
+            specparams = tuple((key, rangekwargs.pop(key, None)) for key in
+                               ('stride', 'fftlength', 'overlap', 'method'))
+            ranges.setdefault((channel, specparams), []).append(rangekwargs)
+        if len(ranges):
+            vprint("    %d channels identified for range\n" % len(ranges))
+        for (channel, specparams), rangekwargs in ranges.items():
+            get_range_dict(channel, state, rangekwargs, config=config,
+                           nds=nds, nproc=nproc, cache=datacache,
+                           datafind_error=datafind_error, return_=False,
+                           **dict(specparams))
+
         # --------------------------------------------------------------------
         # process segments
 
@@ -531,12 +617,12 @@ class DataTab(ProcessedTab, ParentTab):
         dqflags = set(self.get_flags('segments', all_data=all_data))
         dqflags.update(self.get_flags('timeseries', all_data=all_data,
                                       type='time-volume'))
-        dqflags.update(self.get_flags('spectrogram', all_data=all_data,
+        dqflags.update(self.get_flags('range', all_data=all_data,
                                       type='strain-time-volume'))
         if len(dqflags):
             vprint("    %d data-quality flags identified for segments\n"
                    % len(dqflags))
-            get_segments(dqflags, state, config=config,
+            get_segments(dqflags, state, config=config, nproc=nproc,
                          segdb_error=segdb_error, cache=segmentcache)
 
         # --------------------------------------------------------------------
@@ -550,6 +636,15 @@ class DataTab(ProcessedTab, ParentTab):
             get_triggers(channel, etg, state.active, config=config,
                          cache=trigcache, nproc=nproc, return_=False)
 
+        # count events for each trigger-rate plot once for all plots
+        for plot in self.plots + self.subplots:
+            if (plot.type != 'trigger-rate' or not plot.new or
+                    plot.state is not None and plot.state.name != state.name):
+                continue
+            for key, segments, ratekwargs in plot.get_rate_args():
+                get_binned_rates(key, plot.etg, segments, return_=False,
+                                 **ratekwargs)
+
         # --------------------------------------------------------------------
         # make plots
 
@@ -686,7 +781,7 @@ class DataTab(ProcessedTab, ParentTab):
         channels = sorted(
             (c2 for c in self.get_channels(
                  'timeseries', 'statevector', 'spectrum', 'spectrogram', 'odc',
-                 new=False) for c2 in split_channel_combination(c)),
+                 'range', new=False) for c2 in split_channel_combination(c)),
             key=str,
         )
         if len(channels):
@@ -982,6 +1077,111 @@ class DataTab(ProcessedTab, ParentTab):
                 out.add((plot.etg, channel))
         return sorted(out, key=lambda ch: ch[1].name)
 
+    def get_ranges(self, **kwargs):
+        """Return the `list` of (channel, parameters) pairs required for
+        range plots.
+
+        Parameters
+        ----------
+        new : `bool`, default: `True`
+            only include plots whose 'new' attribute is True
+
+        Returns
+        -------
+        ranges : `list` of `tuple`
+            list of ``(channel, rangekwargs)`` pairs, sorted by channel
+            name, where ``rangekwargs`` is a `dict` of keyword arguments
+            to pass to :func:`~gwsumm.data.get_range`
+        """
+        isnew = kwargs.pop('new', True)
+        out = {}
+        for plot in self.plots:
+            if plot.data != 'range':
+                continue
+            if isnew and not plot.new:
+                continue
+            skip = False
+            for key, val in kwargs.items():
+                if getattr(plot, key) != val:
+                    skip = True
+                    break
+            if skip:
+                continue
+            for i, channel in enumerate(plot.channels):
+                rangekwargs = plot.get_range_kwargs(i)
+                key = (channel.ndsname, tuple(sorted(
+                    (k, str(v)) for (k, v) in rangekwargs.items())))
+                out.setdefault(key, (channel, rangekwargs))
+        return [out[key] for key in sorted(out)]
+
+    def get_state_vector_bits(self, **kwargs):
+        """Return the `list` of (channel, bits) pairs required for
+        state-vector and ODC plots.
+
+        Parameters
+        ----------
+        new : `bool`, default: `True`
+            only include plots whose 'new' attribute is True
+
+        Returns
+        -------
+        bits : `list` of `tuple`
+            list of unique ``(channel, bits)`` pairs, sorted by channel
+            name, where ``bits`` is the name of each bit to decode, with
+            `None` for unused bits
+        """
+        isnew = kwargs.pop('new', True)
+        out = {}
+        for plot in self.plots:
+            if plot.data not in ('statevector', 'odc'):
+                continue
+            if isnew and not plot.new:
+                continue
+            skip = False
+            for key, val in kwargs.items():
+                if getattr(plot, key) != val:
+                    skip = True
+                    break
+            if skip:
+                continue
+            for channel, bits in plot.get_channel_bits():
+                key = (str(channel), tuple(map(str, bits)))
+                out.setdefault(key, (channel, bits))
+        return [out[key] for key in sorted(out)]
+
+    def get_coherence_matrices(self, **kwargs):
+        """Return the `list` of channel groups required for coherence
+        matrix plots.
+
+        Parameters
+        ----------
+        new : `bool`, default: `True`
+            only include plots whose 'new' attribute is True
+
+        Returns
+        -------
+        matrices : `list` of `tuple`
+            list of unique channel groups, each a reference channel
+            followed by the channels whose coherence with it is required
+        """
+        isnew = kwargs.pop('new', True)
+        out = OrderedDict()
+        for plot in self.plots:
+            if plot.data != 'coherence-matrix':
+                continue
+            if isnew and not plot.new:
+                continue
+            skip = False
+            for key, val in kwargs.items():
+                if getattr(plot, key) != val:
+                    skip = True
+                    break
+            if skip:
+                continue
+            channels = tuple(plot.channels)
+            out.setdefault(tuple(c.ndsname for c in channels), channels)
+        return list(out.values())
+
 
 register_tab(DataTab)
 register_tab(DataTab, name='default')
@@ -29,13 +29,16 @@ from MarkupPy import markup
 
 from glue.lal import Cache
 
+from gwpy.table.filter import parse_column_filters
 from gwpy.time import from_gps
 
 from gwdetchar.io import html
 
+from .. import globalv
 from ..data import get_channel
 from ..state import (get_state, ALLSTATE, generate_all_state)
-from ..triggers import (get_triggers, get_time_column)
+from ..triggers import (get_time_column, add_trigger_columns,
+                        get_loudest_events)
 from ..utils import re_quote
 from ..mode import (Mode, get_mode)
 from .registry import (get_tab, register_tab)
@@ -187,20 +190,20 @@ class EventTriggerTab(get_tab('default')):
                 ]
             # override from config
             if config.has_option(section, 'loudest-columns'):
-                new.loudest['columns'] = map(
+                new.loudest['columns'] = list(map(
                     lambda s: re_quote.sub('', s),
-                    config.get(section, 'loudest-columns').split(','))
+                    config.get(section, 'loudest-columns').split(',')))
             if config.has_option(section, 'loudest-labels'):
-                new.loudest['labels'] = map(
+                new.loudest['labels'] = list(map(
                     lambda s: re_quote.sub('', s),
-                    config.get(section, 'loudest-labels').split(','))
+                    config.get(section, 'loudest-labels').split(',')))
             else:
                 new.loudest['labels'] = [' '.join(map(str.title, s.split('_')))
                                          for s in new.loudest['columns']]
             if config.has_option(section, 'loudest-rank'):
-                new.loudest['rank'] = map(
+                new.loudest['rank'] = list(map(
                     lambda c: re_quote.sub('', c),
-                    config.get(section, 'loudest-rank').split(','))
+                    config.get(section, 'loudest-rank').split(',')))
             if config.has_option(section, 'loudest-dt'):
                 new.loudest['dt'] = config.getfloat(section, 'loudest-dt')
         else:
@@ -228,6 +231,15 @@ class EventTriggerTab(get_tab('default')):
                         'warning',
                         'This analysis found no segments over which to run.')
 
+    def request_trigger_columns(self):
+        super(EventTriggerTab, self).request_trigger_columns()
+        if self.loudest and self.plots:
+            columns = set(self.loudest['columns'] + self.loudest['rank'])
+            filterstr = getattr(self, 'filterstr', None)
+            if filterstr:
+                columns.update(f[0] for f in parse_column_filters(filterstr))
+            add_trigger_columns(self.channel, self.plots[0].etg, columns)
+
     def process(self, *args, **kwargs):
         error = None
         # read the cache files
@@ -301,11 +313,10 @@ class EventTriggerTab(get_tab('default')):
                 page.hr(class_='row-divider')
 
             if self.loudest:
-                # get triggers
-                table = get_triggers(self.channel, self.plots[0].etg, state,
-                                     query=False)
-                if self.filterstr is not None:
-                    table = table.filter(self.filterstr)
+                # get time column from the stored events, selecting the
+                # events in this state isn't needed for that
+                table = globalv.TRIGGERS['%s,%s' % (
+                    str(self.channel), self.plots[0].etg.lower())].table
                 tcol = get_time_column(table, self.etg)
                 # set table headers
                 headers = list(self.loudest['labels'])
@@ -322,18 +333,11 @@ class EventTriggerTab(get_tab('default')):
                     except ValueError:
                         rankstr = repr(rank)
                     page.h2('Loudest events by %s' % rankstr)
-                    rank = table[rank].argsort()[::-1]
-                    loudest = []
-                    i = 0
-                    dt = self.loudest['dt']
-                    while len(loudest) < self.loudest['N'] and i < rank.size:
-                        e = table[rank[i]]
-                        t = e[tcol]
-                        if i == 0 or all(
-                                abs((t - e2[tcol])) >= dt
-                                for e2 in loudest):
-                            loudest.append(e)
-                        i += 1
+                    loudest = get_loudest_events(
+                        self.channel, self.plots[0].etg, state.active, rank,
+                        self.loudest['N'], dt=self.loudest['dt'],
+                        filterstr=self.filterstr, timecolumn=tcol,
+                        state=state.name)
                     data = []
                     for row in loudest:
                         data.append([])
@@ -34,7 +34,8 @@ from astropy.time import Time
 
 from glue.lal import Cache
 
-from gwpy.segments import DataQualityDict
+from gwpy.segments import (DataQualityFlag, DataQualityDict,
+                           SegmentList, Segment)
 
 from gwdetchar.io import html
 
@@ -42,7 +43,8 @@ from .. import globalv
 from ..config import GWSummConfigParser
 from ..data import get_timeseries_dict
 from ..plot.registry import get_plot
-from ..segments import get_segments
+from ..segments import (get_segments, run_length_encode, group_runs,
+                        SegmentArray)
 from ..state import ALLSTATE
 from ..utils import vprint
 from .registry import (get_tab, register_tab)
@@ -188,35 +190,28 @@ class GuardianTab(DataTab):
         self.transitions = dict((v, []) for v in self.grdstates)
 
         for sdata, rdata, ndata, okdata in zip(*alldata[:4]):
-            ssegs = DataQualityDict()
-            rsegs = DataQualityDict()
-            nsegs = DataQualityDict()
+            known = SegmentList([Segment(*sdata.span)])
             oksegs = (okdata == 1).to_dqflag(name='Node OK')
+            # encode each series as runs of constant state, once
+            sruns = run_length_encode(sdata)
+            segments = [group_runs(*runs) for runs in (
+                sruns, run_length_encode(rdata), run_length_encode(ndata))]
+            flags = [DataQualityDict() for _ in segments]
             for v, name in self.grdstates.items():
-                # get segments for state
-                tag = self.segmenttag % name
-                instate = sdata == v
-                ssegs[tag] = instate.to_dqflag(name=name)
-                diff_ = numpy.diff(instate.value.astype(int))
-                transin = (diff_ == 1).nonzero()[0] + 1
-                transout = (diff_ == -1).nonzero()[0] + 1
-                for i, j in zip(transin, transout):
-                    t = sdata.times[i].value
-                    from_ = sdata[i-1].value
-                    to_ = sdata[j].value
-                    self.transitions[v].append((t, from_, to_))
-                # get segments for request
-                tag = self.segmenttag % name + REQUESTSTUB
-                instate = rdata == v
-                rsegs[tag] = instate.to_dqflag(name=name)
-                # get segments for nominal
-                tag = self.segmenttag % name + NOMINALSTUB
-                nom = ndata == v
-                nsegs[tag] = nom.to_dqflag(name=name)
-
-            globalv.SEGMENTS += ssegs
-            globalv.SEGMENTS += rsegs
-            globalv.SEGMENTS += nsegs
+                for stub, segs, out in zip(
+                        ('', REQUESTSTUB, NOMINALSTUB), segments, flags):
+                    out[self.segmenttag % name + stub] = DataQualityFlag(
+                        name, known=known,
+                        active=segs.get(v, SegmentArray()).to_segmentlist())
+            # find transitions into each state (that have since exited)
+            values, starts, _ = sruns
+            for i in numpy.flatnonzero(numpy.isin(
+                    values[1:-1], list(self.grdstates))) + 1:
+                self.transitions[values[i]].append(
+                    (starts[i], values[i-1], values[i+1]))
+
+            for out in flags:
+                globalv.SEGMENTS += out
             globalv.SEGMENTS += {self.segmenttag % 'OK': oksegs}
 
         super(GuardianTab, self).process(
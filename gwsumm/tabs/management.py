@@ -23,9 +23,12 @@ import re
 from collections import OrderedDict
 from configparser import NoOptionError
 
+import numpy
+
 from glue.lal import Cache
 
-from gwpy.segments import (DataQualityDict, SegmentList)
+from gwpy.segments import (DataQualityFlag, DataQualityDict, SegmentList,
+                           Segment)
 
 from gwdetchar.io import html
 
@@ -33,7 +36,8 @@ from ..config import GWSummConfigParser
 from .registry import (get_tab, register_tab)
 from .. import globalv
 from ..data import get_timeseries
-from ..segments import get_segments
+from ..segments import (get_segments, run_length_encode, group_runs,
+                        SegmentArray)
 from ..plot.registry import get_plot
 from ..utils import vprint
 
@@ -142,37 +146,29 @@ class AccountingTab(ParentTab):
             if p.outputfile in globalv.WRITTEN_PLOTS:
                 p.new = False
 
-        # get archived GPS time
-        tag = self.segmenttag % list(self.modes)[0]
+        # get archived GPS time, data are only processed after the
+        # earliest point at which any mode's segments end
         try:
-            lastgps = globalv.SEGMENTS[tag].known[-1][-1]
+            lastgps = min(
+                globalv.SEGMENTS[self.segmenttag % idx].known[-1][-1] for
+                idx in self.modes)
         except (IndexError, KeyError):
             lastgps = self.span[0]
 
         # get data
         new = SegmentList([type(self.span)(lastgps, self.span[1])])
-        data = get_timeseries(self.channel, new,
-                              config=config, nds=nds, dtype='int16',
-                              datafind_error=datafind_error,
-                              nproc=nproc, cache=datacache)
+        if lastgps < self.span[1]:
+            data = get_timeseries(self.channel, new,
+                                  config=config, nds=nds, dtype='int16',
+                                  datafind_error=datafind_error,
+                                  nproc=nproc, cache=datacache)
+        else:
+            data = []
         vprint("    All time-series data loaded\n")
 
         # find segments
         for ts in data:
-            modesegments = DataQualityDict()
-            for idx, name in self.modes.items():
-                # get segments for state
-                tag = self.segmenttag % idx
-                instate = ts == idx * ts.unit
-                modesegments[tag] = instate.to_dqflag(name=name.strip('*'))
-                # append segments for group
-                group = int(idx // 10. * 10)
-                gtag = self.segmenttag % group
-                try:
-                    modesegments[gtag] += modesegments[tag]
-                except KeyError:
-                    modesegments[gtag] = modesegments[tag]
-            globalv.SEGMENTS += modesegments
+            globalv.SEGMENTS += self.get_mode_segments(ts)
 
         kwargs['segdb_error'] = 'ignore'
         super(AccountingTab, self).process(
@@ -180,6 +176,39 @@ class AccountingTab(ParentTab):
             segmentcache=Cache(), datacache=datacache,
             datafind_error=datafind_error, **kwargs)
 
+    def get_mode_segments(self, data):
+        """Convert operating-mode data into segments for each mode
+
+        Parameters
+        ----------
+        data : `~gwpy.timeseries.TimeSeries`
+            the operating-mode data to convert
+
+        Returns
+        -------
+        modesegments : `~gwpy.segments.DataQualityDict`
+            a flag for each mode, and for each group of modes (the mode
+            numbers in each decade) with the group index as its tag
+        """
+        known = SegmentList([Segment(*data.span)])
+        values, starts, ends = run_length_encode(data)
+        modes = group_runs(values, starts, ends)
+        # groups include all runs of named modes in each decade
+        named = numpy.isin(values, list(self.modes))
+        groups = group_runs(values[named] // 10 * 10, starts[named],
+                            ends[named])
+        modesegments = DataQualityDict()
+        for idx, name in self.modes.items():
+            group = int(idx // 10 * 10)
+            # a mode numbered as its group represents the whole group
+            for key, segs in ((group, groups), (idx, modes)):
+                tag = self.segmenttag % key
+                if tag not in modesegments:
+                    modesegments[tag] = DataQualityFlag(
+                        self.modes.get(key, name).strip('*'), known=known,
+                        active=segs.get(key, SegmentArray()).to_segmentlist())
+        return modesegments
+
     def write_state_html(self, state):
         """Write the HTML for the given state of this `GuardianTab`
         """
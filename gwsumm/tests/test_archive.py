@@ -27,7 +27,7 @@ import pytest
 
 import h5py
 
-from numpy import (random, testing as nptest)
+from numpy import (arange, nan, random, testing as nptest)
 
 from gwpy.table import EventTable
 from gwpy.timeseries import (TimeSeries, StateVector)
@@ -51,6 +51,11 @@ def empty_globalv():
     globalv.SPECTROGRAMS = type(globalv.SPECTROGRAMS)()
     globalv.SEGMENTS = type(globalv.SEGMENTS)()
     globalv.TRIGGERS = type(globalv.TRIGGERS)()
+    globalv.TRIGGER_RATES = type(globalv.TRIGGER_RATES)()
+    globalv.TRIGGER_LOUDEST = type(globalv.TRIGGER_LOUDEST)()
+    globalv.SPECTRUM_HISTOGRAMS = type(globalv.SPECTRUM_HISTOGRAMS)()
+    globalv.SPECTROGRAM_BUFFERS = type(globalv.SPECTROGRAM_BUFFERS)()
+    globalv.COHERENCE_MATRIX = type(globalv.COHERENCE_MATRIX)()
 
 
 def create(data, **metadata):
@@ -131,3 +136,153 @@ def test_archive_load_table():
     finally:
         if os.path.exists(fname):
             os.remove(fname)
+
+
+def test_archive_load_runlength():
+    empty_globalv()
+    sv = create([1, 1, 1, 3, 3, 0], series_class=StateVector, epoch=100,
+                sample_rate=4, channel='X1:TEST-STATE_VECTOR_RLE')
+    sv.bits = ['a', None, 'c']
+    series = data.RunLengthSeries.from_timeseries(sv)
+    try:
+        fname = tempfile.mktemp(suffix='.h5', prefix='gwsumm-tests-')
+        with h5py.File(fname, 'w') as h5file:
+            archive.archive_runlength(series, 'test-runs', h5file)
+            series2 = archive.load_runlength(h5file['test-runs'])
+        nptest.assert_array_equal(series2.values, [1, 3, 0])
+        sv2 = series2.expand()
+        assert isinstance(sv2, StateVector)
+        nptest.assert_array_equal(sv2.value, sv.value)
+        assert sv2.span == sv.span
+        assert list(sv2.bits) == list(sv.bits)
+        # check series was stored in memory
+        assert 'X1:TEST-STATE_VECTOR_RLE' in globalv.DATA
+    finally:
+        empty_globalv()
+        if os.path.exists(fname):
+            os.remove(fname)
+
+
+def test_archive_load_rates():
+    empty_globalv()
+    cube = triggers.EventRateCube([[1, 2, 3], [0, 1, 0]], 100, 60,
+                                  segments=[Segment(100, 250)])
+    try:
+        fname = tempfile.mktemp(suffix='.h5', prefix='gwsumm-tests-')
+        with h5py.File(fname, 'w') as h5file:
+            archive.archive_rates(cube, 'X1:TEST,test,snr', h5file, name='0')
+            cube2 = archive.load_rates(h5file['0'])
+        nptest.assert_array_equal(cube2.counts, cube.counts)
+        assert cube2.t0 == 100 and cube2.stride == 60
+        assert cube2.segments == cube.segments
+        assert globalv.TRIGGER_RATES['X1:TEST,test,snr'] is cube2
+    finally:
+        empty_globalv()
+        if os.path.exists(fname):
+            os.remove(fname)
+
+
+def test_archive_load_loudest():
+    empty_globalv()
+    table = EventTable([[1., 2.], [10., 8.]], names=['time', 'snr'])
+    loudest = triggers.LoudestEvents('snr', 2, dt=1, candidates=table,
+                                     segments=[Segment(0, 10)],
+                                     threshold=8, complete=False)
+    try:
+        fname = tempfile.mktemp(suffix='.h5', prefix='gwsumm-tests-')
+        with h5py.File(fname, 'w') as h5file:
+            archive.archive_loudest(loudest, 'X1:TEST,test,snr', h5file,
+                                    name='0')
+            loudest2 = archive.load_loudest(h5file['0'])
+        nptest.assert_array_equal(loudest2.candidates['snr'], table['snr'])
+        assert loudest2.rank == 'snr' and loudest2.n == 2
+        assert loudest2.dt == 1 and loudest2.threshold == 8
+        assert not loudest2.complete
+        assert loudest2.segments == loudest.segments
+        assert 'key' not in loudest2.candidates.meta
+        assert globalv.TRIGGER_LOUDEST['X1:TEST,test,snr'] is loudest2
+    finally:
+        empty_globalv()
+        if os.path.exists(fname):
+            os.remove(fname)
+
+
+def test_archive_load_spectrum_histogram():
+    empty_globalv()
+    specgram = Spectrogram(random.lognormal(size=(10, 5)), t0=0, dt=1,
+                           f0=0, df=1, unit='1/Hz', name='X1:TEST')
+    hist = data.SpectrumHistogram.from_spectrogram(specgram)
+    hist.add(specgram)
+    try:
+        fname = tempfile.mktemp(suffix='.h5', prefix='gwsumm-tests-')
+        with h5py.File(fname, 'w') as h5file:
+            archive.archive_spectrum_histogram(hist, 'X1:TEST,power',
+                                               h5file, name='0')
+            hist2 = archive.load_spectrum_histogram(h5file['0'])
+            # check that a second archive is merged
+            hist.segments = SegmentList([Segment(10, 20)])
+            archive.archive_spectrum_histogram(hist, 'X1:TEST,power',
+                                               h5file, name='1')
+            archive.load_spectrum_histogram(h5file['1'])
+        assert globalv.SPECTRUM_HISTOGRAMS['X1:TEST,power'] is hist2
+        nptest.assert_array_equal(hist2.counts, hist.counts * 2)
+        assert hist2.segments == [Segment(0, 20)]
+        nptest.assert_array_equal(hist2.percentile(50).value,
+                                  hist.percentile(50).value)
+    finally:
+        empty_globalv()
+        if os.path.exists(fname):
+            os.remove(fname)
+
+
+def test_archive_load_spectrogram_buffer():
+    empty_globalv()
+    key = 'X1:TEST-SPECTROGRAM;welch;2.0;1.0;;8.0;'
+    data.add_spectrogram_buffer(TEST_DATA, key=key)
+    fname = tempfile.mktemp(suffix='.h5', prefix='gwsumm-tests-')
+    try:
+        archive.write_data_archive(fname)
+        empty_globalv()
+        archive.read_data_archive(fname)
+        ts = globalv.SPECTROGRAM_BUFFERS[key]
+        nptest.assert_array_equal(ts.value, TEST_DATA.value)
+        assert ts.span == TEST_DATA.span
+        assert ts.channel.name == TEST_DATA.channel.name
+    finally:
+        empty_globalv()
+        if os.path.exists(fname):
+            os.remove(fname)
+
+
+def test_archive_load_coherence_matrix():
+    empty_globalv()
+    channels = ['X1:TEST-MATRIX_REF', 'X1:TEST-MATRIX_A', 'X1:TEST-MATRIX_B']
+    value = random.random((2, 4, 5))
+    value[1, 2:] = nan
+    key = 'X1:TEST-MATRIX;welch;2.0;1.0;;8.0;'
+    matrix = data.CoherenceMatrix(value, arange(4) * 8., range(5), 8,
+                                  channels, segments=[[(0, 32)], [(0, 16)]])
+    data.add_coherence_matrix(matrix, key=key)
+    fname = tempfile.mktemp(suffix='.h5', prefix='gwsumm-tests-')
+    try:
+        archive.write_data_archive(fname)
+        empty_globalv()
+        archive.read_data_archive(fname)
+        matrix2 = globalv.COHERENCE_MATRIX[key]
+        nptest.assert_array_equal(matrix2.value, value)
+        nptest.assert_array_equal(matrix2.times, matrix.times)
+        assert matrix2.segments == [[Segment(0, 32)], [Segment(0, 16)]]
+        assert [c.name for c in matrix2.channels] == channels
+
+        # reading again only adds new time bins
+        matrix3 = data.CoherenceMatrix(value, arange(2, 6) * 8.,
+                                       range(5), 8, channels,
+                                       segments=[[(16, 48)], [(16, 48)]])
+        data.add_coherence_matrix(matrix3, key=key)
+        nptest.assert_array_equal(matrix2.times, arange(6) * 8.)
+        nptest.assert_array_equal(matrix2.value[0, 4:], value[0, 2:])
+        nptest.assert_array_equal(matrix2.value[1, 2:4], value[1, :2])
+    finally:
+        empty_globalv()
+        if os.path.exists(fname):
+            os.remove(fname)
@@ -30,13 +30,17 @@ from six.moves.urllib.request import urlopen
 
 import pytest
 
+import numpy
 from numpy import (arange, testing as nptest)
 
 from lal.utils import CacheEntry
 
 from glue.lal import Cache
 
-from gwpy.timeseries import TimeSeries
+from gwpy import astro
+from gwpy.frequencyseries import FrequencySeries
+from gwpy.spectrogram import Spectrogram
+from gwpy.timeseries import (TimeSeries, StateVector)
 from gwpy.detector import Channel
 from gwpy.segments import (Segment, SegmentList)
 
@@ -250,3 +254,340 @@ class TestData(object):
             ('H1:LOSC-STRAIN', 'L1:LOSC-STRAIN'), LOSC_SEGMENTS, cache=cache,
             stride=4, fftlength=2, overlap=1, nproc=1,
         )
+
+
+# -- test timeseries ----------------------------------------------------------
+
+def test_add_timeseries_compress():
+    a = StateVector([1, 1, 1, 3, 3], name='test state', epoch=0,
+                    sample_rate=1)
+    b = StateVector([3, 3, 2, 2, 2], name='test state', epoch=5,
+                    sample_rate=1)
+    try:
+        data.add_timeseries(a, compress=True)
+        data.add_timeseries(b, compress=True)
+        stored, = globalv.DATA['test state']
+        assert isinstance(stored, data.RunLengthSeries)
+        nptest.assert_array_equal(stored.values, [1, 3, 2])
+        nptest.assert_array_equal(stored.lengths, [3, 4, 3])
+        assert stored.span == (0, 10)
+
+        # check that cropping expands only the requested samples
+        cropped = stored.crop(2, 7)
+        assert isinstance(cropped, StateVector)
+        assert cropped.t0.value == 2
+        nptest.assert_array_equal(cropped.value, [1, 3, 3, 3, 3])
+
+        # check that locating data returns full-rate series
+        out, = data.get_timeseries('test state', [(1, 9)], query=False,
+                                   statevector=True)
+        nptest.assert_array_equal(out.value,
+                                  [1, 1, 3, 3, 3, 3, 2, 2])
+    finally:
+        globalv.DATA.pop('test state', None)
+
+
+# -- test spectrum ------------------------------------------------------------
+
+def test_spectrum_histogram():
+    numpy.random.seed(0)
+    psd = numpy.logspace(-46, -40, 17)
+    specgram = Spectrogram(numpy.random.lognormal(size=(2000, 17)) * psd,
+                           t0=0, dt=1, f0=0, df=.5)
+    specgram[:, 0] = 0
+    hist = data.SpectrumHistogram.from_spectrogram(specgram)
+    hist.add(specgram[:1000])
+    hist.add(specgram[500:])  # overlap should not be counted twice
+    assert hist.segments == [Segment(0, 2000)]
+    assert hist.counts.sum() + hist.zeros.sum() == specgram.size
+    for percentile in (5, 50, 95):
+        nptest.assert_allclose(
+            hist.percentile(percentile).value,
+            specgram.percentile(percentile).value, rtol=.05)
+    # test merging disjoint histograms
+    other = data.SpectrumHistogram.from_spectrogram(specgram)
+    other.add(Spectrogram(specgram.value, t0=2000, dt=1, f0=0, df=.5))
+    assert hist.merge(other)
+    assert not hist.merge(other)
+    assert hist.counts.sum() + hist.zeros.sum() == specgram.size * 2
+
+
+def test_stft_spectrogram():
+    numpy.random.seed(0)
+    ts = TimeSeries(numpy.random.normal(size=256 * 64), sample_rate=256,
+                    t0=0, name='X1:TEST-A', unit='m')
+    ts2 = TimeSeries(numpy.random.normal(size=256 * 64), sample_rate=256,
+                     t0=0, name='X1:TEST-B')
+    try:
+        for method in ('welch', 'median'):
+            a = data.stft_spectrogram(ts, 8, fftlength=2, overlap=1,
+                                      method=method)
+            b = ts.spectrogram(8, fftlength=2, overlap=1, method=method)
+            nptest.assert_allclose(a.value, b.value, rtol=1e-10)
+            assert a.unit == b.unit
+            assert a.times[-1] == b.times[-1]
+        # check that the frames are shared between methods
+        frames, = globalv.FFT_FRAMES.values()
+        nframes = len(frames)
+        a = data.stft_spectrogram(ts, 8, fftlength=2, overlap=1,
+                                  method='rayleigh')
+        b = ts.rayleigh_spectrogram(8, fftlength=2, overlap=1)
+        nptest.assert_allclose(a.value, b.value, rtol=1e-10)
+        assert len(frames) == nframes
+        a = data.stft_spectrogram(ts, 8, fftlength=2, overlap=1,
+                                  method='csd', other=ts2)
+        b = ts.csd_spectrogram(ts2, 8, fftlength=2, overlap=1)
+        nptest.assert_allclose(a.value, b.value, rtol=1e-10)
+        assert len(globalv.FFT_FRAMES) == 2
+    finally:
+        globalv.FFT_FRAMES.clear()
+
+
+def test_get_spectrograms_batched(monkeypatch):
+    numpy.random.seed(0)
+    names = ['X1:TEST-BATCH_%d' % i for i in range(4)]
+    series = []
+    for i, name in enumerate(names):
+        series.append(TimeSeries(
+            numpy.random.normal(size=64 * 256), t0=0, name=name,
+            sample_rate=128 if i == 3 else 256, channel=name))
+        data.add_timeseries(series[-1], key=name)
+    # count the FFT calls
+    rfft = data.spectral._rfft
+    calls = []
+
+    def _rfft(x, *args, **kwargs):
+        calls.append(x.shape)
+        return rfft(x, *args, **kwargs)
+
+    monkeypatch.setattr(data.spectral, '_rfft', _rfft)
+    try:
+        out = data.get_spectrograms(names, [(0, 64)], stride=8,
+                                    fftlength=2, overlap=1, method='welch')
+        # the frames of the three channels at 256 Hz are transformed
+        # together, and every FFT of each length has the same shape
+        batch = data.spectral.FFT_BATCH
+        assert sorted(calls) == [(batch, 256)] + [(batch, 512)] * 3
+        for name, ts in zip(names, series):
+            specgram, = out[data.get_channel(name)]
+            ref = ts.crop(0, 57).spectrogram(8, fftlength=2, overlap=1,
+                                             method='welch')
+            nptest.assert_allclose(specgram.value, ref.value, rtol=1e-10)
+    finally:
+        globalv.FFT_FRAMES.clear()
+        for name in names:
+            globalv.DATA.pop(name, None)
+        for key in list(globalv.SPECTROGRAMS):
+            if key.startswith('X1:TEST-BATCH'):
+                globalv.SPECTROGRAMS.pop(key)
+
+
+def test_spectrogram_buffer():
+    numpy.random.seed(0)
+    name = 'X1:TEST-BUFFER'
+    full = TimeSeries(numpy.random.normal(size=64 * 100), t0=0,
+                      sample_rate=64, name=name, channel=name)
+    fftparams = {'stride': 8, 'fftlength': 2, 'overlap': 1,
+                 'method': 'welch'}
+    try:
+        # first run: the samples after the last stride are kept
+        data.add_timeseries(full.crop(0, 60), key=name)
+        data.get_spectrogram(name, [(0, 60)], **fftparams)
+        key, = [k for k in globalv.SPECTROGRAM_BUFFERS if k.startswith(name)]
+        assert globalv.SPECTROGRAM_BUFFERS[key].span == (56, 60)
+        # second run: only the new data are available
+        globalv.DATA.pop(name)
+        data.add_timeseries(full.crop(60, 100), key=name)
+        out = data.get_spectrogram(name, [(0, 100)], **fftparams)
+        assert globalv.SPECTROGRAM_BUFFERS[key].span == (96, 100)
+        assert out.segments == [(0, 96)]
+        ref = full.crop(56, 97).spectrogram(8, fftlength=2, overlap=1,
+                                            method='welch')
+        nptest.assert_allclose(out[-1].crop(56).value, ref.value,
+                               rtol=1e-10)
+    finally:
+        globalv.FFT_FRAMES.clear()
+        globalv.DATA.pop(name, None)
+        for k in list(globalv.SPECTROGRAMS):
+            if k.startswith(name):
+                globalv.SPECTROGRAMS.pop(k)
+                globalv.SPECTROGRAM_BUFFERS.pop(k, None)
+
+
+@empty_globalv_CHANNELS
+def test_get_fft_sizes():
+    a = data.get_channel('X1:TEST-FFT_A')
+    a.sample_rate = 256
+    b = data.get_channel('X1:TEST-FFT_B')
+    b.sample_rate = 16
+    b.fftlength = 8
+    c = data.get_channel('X1:TEST-FFT_C')  # unknown rate is ignored
+    assert data.get_fft_sizes([a, b, c], fftlength=2) == {512, 128}
+
+
+def test_fft_wisdom():
+    pytest.importorskip('pyfftw')
+    tmpdir = tempfile.mkdtemp()
+    try:
+        fname = data.fft_wisdom_file(tmpdir)
+        assert not data.load_fft_wisdom(fname)
+        data.prewarm_fft_plans([100])
+        assert data.save_fft_wisdom(fname)
+        assert data.load_fft_wisdom(fname)
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_get_coherence_spectrograms(monkeypatch):
+    numpy.random.seed(0)
+    names = ['X1:TEST-COH_X', 'X1:TEST-COH_A', 'X1:TEST-COH_B']
+    series = {}
+    for name, rate in zip(names, (512, 256, 256)):
+        series[name] = TimeSeries(numpy.random.normal(size=rate * 64), t0=0,
+                                  sample_rate=rate, name=name, channel=name)
+        data.add_timeseries(series[name], key=name)
+    # count the calls to resample
+    resample = TimeSeries.resample
+    calls = []
+
+    def _resample(self, *args, **kwargs):
+        calls.append(self.name)
+        return resample(self, *args, **kwargs)
+
+    monkeypatch.setattr(TimeSeries, 'resample', _resample)
+    try:
+        out = data.get_coherence_spectrograms(
+            [names[0], names[1], names[0], names[2]], [(0, 64)], stride=8,
+            fftlength=2, overlap=1)
+        # X is resampled once, for both pairs
+        assert calls == [names[0]]
+        x = resample(series[names[0]], 256)
+        pxx = x.spectrogram(8, fftlength=2, overlap=1, method='welch')
+        for name in names[1:]:
+            y = series[name]
+            pyy = y.spectrogram(8, fftlength=2, overlap=1, method='welch')
+            pxy = x.csd_spectrogram(y, 8, fftlength=2, overlap=1)
+            specgram, = out[(data.get_channel(names[0]),
+                             data.get_channel(name))]
+            nptest.assert_allclose(
+                specgram.value, abs(pxy.value) ** 2 / pxx.value / pyy.value,
+                rtol=1e-8)
+    finally:
+        globalv.FFT_FRAMES.clear()
+        for name in names:
+            globalv.DATA.pop(name, None)
+        for gdict in (globalv.SPECTROGRAMS, globalv.COHERENCE_COMPONENTS):
+            for key in list(gdict):
+                if key.startswith('X1:TEST-COH'):
+                    gdict.pop(key)
+
+
+def test_get_coherence_sample_rate():
+    names = ['X1:TEST-COHRATE_X', 'X1:TEST-COHRATE_Y']
+    chan1, chan2 = map(data.get_channel, names)
+    chan1.sample_rate = chan2.sample_rate = 512
+    assert data.get_coherence_sample_rate(*names) == 512
+    # data to be resampled on read
+    chan2.resample = 256
+    assert data.get_coherence_sample_rate(*names) == 256
+    # data already in memory, e.g. resampled on read
+    data.add_timeseries(TimeSeries(numpy.zeros(128), sample_rate=128,
+                                   name=names[0], channel=chan1),
+                        key=names[0])
+    try:
+        assert data.get_coherence_sample_rate(*names) == 128
+    finally:
+        globalv.DATA.pop(names[0], None)
+
+
+def test_get_coherence_matrix():
+    numpy.random.seed(1)
+    names = ['X1:TEST-COHM_X', 'X1:TEST-COHM_A', 'X1:TEST-COHM_B',
+             'X1:TEST-COHM_C']
+    for name, rate in zip(names, (512, 256, 512, 128)):
+        data.add_timeseries(
+            TimeSeries(numpy.random.normal(size=rate * 64), t0=0,
+                       sample_rate=rate, name=name, channel=name), key=name)
+    try:
+        matrix = data.get_coherence_matrix(names, [(0, 64)], stride=8,
+                                           fftlength=2, overlap=1)
+        assert matrix.value.shape == (3, 8, 513)
+        nptest.assert_array_equal(matrix.times, numpy.arange(0, 64, 8))
+        # each row matches the coherence of the pair
+        for i, name in enumerate(names[1:]):
+            specgram, = data.get_coherence_spectrogram(
+                [names[0], name], [(0, 64)], stride=8, fftlength=2,
+                overlap=1)
+            nfreq = specgram.shape[1]
+            nptest.assert_allclose(matrix.value[i, :, :nfreq],
+                                   specgram.value, rtol=1e-8)
+            assert numpy.isnan(matrix.value[i, :, nfreq:]).all()
+            nptest.assert_allclose(
+                matrix.spectrum(name).value[:nfreq],
+                numpy.median(specgram.value, axis=0), rtol=1e-8)
+        # cropping selects time bins
+        nptest.assert_array_equal(matrix.crop([(0, 32)]).times,
+                                  numpy.arange(0, 32, 8))
+    finally:
+        globalv.FFT_FRAMES.clear()
+        for name in names:
+            globalv.DATA.pop(name, None)
+        for gdict in (globalv.SPECTROGRAMS, globalv.COHERENCE_COMPONENTS,
+                      globalv.COHERENCE_MATRIX):
+            for key in list(gdict):
+                if key.startswith('X1:TEST-COHM'):
+                    gdict.pop(key)
+
+
+def test_coherence_matrix_append():
+    channels = ['X1:TEST-COHM_X', 'X1:TEST-COHM_A', 'X1:TEST-COHM_B']
+    value = numpy.ones((2, 2, 3))
+    value[1] = numpy.nan
+    matrix = data.CoherenceMatrix(value, [0, 8], range(3), 8, channels,
+                                  segments=[[(0, 16)], []])
+    # bins are only added for channels not already calculated, and the
+    # frequencies are padded when a higher sampling rate is known
+    other = data.CoherenceMatrix(
+        numpy.zeros((2, 3, 5)), [0, 8, 16], range(5), 8, channels,
+        segments=[[(0, 24)], [(8, 24)]])
+    matrix.append(other)
+    nptest.assert_array_equal(matrix.times, [0, 8, 16])
+    nptest.assert_array_equal(matrix.frequencies, range(5))
+    nptest.assert_array_equal(matrix.value[0, :2, :3], 1)
+    assert numpy.isnan(matrix.value[0, :2, 3:]).all()
+    nptest.assert_array_equal(matrix.value[0, 2], 0)
+    assert numpy.isnan(matrix.value[1, 0]).all()
+    nptest.assert_array_equal(matrix.value[1, 1:], 0)
+    assert matrix.segments == [[(0, 24)], [(8, 24)]]
+    # different frequencies can't be merged
+    with pytest.raises(ValueError):
+        matrix.append(data.CoherenceMatrix(
+            numpy.zeros((2, 1, 5)), [24], numpy.arange(5) / 2., 8,
+            channels, segments=[[(24, 32)], []]))
+
+
+# -- test range ---------------------------------------------------------------
+
+@pytest.mark.parametrize('rangekwargs', [
+    {'mass1': 1.4, 'mass2': 1.4, 'fmin': 10},
+    {'mass1': 30, 'mass2': 30, 'snr': 6},
+    {'energy': 1e-2, 'fmin': 10, 'fmax': 500},
+])
+def test_range_from_spectrogram(rangekwargs):
+    frequencies = arange(0, 2048.5, .5)
+    psd = 1e-46 * (1 + (30 / numpy.maximum(frequencies, 1)) ** 8 +
+                   (frequencies / 200.) ** 2)
+    specgram = Spectrogram([psd, psd * 2, psd * 4], t0=0, dt=60, f0=0, df=.5)
+    if 'energy' in rangekwargs:
+        range_func = astro.burst_range
+    else:
+        range_func = astro.inspiral_range
+    # test that batched range matches the single-PSD calculation
+    result, = data.range_from_spectrogram(specgram, rangekwargs)
+    nptest.assert_allclose(result, [range_func(
+        FrequencySeries(row.value, f0=0, df=.5), **rangekwargs).value
+        for row in specgram], rtol=1e-10)
+    # test that multiple parameter sets share one calculation
+    result2 = data.range_from_spectrogram(specgram, {}, rangekwargs)
+    assert len(result2) == 2
+    nptest.assert_allclose(result2[1], result)
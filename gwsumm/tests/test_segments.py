@@ -0,0 +1,327 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) Duncan Macleod (2013)
+#
+# This file is part of GWSumm.
+#
+# GWSumm is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GWSumm is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GWSumm.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for `gwsumm.segments`
+
+"""
+
+import operator
+
+import pytest
+
+from numpy import (arange, testing as nptest)
+
+from gwpy.segments import (Segment, SegmentList, DataQualityFlag,
+                           DataQualityDict)
+from gwpy.timeseries import (TimeSeries, StateVector)
+
+from gwsumm import (globalv, segments)
+
+__author__ = 'Duncan Macleod <duncan.macleod@ligo.org>'
+
+SEGMENTS = SegmentList([
+    Segment(2, 5),
+    Segment(4, 8),  # overlaps the first segment
+    Segment(12, 13),
+    Segment(20, 35),
+])
+
+
+OTHER = SegmentList([
+    Segment(0, 3),
+    Segment(6, 12.5),
+    Segment(30, 40),
+])
+
+
+# -- SegmentArray -------------------------------------------------------------
+
+class TestSegmentArray(object):
+    TYPE = segments.SegmentArray
+
+    def test_init(self):
+        array = self.TYPE(SEGMENTS)
+        nptest.assert_array_equal(array.start, [2, 12, 20])
+        nptest.assert_array_equal(array.end, [8, 13, 35])
+        assert array.to_segmentlist() == SegmentList(SEGMENTS).coalesce()
+        assert len(array) == 3
+        assert abs(array) == 22
+        assert not self.TYPE()
+
+    @pytest.mark.parametrize('op', [
+        operator.and_,
+        operator.or_,
+        operator.sub,
+        operator.xor,
+    ])
+    def test_operators(self, op):
+        a = SegmentList(SEGMENTS).coalesce()
+        b = SegmentList(OTHER).coalesce()
+        result = op(self.TYPE(SEGMENTS), self.TYPE(OTHER))
+        assert isinstance(result, self.TYPE)
+        assert result.to_segmentlist() == op(a, b).coalesce()
+
+    def test_invert(self):
+        inv = ~self.TYPE(SEGMENTS)
+        assert (inv & self.TYPE([(0, 40)])).to_segmentlist() == SegmentList([
+            Segment(0, 2), Segment(8, 12), Segment(13, 20), Segment(35, 40),
+        ])
+
+    def test_pad(self):
+        padded = self.TYPE(SEGMENTS).pad(-1, 1)
+        assert padded.to_segmentlist() == SegmentList([
+            Segment(1, 9), Segment(11, 14), Segment(19, 36),
+        ])
+        # contracting a segment to nothing removes it
+        contracted = self.TYPE(SEGMENTS).pad(1, -1)
+        assert len(contracted) == 2
+
+    def test_round(self):
+        array = self.TYPE([(0.5, 3.5), (10.2, 10.8)])
+        assert array.round().to_segmentlist() == SegmentList([
+            Segment(0, 4), Segment(10, 11)])
+        assert array.round(contract=True).to_segmentlist() == SegmentList([
+            Segment(1, 3)])
+
+
+# -- compound flags -----------------------------------------------------------
+
+@pytest.mark.parametrize('compound, op', [
+    ('X1:TEST-A:1&X1:TEST-B:1', operator.and_),
+    ('X1:TEST-A:1|X1:TEST-B:1', operator.or_),
+    ('X1:TEST-A:1!X1:TEST-B:1', operator.sub),
+])
+def test_get_segments_compound(compound, op):
+    validity = SegmentList([Segment(0, 40)])
+    a = DataQualityFlag('X1:TEST-A:1', known=validity, active=SEGMENTS)
+    b = DataQualityFlag('X1:TEST-B:1', known=validity, active=OTHER)
+    globalv.SEGMENTS[a.name] = a
+    globalv.SEGMENTS[b.name] = b
+    try:
+        flag = segments.get_segments(compound, validity, query=False)
+        expected = op(a & DataQualityFlag(known=validity, active=validity),
+                      b).coalesce()
+        assert flag.known == expected.known
+        assert flag.active == expected.active
+    finally:
+        globalv.SEGMENTS.pop(a.name)
+        globalv.SEGMENTS.pop(b.name)
+
+
+# -- segment store ------------------------------------------------------------
+
+class MockSegmentDatabase(object):
+    """Mock segment database, knowing about ``[0, 30)`` only
+    """
+    KNOWN = SegmentList([Segment(0, 30)])
+
+    def __init__(self):
+        self.requests = []
+
+    def __call__(self, flags, segments, **kwargs):
+        self.requests.append((sorted(flags), SegmentList(segments)))
+        out = DataQualityDict()
+        for name in flags:
+            known = self.KNOWN & SegmentList(segments)
+            out[name] = DataQualityFlag(name, known=known,
+                                        active=SEGMENTS & known)
+        return out
+
+
+class TestSegmentStore(object):
+    TYPE = segments.SegmentStore
+
+    def test_add_get(self, tmpdir):
+        store = self.TYPE(str(tmpdir.join('segments.sqlite')))
+        flag = DataQualityFlag('X1:TEST:1', known=[(0, 10)],
+                               active=SEGMENTS, description='test')
+        store.add(flag)
+        assert store.flags() == ['X1:TEST:1']
+        out = store.get('X1:TEST:1')
+        assert out.known == SegmentList([Segment(0, 10)])
+        assert out.active == SegmentList([Segment(2, 8)])
+        assert out.description == 'test'
+        # new segments extend, and supersede, what is stored
+        store.add(DataQualityFlag('X1:TEST:1', known=[(5, 15)],
+                                  active=[(12, 13)]))
+        out = store.get('X1:TEST:1', [(1, 20)])
+        assert out.known == SegmentList([Segment(1, 15)])
+        assert out.active == SegmentList([Segment(2, 5), Segment(12, 13)])
+        # unknown flags have no segments
+        assert not store.get('X1:MISSING:1').known
+
+    def test_url(self, tmpdir):
+        # the parent directory is created as needed
+        path = str(tmpdir.join('cache', 'gwsumm', 'segments.sqlite'))
+        store = self.TYPE(path)
+        store.add(DataQualityFlag('X1:TEST:1', known=[(0, 10)],
+                                  active=SEGMENTS), url='https://a')
+        # segments from different servers are stored separately
+        assert store.flags('https://a') == ['X1:TEST:1']
+        assert not store.flags()
+        assert not store.get('X1:TEST:1', url='https://b').known
+        assert store.get('X1:TEST:1', url='https://a').known == (
+            SegmentList([Segment(0, 10)]))
+
+    def test_query(self, tmpdir):
+        store = self.TYPE(str(tmpdir.join('segments.sqlite')))
+        segdb = MockSegmentDatabase()
+        flags = ['X1:TEST-A:1', 'X1:TEST-B:1']
+        out = store.query(flags, [(0, 20)], segdb)
+        assert segdb.requests == [(flags, SegmentList([Segment(0, 20)]))]
+        for name in flags:
+            assert out[name].known == SegmentList([Segment(0, 20)])
+            assert out[name].active == SegmentList(SEGMENTS).coalesce() & (
+                out[name].known)
+        # repeated query only asks for the uncovered times
+        out = store.query(flags, [(10, 40)], segdb)
+        assert segdb.requests[1] == (flags, SegmentList([Segment(20, 40)]))
+        assert out[flags[0]].known == SegmentList([Segment(10, 30)])
+        assert out[flags[0]].active == SegmentList([
+            Segment(12, 13), Segment(20, 30)])
+        # times that are already known don't need a query
+        store.query(flags[:1], [(5, 25)], segdb)
+        assert len(segdb.requests) == 2
+
+    def test_get_segments(self, tmpdir):
+        path = str(tmpdir.join('segments.sqlite'))
+        name = 'X1:TEST-STORE:1'
+        store = self.TYPE(path)
+        store.add(DataQualityFlag(name, known=[(0, 40)], active=OTHER))
+        try:
+            flag = segments.get_segments(name, [Segment(0, 40)], store=path)
+            assert flag.known == SegmentList([Segment(0, 40)])
+            assert flag.active == OTHER
+        finally:
+            globalv.SEGMENTS.pop(name)
+
+
+# -- segment broker -----------------------------------------------------------
+
+def test_segment_broker(monkeypatch):
+    segdb = MockSegmentDatabase()
+    monkeypatch.setattr(DataQualityDict, 'query_dqsegdb',
+                        lambda flags, segs, **kw: segdb(flags, segs, **kw))
+    flags = ['X1:TEST-BROKER_A:1', 'X1:TEST-BROKER_B:1']
+    broker = segments.SegmentBroker()
+    broker.add(flags[0], [Segment(0, 10)])
+    broker.add('&'.join(flags), [Segment(5, 20)])
+    assert len(broker) == 2
+    try:
+        broker.fetch(nproc=2)
+        assert not len(broker)
+        # one request per flag, for the union of requested times
+        assert sorted(segdb.requests) == [
+            ([flags[0]], SegmentList([Segment(0, 20)])),
+            ([flags[1]], SegmentList([Segment(5, 20)])),
+        ]
+        assert globalv.SEGMENTS[flags[1]].known == SegmentList([
+            Segment(5, 20)])
+        # segments are now in memory, so no new queries are needed
+        flag = segments.get_segments('&'.join(flags), [Segment(5, 15)])
+        assert len(segdb.requests) == 2
+        assert flag.active == SegmentList([Segment(5, 8), Segment(12, 13)])
+    finally:
+        for name in flags:
+            globalv.SEGMENTS.pop(name, None)
+
+
+# -- run-length encoding ------------------------------------------------------
+
+def test_run_length_encode():
+    series = TimeSeries([1, 1, 2, 2, 2, 1, 3], t0=10, dt=.5)
+    values, starts, ends = segments.run_length_encode(series)
+    nptest.assert_array_equal(values, [1, 2, 1, 3])
+    nptest.assert_array_equal(starts, [10, 11, 12.5, 13])
+    nptest.assert_array_equal(ends, [11, 12.5, 13, 13.5])
+    # check that grouped runs match the boolean conversion
+    groups = segments.group_runs(values, starts, ends)
+    assert list(groups) == [1, 2, 3]
+    for value, segs in groups.items():
+        assert segs.to_segmentlist() == (series == value).to_dqflag().active
+    # check empty series
+    values, starts, ends = segments.run_length_encode(TimeSeries([]))
+    assert values.size == starts.size == ends.size == 0
+
+
+def test_get_bit_segments():
+    data = StateVector([0, 1, 1, 3, 2, 2, 0, 1], t0=0, dt=1,
+                       bits=['a', 'b'])
+    flags = data.to_dqflags()
+    tags = [segments.STATE_VECTOR_BIT_TAG % ('X1:TEST', i) for i in (0, 1)]
+    try:
+        # nothing is decoded without query
+        out = segments.get_bit_segments('X1:TEST', [data], data.bits,
+                                        query=False)
+        assert not out['a'].known
+        assert tags[0] not in globalv.SEGMENTS
+        # decode the first half, then extend with the full series
+        segments.get_bit_segments('X1:TEST', [data[:4]], data.bits)
+        out = segments.get_bit_segments('X1:TEST', [data], data.bits)
+        for bit in flags:
+            assert out[bit].known == flags[bit].known
+            assert out[bit].active == SegmentList(flags[bit].active)
+        assert globalv.SEGMENTS[tags[1]].active == SegmentList([
+            Segment(3, 6)])
+        out = segments.get_bit_segments('X1:TEST', [data], data.bits,
+                                        query=False)
+        assert out['b'].active == SegmentList(flags['b'].active)
+    finally:
+        for tag in tags:
+            globalv.SEGMENTS.pop(tag, None)
+
+
+# -- utilities ----------------------------------------------------------------
+
+def test_get_livetime():
+    starts = arange(0, 40, 5)
+    ends = starts + 5
+    coalesced = SegmentList(SEGMENTS).coalesce()
+    nptest.assert_array_equal(
+        segments.get_livetime(SEGMENTS, starts, ends),
+        [float(abs(SegmentList([Segment(a, b)]) & coalesced)) for
+         (a, b) in zip(starts, ends)],
+    )
+    # check empty segment list
+    nptest.assert_array_equal(
+        segments.get_livetime(SegmentList(), starts, ends), 0)
+
+
+def test_get_duty_factor():
+    starts = arange(0, 40, 5)
+    ends = starts + 5
+    livetime = segments.get_livetime(SEGMENTS, starts, ends)
+    duty, mean = segments.get_duty_factor(SEGMENTS, starts, ends)
+    nptest.assert_array_almost_equal(duty, livetime * 20)
+    nptest.assert_array_almost_equal(
+        mean, [duty[:i+1].mean() for i in range(duty.size)])
+    duty, _ = segments.get_duty_factor(SEGMENTS, starts, ends,
+                                       normalized=False, cumulative=True)
+    nptest.assert_array_equal(duty, livetime.cumsum())
+
+
+def test_get_coincident_segments():
+    a = SegmentList([Segment(0, 10), Segment(20, 30)])
+    b = SegmentList([Segment(5, 25)])
+    c = SegmentList([Segment(8, 9), Segment(28, 40)])
+    assert segments.get_coincident_segments([a, b, c]) == SegmentList([
+        Segment(5, 10), Segment(20, 25), Segment(28, 30),
+    ])
+    assert segments.get_coincident_segments([a, b, c], n=3) == SegmentList([
+        Segment(8, 9),
+    ])
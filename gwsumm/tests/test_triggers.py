@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) Duncan Macleod (2013)
+#
+# This file is part of GWSumm.
+#
+# GWSumm is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GWSumm is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GWSumm.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for `gwsumm.triggers`
+
+"""
+
+import os
+
+from numpy import (arange, testing as nptest)
+
+from gwpy.table import EventTable
+from gwpy.segments import (Segment, SegmentList)
+
+from gwsumm import (globalv, triggers)
+from gwsumm.config import GWSummConfigParser
+
+__author__ = 'Duncan Macleod <duncan.macleod@ligo.org>'
+
+
+def create(start, end):
+    table = EventTable([arange(start, end, dtype=float),
+                        arange(start, end) * 2.],
+                       names=['time', 'snr'])
+    table.meta['segments'] = SegmentList([Segment(start, end)])
+    table.meta['timecolumn'] = 'time'
+    return table
+
+
+def test_add_triggers():
+    key = 'X1:TEST-CHANNEL,test'
+    try:
+        for i in range(5):
+            store = triggers.add_triggers(create(i * 10, (i + 1) * 10), key)
+        assert store is globalv.TRIGGERS[key]
+        assert isinstance(store, triggers.ChunkedEventTable)
+        assert len(store) == 50
+        assert len(store.chunks) == 5
+        assert store.meta['segments'] == [Segment(0, 50)]
+
+        # check that the contiguous table is built on demand, once
+        table = store.table
+        assert len(store.chunks) == 1
+        assert store.table is table
+        nptest.assert_array_equal(table['time'], arange(50))
+        assert table.meta['timecolumn'] == 'time'
+
+        # check that get_triggers returns events from memory
+        out = triggers.get_triggers('X1:TEST-CHANNEL', 'test', [(5, 15)],
+                                    query=False)
+        nptest.assert_array_equal(out['time'], arange(5, 15))
+        assert out.meta['segments'] == [Segment(5, 15)]
+    finally:
+        globalv.TRIGGERS.pop(key, None)
+
+
+def test_keep_in_segments():
+    store = triggers.ChunkedEventTable([create(10, 20), create(0, 10)])
+    segs = SegmentList([Segment(2, 6), Segment(15, 30)])
+
+    # check chunked table is sorted, and sliced using the sorted times
+    out = triggers.keep_in_segments(store, segs)
+    nptest.assert_array_equal(store.get_times(), arange(20))
+    nptest.assert_array_equal(out['time'], [2, 3, 4, 5, 15, 16, 17, 18, 19])
+    assert out.meta['segments'] == [Segment(2, 6), Segment(15, 20)]
+
+    # check plain tables give the same answer
+    out2 = triggers.keep_in_segments(create(0, 20), segs)
+    nptest.assert_array_equal(out2['time'], out['time'])
+
+
+def test_sieve_cache():
+    cache = ['/tmp/X1-TEST-0-100.xml', '/tmp/X1-TEST-100-100.xml',
+             '/tmp/X1-TEST-200-100.xml', '/tmp/X1-TEST-0-100.xml',
+             '/tmp/test.xml']
+    segs = SegmentList([Segment(10, 20), Segment(50, 150)])
+    assert triggers.sieve_cache(cache, segs) == [
+        '/tmp/X1-TEST-0-100.xml', '/tmp/X1-TEST-100-100.xml',
+        '/tmp/test.xml']
+
+
+def test_trigger_file_index(tmpdir):
+    index = triggers.TriggerFileIndex(str(tmpdir.join('index.sqlite')),
+                                      latency=0)
+    calls = []
+
+    def find(channel, etg, start, end, **kwargs):
+        calls.append((start, end))
+        return ['file:///triggers/X1-TEST-%d-100.xml' % t for
+                t in range(int(start) // 100 * 100, int(end), 100)]
+
+    cache = index.find('X1:TEST', 'test', 50, 250, find_func=find)
+    assert cache == ['/triggers/X1-TEST-0-100.xml',
+                     '/triggers/X1-TEST-100-100.xml',
+                     '/triggers/X1-TEST-200-100.xml']
+    assert index.searched('X1:TEST', 'test') == [Segment(50, 250)]
+
+    # check that only new times are searched
+    cache = index.find('X1:TEST', 'test', 150, 350, find_func=find)
+    assert calls == [(50, 250), (250, 350)]
+    assert cache == ['/triggers/X1-TEST-100-100.xml',
+                     '/triggers/X1-TEST-200-100.xml',
+                     '/triggers/X1-TEST-300-100.xml']
+    index.find('X1:TEST', 'test', 100, 300, find_func=find)
+    assert len(calls) == 2
+
+    # check that keyword arguments are part of the search
+    index.find('X1:TEST', 'test', 100, 300, find_func=find, ext='h5')
+    assert len(calls) == 3
+
+
+def test_trigger_file_index_changed(tmpdir):
+    index = triggers.TriggerFileIndex(str(tmpdir.join('index.sqlite')),
+                                      latency=0)
+    trigdir = tmpdir.mkdir('triggers')
+    calls = []
+
+    def find(channel, etg, start, end, **kwargs):
+        calls.append((start, end))
+        return sorted(str(f) for f in trigdir.listdir())
+
+    trigdir.join('X1-TEST-0-100.xml').write('')
+    os.utime(str(trigdir), (0, 0))
+    assert index.find('X1:TEST', 'test', 0, 200, find_func=find) == [
+        str(trigdir.join('X1-TEST-0-100.xml'))]
+
+    # a file that arrives late changes the directory, so search again
+    trigdir.join('X1-TEST-100-100.xml').write('')
+    cache = index.find('X1:TEST', 'test', 0, 200, find_func=find)
+    assert calls == [(0, 200), (0, 200)]
+    assert len(cache) == 2
+
+    # nothing has changed, so no search is needed
+    index.find('X1:TEST', 'test', 0, 200, find_func=find)
+    assert len(calls) == 2
+
+    # files are only checked in changed directories
+    os.utime(str(trigdir.join('X1-TEST-100-100.xml')), (1, 1))
+    index.find('X1:TEST', 'test', 0, 200, find_func=find)
+    assert len(calls) == 2
+
+    # a removed file is removed from the index
+    trigdir.join('X1-TEST-100-100.xml').remove()
+    os.utime(str(trigdir), (2e9, 2e9))
+    index.find('X1:TEST', 'test', 0, 200, find_func=find)
+    assert calls[2:] == [(0, 200)]
+    assert len(index.files('X1:TEST', 'test', 0, 200)) == 1
+
+
+def test_get_read_columns():
+    # check time column is always read
+    assert triggers.get_read_columns(
+        {'snr'}, {'format': 'hdf5', 'timecolumn': 'time'}) == ['snr', 'time']
+    # check configured columns are kept, and invalid LIGO_LW columns ignored
+    assert triggers.get_read_columns(
+        {'snr', 'peak_frequency', 'time'},
+        {'format': 'ligolw', 'tablename': 'sngl_burst'},
+        columns=['duration']) == ['duration', 'peak', 'peak_frequency', 'snr']
+
+
+def test_add_trigger_columns(tmpdir):
+    table = create(0, 10)
+    table['frequency'] = table['snr'] * 10
+    table['bandwidth'] = table['snr'] * 5
+    path = str(tmpdir.join('X1-TEST-0-10.h5'))
+    table.write(path, path='triggers', format='hdf5')
+    key = 'X1:TEST-CHANNEL,test'
+    try:
+        triggers.add_trigger_columns('X1:TEST-CHANNEL', 'test', ['snr'])
+        triggers.add_trigger_columns('X1:TEST-CHANNEL', 'TEST',
+                                     ['frequency'])
+        assert globalv.TRIGGER_COLUMNS[key] == {'snr', 'frequency'}
+        config = GWSummConfigParser()
+        config.add_section('test')
+        config.set('test', 'format', 'hdf5')
+        config.set('test', 'path', 'triggers')
+        config.set('test', 'timecolumn', 'time')
+        out = triggers.get_triggers('X1:TEST-CHANNEL', 'test',
+                                    [Segment(0, 10)], config=config,
+                                    cache=[path])
+        assert sorted(out.colnames) == ['frequency', 'snr', 'time']
+        assert len(out) == 10
+        # a newly needed column means reading the same times again
+        triggers.add_trigger_columns('X1:TEST-CHANNEL', 'test',
+                                     ['bandwidth'])
+        out = triggers.get_triggers('X1:TEST-CHANNEL', 'test',
+                                    [Segment(0, 10)], config=config,
+                                    cache=[path])
+        assert sorted(out.colnames) == [
+            'bandwidth', 'frequency', 'snr', 'time']
+        assert len(out) == 10
+    finally:
+        globalv.TRIGGER_COLUMNS.pop(key, None)
+        globalv.TRIGGERS.pop(key, None)
+
+
+def test_get_binned_rates():
+    key = 'X1:TEST-CHANNEL,test'
+    try:
+        triggers.add_triggers(create(0, 60), key)
+        state = SegmentList([Segment(5, 25), Segment(40, 60)])
+        table = triggers.get_triggers('X1:TEST-CHANNEL', 'test', state,
+                                      query=False)
+        refs = table.binned_event_rates(10, 'snr', [20, 60], start=0,
+                                        end=60).values()
+        # check that counts are only stored with query
+        for query in (False, True):
+            rates = triggers.get_binned_rates(
+                'X1:TEST-CHANNEL', 'test', state, 10, 0, 60, column='snr',
+                bins=[20, 60], query=query)
+            for rate, ref in zip(rates, refs):
+                nptest.assert_array_equal(rate.value, ref.value)
+                assert rate.name == ref.name
+            assert len(globalv.TRIGGER_RATES) == int(query)
+
+        # check that new events are added to the counts
+        span = SegmentList([Segment(0, 120)])
+        assert triggers.get_binned_rates('X1:TEST-CHANNEL', 'test', span,
+                                         10, 0, 120, return_=False) is None
+        triggers.add_triggers(create(60, 120), key)
+        rate, = triggers.get_binned_rates('X1:TEST-CHANNEL', 'test', span,
+                                          10, 0, 120)
+        nptest.assert_array_equal(rate.value, [1.] * 12)
+    finally:
+        globalv.TRIGGERS.pop(key, None)
+        globalv.TRIGGER_RATES.clear()
+
+
+def test_find_loudest():
+    times = [0., 1., 2., 10., 11., 20.]
+    ranks = [5., 6., 1., 4., 8., 2.]
+    nptest.assert_array_equal(triggers.find_loudest(times, ranks, 3),
+                              [4, 1, 0])
+    nptest.assert_array_equal(
+        triggers.find_loudest(times, ranks, 5, dt=5), [4, 1, 5])
+    nptest.assert_array_equal(
+        triggers.find_loudest(times, ranks, 5, dt=5, threshold=5), [4, 1])
+
+
+def test_get_loudest_events():
+    key = 'X1:TEST-CHANNEL,test'
+    try:
+        triggers.add_triggers(create(0, 60), key)
+        state = SegmentList([Segment(5, 25), Segment(40, 60)])
+        loudest = triggers.get_loudest_events(
+            'X1:TEST-CHANNEL', 'test', state, 'snr', 3, dt=5,
+            timecolumn='time', state='test')
+        nptest.assert_array_equal(loudest['time'], [59, 54, 49])
+        stored, = globalv.TRIGGER_LOUDEST.values()
+        assert len(stored.candidates) == 11
+        assert stored.segments == state
+
+        # check that new events are ranked against the candidates
+        triggers.add_triggers(create(60, 120), key)
+        state.append(Segment(60, 120))
+        loudest = triggers.get_loudest_events(
+            'X1:TEST-CHANNEL', 'test', state, 'snr', 3, dt=5,
+            timecolumn='time', state='test')
+        nptest.assert_array_equal(loudest['time'], [119, 114, 109])
+        assert globalv.TRIGGER_LOUDEST.popitem()[1] is stored
+    finally:
+        globalv.TRIGGERS.pop(key, None)
+        globalv.TRIGGER_LOUDEST.clear()
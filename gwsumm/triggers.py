@@ -19,10 +19,19 @@
 """Read and store transient event triggers
 """
 
+import os
+import sqlite3
 import warnings
+from collections import OrderedDict
+from math import ceil
+from configparser import (NoSectionError, NoOptionError)
+from contextlib import closing
 
+from six import string_types
 from six.moves.urllib.parse import urlparse
 
+import numpy
+
 from astropy.table import vstack as vstack_tables
 
 from lal.utils import CacheEntry
@@ -30,11 +39,13 @@ from lal.utils import CacheEntry
 from glue.lal import Cache
 from glue.ligolw import lsctables
 
-from gwpy.io.cache import cache_segments
+from gwpy.io.cache import (cache_segments, file_segment)
 from gwpy.table import (EventTable, filters as table_filters)
-from gwpy.table.filter import parse_column_filters
+from gwpy.table.filter import (parse_column_filters, parse_operator)
 from gwpy.table.io.pycbc import filter_empty_files as filter_pycbc_live_files
-from gwpy.segments import (DataQualityFlag, SegmentList)
+from gwpy.segments import (DataQualityFlag, Segment, SegmentList)
+from gwpy.time import to_gps
+from gwpy.timeseries import TimeSeries
 
 import gwtrigfind
 
@@ -42,6 +53,7 @@ from . import globalv
 from .utils import (re_cchar, vprint, safe_eval)
 from .config import GWSummConfigParser
 from .channels import get_channel
+from .segments import get_livetime
 
 # build list of default keyword arguments for reading ETGs
 ETG_READ_KW = {
@@ -97,6 +109,13 @@ ETG_READ_KW = {
     },
 }
 
+# time columns for well-defined LIGO_LW table types
+LIGOLW_TIME_COLUMNS = (
+    ('_burst', 'peak'),
+    ('_inspiral', 'end'),
+    ('_ringdown', 'start'),
+)
+
 # set default for all LIGO_LW
 for name in lsctables.TableByName:
     ETG_READ_KW[name] = {
@@ -139,8 +158,14 @@ def get_etg_table(etg):
 def get_triggers(channel, etg, segments, config=GWSummConfigParser(),
                  cache=None, columns=None, format=None, query=True,
                  nproc=1, ligolwtable=None, filter=None,
-                 timecolumn=None, verbose=False, return_=True):
+                 timecolumn=None, verbose=False, return_=True,
+                 index=None):
     """Read a table of transient event triggers for a given channel.
+
+    If ``index`` is given (as a `TriggerFileIndex` or the path of one), or
+    the ``[trigfind]`` section of the ``config`` defines an ``index``,
+    trigger files are found using the index, rather than searching the
+    trigger directories with `gwtrigfind` each time.
     """
     key = '%s,%s' % (str(channel), etg.lower())
     # convert input segments to a segmentlist (for convenience)
@@ -155,6 +180,7 @@ def get_triggers(channel, etg, segments, config=GWSummConfigParser(),
     # extract columns (using function keyword if given)
     if columns:
         read_kw['columns'] = columns
+    usercolumns = columns
     columns = read_kw.pop('columns', None)
 
     # override with user options
@@ -162,6 +188,12 @@ def get_triggers(channel, etg, segments, config=GWSummConfigParser(),
         read_kw['format'] = format
     elif not read_kw.get('format', None):
         read_kw['format'] = etg.lower()
+
+    # if not given, only read the columns needed by all tabs
+    if not usercolumns and globalv.TRIGGER_COLUMNS.get(key) is not None:
+        columns = get_read_columns(globalv.TRIGGER_COLUMNS[key], read_kw,
+                                   columns=columns, timecolumn=timecolumn)
+
     if timecolumn:
         read_kw['timecolumn'] = timecolumn
     elif columns is not None and 'time' in columns:
@@ -177,6 +209,16 @@ def get_triggers(channel, etg, segments, config=GWSummConfigParser(),
     if filter:
         read_kw['selection'].extend(parse_column_filters(filter))
 
+    # if the events in memory (e.g. from an archive) were read without
+    # some of the columns needed now, read all of the segments again
+    try:
+        havecols = globalv.TRIGGERS[key].meta['columns']
+    except KeyError:  # all columns were read
+        pass
+    else:
+        if query and (columns is None or not set(columns) <= set(havecols)):
+            globalv.TRIGGERS.pop(key)
+
     # read segments from global memory
     try:
         havesegs = globalv.TRIGGERS[key].meta['segments']
@@ -204,49 +246,48 @@ def get_triggers(channel, etg, segments, config=GWSummConfigParser(),
         if etg.lower() in ['kw', 'kleinewelle']:
             read_kw['selection'].append('channel == "%s"' % channel)
 
-        # filter on segments
+        # filter on segments as each file is read, so that only events
+        # in the segments (not the whole extent) are held in memory
         if 'timecolumn' in read_kw:
             read_kw['selection'].append((
                 read_kw['timecolumn'], table_filters.in_segmentlist, new))
 
         # -- read -----------
 
-        # if single file
-        if cache is not None and len(cache) == 1:
-            trigs = read_cache(cache, new, etg, nproc=nproc, **read_kw)
-            if trigs is not None:
+        # HACR triggers are read from a database, one segment at a time
+        if etg.lower() == 'hacr':
+            from gwpy.table.io.hacr import get_hacr_triggers
+            for segment in new:
+                trigs = get_hacr_triggers(channel, segment[0], segment[1],
+                                          columns=columns)
+                trigs.meta['segments'] = SegmentList([segment])
+                if columns is not None:
+                    trigs.meta['columns'] = list(columns)
                 add_triggers(trigs, key)
                 ntrigs += len(trigs)
-        # otherwise, loop over segments
+                vprint(".")
+        # otherwise find files once for all segments, and read them together
         else:
-            for segment in new:
-                # find trigger files
-                if cache is None and not etg.lower() == 'hacr':
-                    try:
-                        segcache = gwtrigfind.find_trigger_files(
-                            str(channel), trigfindetg, segment[0], segment[1],
-                            **trigfindkwargs)
-                    except ValueError as e:
-                        warnings.warn("Caught %s: %s"
-                                      % (type(e).__name__, str(e)))
-                        continue
-                elif cache is not None:
-                    segcache = cache
-                # read table
-                if etg.lower() == 'hacr':
-                    from gwpy.table.io.hacr import get_hacr_triggers
-                    trigs = get_hacr_triggers(channel, segment[0], segment[1],
-                                              columns=columns)
-                    trigs.meta['segments'] = SegmentList([segment])
+            if cache is None:
+                extent = new.extent()
+                index = _get_trigger_index(index, config)
+                if index is None:
+                    find = gwtrigfind.find_trigger_files
                 else:
-                    trigs = read_cache(segcache, SegmentList([segment]), etg,
-                                       nproc=nproc, **read_kw)
-                # record triggers
-                if trigs is not None:
-                    # add metadata
-                    add_triggers(trigs, key)
-                    ntrigs += len(trigs)
-                vprint(".")
+                    find = index.find
+                try:
+                    cache = find(str(channel), trigfindetg, extent[0],
+                                 extent[1], **trigfindkwargs)
+                except ValueError as e:
+                    warnings.warn("Caught %s: %s"
+                                  % (type(e).__name__, str(e)))
+                    cache = []
+            trigs = read_cache(cache, new, etg, nproc=nproc, **read_kw)
+            if trigs is not None:
+                if columns is not None:
+                    trigs.meta['columns'] = list(columns)
+                add_triggers(trigs, key)
+                ntrigs += len(trigs)
         vprint(" | %d events read\n" % ntrigs)
 
     # if asked to read triggers, but didn't actually read any,
@@ -262,6 +303,8 @@ def get_triggers(channel, etg, segments, config=GWSummConfigParser(),
         else:  # map to LIGO_LW table with full column listing
             tab = EventTable(lsctables.New(TableClass))
         tab.meta['segments'] = SegmentList()
+        if columns is not None:
+            tab.meta['columns'] = list(columns)
         for metakey in ('timecolumn', 'tablename',):
             if metakey in read_kw:
                 tab.meta[metakey] = read_kw[metakey]
@@ -274,32 +317,216 @@ def get_triggers(channel, etg, segments, config=GWSummConfigParser(),
 
 def add_triggers(table, key, segments=None):
     """Add a `EventTable` to the global memory cache
+
+    Parameters
+    ----------
+    table : `~gwpy.table.EventTable`
+        the table of events to add
+
+    key : `str`
+        the key against which to store these events
+
+    segments : `~gwpy.segments.SegmentList`, optional
+        the segments covered by this table, defaults to
+        ``table.meta['segments']``
+
+    Returns
+    -------
+    store : `ChunkedEventTable`
+        the accumulated table for this key in `globalv.TRIGGERS`,
+        use ``store.table`` to get a contiguous `EventTable`
     """
     if segments is not None:
         table.meta['segments'] = segments
     try:
-        old = globalv.TRIGGERS[key]
+        store = globalv.TRIGGERS[key]
     except KeyError:
-        new = globalv.TRIGGERS[key] = table
-        new.meta.setdefault('segments', SegmentList())
-    else:
-        new = globalv.TRIGGERS[key] = vstack_tables((old, table))
-        new.meta = old.meta
-        new.meta['segments'] |= table.meta.get('segments', SegmentList())
-    new.meta['segments'].coalesce()
-    return new
+        store = globalv.TRIGGERS[key] = ChunkedEventTable()
+    store.append(table)
+    return store
+
+
+class ChunkedEventTable(object):
+    """An append-only table of events, stored as a list of chunks
+
+    Appending a new table only records a reference to it, rather than
+    copying all existing rows (as `~astropy.table.vstack` would), so
+    accumulating events for many segments costs time linear in the total
+    number of events.
+    The chunks are stacked into a contiguous `~gwpy.table.EventTable` only
+    when :attr:`ChunkedEventTable.table` is accessed, and the result is
+    cached until the next append.
+
+    The first call to :meth:`ChunkedEventTable.get_times` sorts the table
+    by time and caches the times as a float array, so that
+    `keep_in_segments` can select events with a binary search, rather
+    than testing every event.
+
+    Parameters
+    ----------
+    tables : `list` of `~gwpy.table.EventTable`, optional
+        the initial chunks
+    """
+    def __init__(self, tables=()):
+        self.chunks = []
+        self._times = None
+        self.meta = OrderedDict()
+        self.meta['segments'] = SegmentList()
+        for table in tables:
+            self.append(table)
+
+    def append(self, table):
+        """Append a new chunk of events to this table
+
+        The metadata of the first chunk are retained (as for the table
+        itself), while the ``'segments'`` of all chunks are combined.
+        """
+        for key, val in table.meta.items():
+            if key != 'segments':
+                self.meta.setdefault(key, val)
+        self.meta['segments'] |= table.meta.get('segments', SegmentList())
+        self.meta['segments'].coalesce()
+        self.chunks.append(table)
+        self._times = None
+        return self
+
+    @property
+    def table(self):
+        """The contiguous `~gwpy.table.EventTable` of all events
+        """
+        if len(self.chunks) > 1:  # stack once, and keep the result
+            self.chunks = [vstack_tables(self.chunks,
+                                         metadata_conflicts='silent')]
+        if not self.chunks:
+            self.chunks.append(EventTable())
+        table = self.chunks[0]
+        table.meta = self.meta.copy()
+        return table
+
+    def get_times(self, etg=None):
+        """Get the time of each event, sorting the table by time if needed
+
+        Parameters
+        ----------
+        etg : `str`, optional
+            the name of the trigger generator, see `get_times`
+
+        Returns
+        -------
+        times : `numpy.ndarray`
+            the sorted `float64` array of event times, matching the rows
+            of :attr:`ChunkedEventTable.table`
+        """
+        if self._times is None:
+            table = self.table
+            times = numpy.asarray(get_times(table, etg), dtype='float64')
+            if (times[1:] < times[:-1]).any():
+                order = numpy.argsort(times, kind='mergesort')
+                self.chunks = [table[order]]
+                times = times[order]
+            self._times = times
+        return self._times
+
+    def __len__(self):
+        return sum(map(len, self.chunks))
+
+    def __repr__(self):
+        return '<%s(%d rows, %d chunks)>' % (
+            type(self).__name__, len(self), len(self.chunks))
+
+
+def add_trigger_columns(channel, etg, columns):
+    """Register the table columns needed from the triggers for a channel
+
+    Once registered, `get_triggers` only reads the union of all columns
+    registered for each channel and ETG (plus the time column), unless
+    the ``columns`` are given explicitly.
+
+    Parameters
+    ----------
+    channel : `str`
+        the name of the channel
+
+    etg : `str`
+        the name of the trigger generator
+
+    columns : `set` of `str`, `None`
+        the columns needed, or `None` if all columns are needed, which
+        disables column selection for this channel and ETG
+    """
+    key = '%s,%s' % (str(channel), etg.lower())
+    if columns is None:
+        globalv.TRIGGER_COLUMNS[key] = None
+    elif key not in globalv.TRIGGER_COLUMNS:
+        globalv.TRIGGER_COLUMNS[key] = set(columns)
+    elif globalv.TRIGGER_COLUMNS[key] is not None:
+        globalv.TRIGGER_COLUMNS[key].update(columns)
 
 
 def keep_in_segments(table, segmentlist, etg=None):
     """Return a view of the table containing only those rows in the segmentlist
+
+    Parameters
+    ----------
+    table : `~gwpy.table.EventTable` or `ChunkedEventTable`
+        the table to filter, for a `ChunkedEventTable` the rows in each
+        segment are found by binary search of the sorted event times
+
+    segmentlist : `~gwpy.segments.SegmentList`
+        the segments in which to keep events
+
+    etg : `str`, optional
+        the name of the trigger generator, see `get_times`
+
+    Returns
+    -------
+    table : `~gwpy.table.EventTable`
+        a new table with only those events in the ``segmentlist``
     """
-    times = get_times(table, etg)
-    keep = table_filters.in_segmentlist(times, segmentlist)
-    out = table[keep]
+    if isinstance(table, ChunkedEventTable):
+        times = table.get_times(etg)
+        table = table.table
+        starts, ends = get_segment_index(times, segmentlist)
+        if starts.size == 1:  # single slice, no need to copy
+            out = table[starts[0]:ends[0]]
+        else:
+            out = table[numpy.concatenate([numpy.arange(0)] + [
+                numpy.arange(i, j) for i, j in zip(starts, ends)])]
+    else:
+        times = numpy.asarray(get_times(table, etg), dtype='float64')
+        order = numpy.argsort(times, kind='mergesort')
+        keep = numpy.zeros(times.size, dtype=bool)
+        for i, j in zip(*get_segment_index(times[order], segmentlist)):
+            keep[order[i:j]] = True
+        out = table[keep]
     out.meta['segments'] = segmentlist & table.meta['segments']
     return out
 
 
+def get_segment_index(times, segmentlist):
+    """Find the rows of a sorted time array that lie in each segment
+
+    Parameters
+    ----------
+    times : `numpy.ndarray`
+        a sorted array of times
+
+    segmentlist : `~gwpy.segments.SegmentList`
+        the segments to find, these are coalesced before searching
+
+    Returns
+    -------
+    starts, ends : `numpy.ndarray`
+        the index of the first row in, and the first row after, each
+        coalesced segment, such that ``times[starts[i]:ends[i]]`` are all
+        the times ``t`` for which ``segment[0] <= t < segment[1]``
+    """
+    bounds = numpy.array(SegmentList(segmentlist).coalesce(),
+                         dtype='float64').reshape(-1, 2)
+    return (numpy.searchsorted(times, bounds[:, 0], side='left'),
+            numpy.searchsorted(times, bounds[:, 1], side='left'))
+
+
 def get_times(table, etg):
     """Get the time data for this table
 
@@ -312,11 +539,7 @@ def get_times(table, etg):
     except ValueError:
         # match well-defined LIGO_LW table types
         tablename = table.meta.get('tablename') or ''
-        for ttype, tcol in (
-                ('_burst', 'peak'),
-                ('_inspiral', 'end'),
-                ('_ringdown', 'start'),
-        ):
+        for ttype, tcol in LIGOLW_TIME_COLUMNS:
             if tablename.endswith(ttype):
                 sec = '{0}_time'.format(tcol)
                 nanosec = '{0}_time_ns'.format(tcol)
@@ -340,17 +563,55 @@ def get_time_column(table, etg):
 
         # match well-defined LIGO_LW table types
         tablename = table.meta.get('tablename') or ''
-        for ttype, tcol in (
-                ('_burst', 'peak'),
-                ('_inspiral', 'end'),
-                ('_ringdown', 'start'),
-        ):
+        for ttype, tcol in LIGOLW_TIME_COLUMNS:
             if tablename.endswith(ttype) and tcol in table.columns:
                 table.meta['timecolumn'] = tcol
                 return tcol
         raise
 
 
+def get_read_columns(needed, read_kw, columns=None, timecolumn=None):
+    """Work out which columns to read to provide the needed columns
+
+    Parameters
+    ----------
+    needed : `set` of `str`
+        the names of the columns needed, e.g. by plots
+
+    read_kw : `dict`
+        the keyword arguments that will be used to read the triggers,
+        see `get_etg_read_kwargs`
+
+    columns : `list` of `str`, optional
+        columns configured for this ETG, these are always read
+
+    timecolumn : `str`, optional
+        the name of the time column, defaults to
+        ``read_kw['timecolumn']``, if given
+
+    Returns
+    -------
+    columns : `list` of `str`
+        the columns to read, including the time column; for LIGO_LW
+        tables, columns that are not valid for the table are ignored
+    """
+    needed = set(needed)
+    timecolumn = timecolumn or read_kw.get('timecolumn')
+    if timecolumn:
+        needed.add(timecolumn)
+    tablename = read_kw.get('tablename') or ''
+    if read_kw.get('format') == 'ligolw' and (
+            tablename in lsctables.TableByName):
+        table = lsctables.TableByName[tablename]
+        valid = set(c.split(':')[-1] for c in table.validcolumns)
+        needed = set(c for c in needed if
+                     c in valid or hasattr(table, 'get_%s' % c))
+        for ttype, tcol in LIGOLW_TIME_COLUMNS:
+            if tablename.endswith(ttype):
+                needed.add(tcol)
+    return list(OrderedDict.fromkeys(list(columns or []) + sorted(needed)))
+
+
 def get_etg_read_kwargs(etg, config=None, exclude=['columns']):
     """Read keyword arguments to pass to the trigger reader for a given etg
     """
@@ -421,12 +682,12 @@ def read_cache(cache, segments, etg, nproc=1, timecolumn=None, **kwargs):
         the segments
     """
     if isinstance(cache, Cache):
-        cache = cache.sieve(segmentlist=segments)
+        cache = cache.sieve(segmentlist=segments).unique()
         cache = cache.checkfilesexist()[0]
         cache.sort(key=lambda x: x.segment[0])
         cache = cache.pfnlist()  # some readers only like filenames
     else:
-        cache = [urlparse(url).path for url in cache]
+        cache = sieve_cache([urlparse(url).path for url in cache], segments)
     if etg == 'pycbc_live':  # remove empty HDF5 files
         cache = filter_pycbc_live_files(cache, ifo=kwargs['ifo'])
 
@@ -434,7 +695,7 @@ def read_cache(cache, segments, etg, nproc=1, timecolumn=None, **kwargs):
         return
 
     # read triggers
-    table = EventTable.read(cache, **kwargs)
+    table = EventTable.read(cache, nproc=nproc, **kwargs)
 
     # store read keywords in the meta table
     if timecolumn:
@@ -453,5 +714,710 @@ def read_cache(cache, segments, etg, nproc=1, timecolumn=None, **kwargs):
 
     if timecolumn:  # already filtered on-the-fly
         return table
-    # filter now
+    # filter all events in a single pass
     return keep_in_segments(table, segments, etg)
+
+
+def sieve_cache(cache, segments):
+    """Remove duplicate files, and files that don't overlap the segments
+
+    Parameters
+    ----------
+    cache : `list` of `str`
+        the list of file paths to sieve, files whose names do not
+        follow the T050017 convention are always kept
+
+    segments : `~gwpy.segments.SegmentList`
+        the list of segments to match
+
+    Returns
+    -------
+    cache : `list` of `str`
+        the unique file paths that overlap the segments, in their
+        original order
+    """
+    out = []
+    for path in OrderedDict.fromkeys(cache):
+        try:
+            fileseg = file_segment(path)
+        except ValueError:  # cannot parse segment, so keep it
+            pass
+        else:
+            if not segments.intersects_segment(fileseg):
+                continue
+        out.append(path)
+    return out
+
+
+# -- trigger file index -------------------------------------------------------
+
+class TriggerFileIndex(object):
+    """An on-disk index of the trigger files for each channel and ETG
+
+    Files are stored in an SQLite database, with their GPS span and
+    modification time, along with the GPS times that have been searched
+    for each channel and ETG, so that repeated calls only need to search
+    the trigger directories for times that have not been searched before.
+
+    Times within ``latency`` seconds of the (wall-clock) time of a search
+    are not recorded as searched, so that the most recent directories are
+    searched again on the next call, to pick up files written since.
+    The modification times of the indexed files, and of the directories
+    that contain them, are also recorded, and the times covered by any
+    directory that has changed since (e.g. a file was added late, or
+    removed) are searched again; files are only checked in directories
+    that have changed.
+    Files written late to a directory in which no files had been indexed
+    are not noticed, so the database should be removed if trigger files
+    are reprocessed.
+
+    Parameters
+    ----------
+    path : `str`
+        the path of the SQLite database file, this will be created
+        if it doesn't exist
+
+    latency : `float`, optional
+        the number of seconds after which trigger files for a given
+        time are expected to have been written
+
+    timeout : `float`, optional
+        the number of seconds to wait for another process to release
+        a lock on the database
+
+    Examples
+    --------
+    >>> from gwsumm.triggers import TriggerFileIndex
+    >>> index = TriggerFileIndex('triggers.sqlite')
+    >>> cache = index.find('L1:GDS-CALIB_STRAIN', 'omicron',
+    ...                    1135641617, 1135728017)
+    """
+    def __init__(self, path, latency=3600, timeout=60):
+        self.path = path
+        self.latency = latency
+        self.timeout = timeout
+        with self._connect() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS files ('
+                         'channel TEXT, etg TEXT, path TEXT, '
+                         'gps_start REAL, gps_end REAL, mtime REAL, '
+                         'PRIMARY KEY (channel, etg, path))')
+            conn.execute('CREATE TABLE IF NOT EXISTS directories ('
+                         'channel TEXT, etg TEXT, path TEXT, mtime REAL, '
+                         'PRIMARY KEY (channel, etg, path))')
+            conn.execute('CREATE TABLE IF NOT EXISTS searches ('
+                         'channel TEXT, etg TEXT, '
+                         'gps_start REAL, gps_end REAL)')
+
+    def _connect(self):
+        return closing(sqlite3.connect(self.path, timeout=self.timeout))
+
+    def searched(self, channel, etg):
+        """Return the segments already searched for this channel and ETG
+        """
+        with self._connect() as conn:
+            rows = conn.execute('SELECT gps_start, gps_end FROM searches '
+                                'WHERE channel = ? AND etg = ?',
+                                (channel, etg))
+            return SegmentList(Segment(*row) for row in rows).coalesce()
+
+    def files(self, channel, etg, start, end):
+        """Return the indexed files for this channel and ETG
+
+        Parameters
+        ----------
+        channel : `str`
+            the name of the channel
+
+        etg : `str`
+            the name of the trigger generator
+
+        start : `float`
+            the GPS start time of interest
+
+        end : `float`
+            the GPS end time of interest
+
+        Returns
+        -------
+        cache : `list` of `str`
+            the paths of all indexed files that overlap ``[start, end)``,
+            sorted by their start time
+        """
+        with self._connect() as conn:
+            rows = conn.execute('SELECT path FROM files '
+                                'WHERE channel = ? AND etg = ? AND '
+                                'gps_start < ? AND gps_end > ? '
+                                'ORDER BY gps_start, path',
+                                (channel, etg, float(end), float(start)))
+            return [row[0] for row in rows]
+
+    def add(self, channel, etg, cache, searched=None):
+        """Add files to this index
+
+        Parameters
+        ----------
+        channel : `str`
+            the name of the channel
+
+        etg : `str`
+            the name of the trigger generator
+
+        cache : `list` of `str`
+            the paths (or URLs) of the files to add, any existing entries
+            for the same files are replaced
+
+        searched : `~gwpy.segments.Segment`, optional
+            the GPS segment for which ``cache`` is the complete list
+            of files
+        """
+        rows = []
+        for path in map(lambda url: urlparse(url).path, cache):
+            try:
+                start, end = file_segment(path)
+            except ValueError:  # cannot parse segment, so always match it
+                start, end = -float('inf'), float('inf')
+            try:
+                mtime = os.path.getmtime(path)
+            except OSError:
+                mtime = None
+            rows.append((channel, etg, path, float(start), float(end),
+                         mtime))
+        dirs = []
+        for path in set(os.path.dirname(row[2]) for row in rows):
+            try:
+                dirs.append((channel, etg, path, os.path.getmtime(path)))
+            except OSError:
+                continue
+        with self._connect() as conn, conn:
+            conn.executemany('INSERT OR REPLACE INTO files '
+                             '(channel, etg, path, gps_start, gps_end, '
+                             'mtime) VALUES (?, ?, ?, ?, ?, ?)', rows)
+            conn.executemany('INSERT OR REPLACE INTO directories '
+                             '(channel, etg, path, mtime) '
+                             'VALUES (?, ?, ?, ?)', dirs)
+            if searched is not None and abs(searched):
+                conn.execute('INSERT INTO searches '
+                             '(channel, etg, gps_start, gps_end) '
+                             'VALUES (?, ?, ?, ?)',
+                             (channel, etg, float(searched[0]),
+                              float(searched[1])))
+
+    def changed(self, channel, etg, start, end):
+        """Find the times covered by indexed directories that have changed
+
+        A directory has changed if its modification time is later than
+        when it was indexed (e.g. a file was added, renamed or removed).
+        Only the files in changed directories are checked, any that have
+        since been modified or removed are removed from the index, so that
+        they can be found again.
+
+        Returns
+        -------
+        changed : `~gwpy.segments.SegmentList`
+            the times (within ``[start, end)``) covered by changed
+            directories, i.e. up to the files indexed in the
+            neighbouring directories
+        """
+        with self._connect() as conn:
+            rows = conn.execute('SELECT path, gps_start, gps_end, mtime '
+                                'FROM files WHERE channel = ? AND etg = ? '
+                                'AND gps_start < ? AND gps_end > ?',
+                                (channel, etg, float(end),
+                                 float(start))).fetchall()
+            dirmtimes = dict(conn.execute(
+                'SELECT path, mtime FROM directories '
+                'WHERE channel = ? AND etg = ?', (channel, etg)))
+        bydir = OrderedDict()
+        for row in sorted(rows, key=lambda r: r[1]):
+            bydir.setdefault(os.path.dirname(row[0]), []).append(row)
+        dirs = list(bydir.items())
+        out = SegmentList()
+        stale = []
+        for i, (directory, files) in enumerate(dirs):
+            dirmtime = dirmtimes.get(directory)
+            if dirmtime is None:
+                continue
+            try:
+                changed = os.path.getmtime(directory) > dirmtime
+            except OSError:  # directory has gone
+                changed = True
+            if not changed:
+                continue
+            for path, _, _, mtime in files:
+                if mtime is None:  # never stat'd, so can't tell
+                    continue
+                try:
+                    if os.path.getmtime(path) != mtime:
+                        stale.append(path)
+                except OSError:  # file has gone
+                    stale.append(path)
+            # the directory covers the times between its neighbours
+            lo = max([start] + [f[2] for _, fs in dirs[:i] for f in fs])
+            hi = min([end] + [f[1] for _, fs in dirs[i+1:] for f in fs])
+            if hi > lo:
+                out.append(Segment(lo, hi))
+        if stale:
+            with self._connect() as conn, conn:
+                conn.executemany('DELETE FROM files WHERE channel = ? AND '
+                                 'etg = ? AND path = ?',
+                                 [(channel, etg, path) for path in stale])
+        return out.coalesce()
+
+    def find(self, channel, etg, start, end,
+             find_func=gwtrigfind.find_trigger_files, **kwargs):
+        """Find trigger files, searching only times not searched before
+
+        Parameters
+        ----------
+        channel : `str`
+            the name of the channel
+
+        etg : `str`
+            the name of the trigger generator
+
+        start : `float`
+            the GPS start time of interest
+
+        end : `float`
+            the GPS end time of interest
+
+        find_func : `callable`, optional
+            the function to call to search for new files, this should
+            have the same signature as
+            :func:`gwtrigfind.find_trigger_files` (the default)
+
+        **kwargs
+            other keyword arguments to pass to ``find_func``, these
+            are recorded as part of the ETG name in the index
+
+        Returns
+        -------
+        cache : `list` of `str`
+            the paths of all files that overlap ``[start, end)``
+        """
+        tag = ','.join([etg] + ['%s=%s' % item for
+                                item in sorted(kwargs.items())])
+        need = (SegmentList([Segment(start, end)]) -
+                self.searched(channel, tag))
+        need = (need | self.changed(channel, tag, start, end)).coalesce()
+        if need:
+            new = need.extent()
+            cache = find_func(channel, etg, new[0], new[1], **kwargs)
+            # don't mark recent times as searched, files may still arrive
+            final = min(new[1], float(to_gps('now')) - self.latency)
+            self.add(channel, tag, cache,
+                     searched=Segment(new[0], max(final, new[0])))
+        return self.files(channel, tag, start, end)
+
+
+def _get_trigger_index(index, config):
+    """Return the `TriggerFileIndex` configured for this analysis, if any
+    """
+    if index is None:
+        try:
+            index = config.get('trigfind', 'index')
+        except (NoSectionError, NoOptionError):
+            return None
+    if isinstance(index, string_types):
+        index = TriggerFileIndex(os.path.expanduser(index))
+    return index
+
+
+# -- binned event rates -------------------------------------------------------
+
+class EventRateCube(object):
+    """Counts of events in fixed time bins, for each of a set of column bins
+
+    The counts for each trigger table are accumulated once (see
+    `get_binned_rates`), so that the rate for any set of segments (e.g.
+    each state) can be taken from the counts, rather than re-binning all
+    events for each plot and state.
+
+    Parameters
+    ----------
+    counts : `numpy.ndarray`
+        2-D array of counts, one row per column bin, and one column per
+        time bin
+
+    t0 : `float`
+        the GPS start time of the first time bin
+
+    stride : `float`
+        the duration (seconds) of each time bin
+
+    segments : `~gwpy.segments.SegmentList`, optional
+        the segments for which events have been counted
+    """
+    def __init__(self, counts, t0, stride, segments=None):
+        self.counts = numpy.array(counts, dtype='int64', ndmin=2)
+        self.t0 = float(t0)
+        self.stride = float(stride)
+        self.segments = SegmentList(segments or [])
+
+    @property
+    def edges(self):
+        """The GPS edges of each time bin
+        """
+        return self.t0 + numpy.arange(self.counts.shape[1] + 1) * self.stride
+
+    def add(self, times, masks):
+        """Count new events
+
+        Parameters
+        ----------
+        times : `numpy.ndarray`
+            the time of each event
+
+        masks : `list` of `numpy.ndarray`
+            the boolean mask of events in each column bin
+        """
+        edges = self.edges
+        for i, mask in enumerate(masks):
+            self.counts[i] += numpy.histogram(times[mask], bins=edges)[0]
+
+
+def get_binned_rates(channel, etg, segments, stride, start, end,
+                     column=None, bins=None, operator='>=', filterstr=None,
+                     timecolumn=None, query=True, return_=True):
+    """Get the rate of events in each of a set of bins
+
+    The events for each channel and ETG are counted once into an
+    `EventRateCube` (stored in `globalv.TRIGGER_RATES`), with new events
+    counted as they are read, so the rate for each set of ``segments``
+    is taken from those counts; only time bins that are partly covered
+    by the ``segments``, or not yet counted, are counted again.
+
+    Parameters
+    ----------
+    channel : `str`
+        the name of the channel
+
+    etg : `str`
+        the name of the trigger generator
+
+    segments : `~gwpy.segments.SegmentList`
+        the segments for which to count events
+
+    stride : `float`
+        the duration (seconds) of each time bin
+
+    start : `float`
+        the GPS start time of the rate series
+
+    end : `float`
+        the GPS end time of the rate series
+
+    column : `str`, optional
+        the name of the column by which to bin events
+
+    bins : `list`, optional
+        the column bins, see
+        :meth:`gwpy.table.EventTable.binned_event_rates`
+
+    operator : `str`, optional
+        the operator with which to compare events to each bin, see
+        :meth:`gwpy.table.EventTable.binned_event_rates`
+
+    filterstr : `str`, optional
+        a filter to apply to events before counting
+
+    timecolumn : `str`, optional
+        the name of the time column
+
+    query : `bool`, optional
+        count new events into the stored `EventRateCube`, default: `True`,
+        otherwise the stored counts are only read
+
+    return_ : `bool`, optional
+        return the rates, default: `True`
+
+    Returns
+    -------
+    rates : `list` of `~gwpy.timeseries.TimeSeries`
+        the rate of events (Hz) in ``segments`` for each bin, or a single
+        rate if ``column`` is not given
+    """
+    store = globalv.TRIGGERS['%s,%s' % (str(channel), etg.lower())]
+    bins, opfunc = _parse_rate_bins(column, bins, operator)
+    nstride = int(ceil((end - start) / stride))
+    key = ','.join(map(str, (channel, etg.lower(), column, bins, operator,
+                             filterstr, float(start), float(stride),
+                             nstride)))
+
+    def _count(cube, segs):
+        table = keep_in_segments(store, segs, etg)
+        if filterstr is not None:
+            table = table.filter(filterstr)
+        if timecolumn:
+            times = numpy.asarray(table[timecolumn], dtype='float64')
+        else:
+            times = numpy.asarray(get_times(table, etg), dtype='float64')
+        cube.add(times, _get_rate_masks(table, column, bins, opfunc))
+
+    # count new events
+    try:
+        cube = globalv.TRIGGER_RATES[key]
+    except KeyError:
+        cube = EventRateCube(numpy.zeros((len(bins), nstride)), start, stride)
+        if query:
+            globalv.TRIGGER_RATES[key] = cube
+    if query:
+        new = store.meta['segments'] - cube.segments
+        if abs(new):
+            _count(cube, new)
+            cube.segments = (cube.segments | new).coalesce()
+    if not return_:
+        return
+
+    # take counts for time bins covered by the segments (and counted),
+    # and count events again for the other bins
+    edges = cube.edges
+    segments = SegmentList(segments).coalesce()
+    livetime = get_livetime(segments, edges[:-1], edges[1:])
+    full = (numpy.isclose(livetime, stride) & numpy.isclose(
+        get_livetime(cube.segments, edges[:-1], edges[1:]), stride))
+    partial = numpy.flatnonzero((livetime > 0) & ~full)
+    out = EventRateCube(cube.counts * full, start, stride)
+    if partial.size:
+        _count(out, segments & SegmentList(
+            Segment(edges[i], edges[i+1]) for i in partial))
+
+    rates = []
+    for bin_, counts in zip(bins, out.counts):
+        rates.append(TimeSeries(counts / float(stride), t0=start, dt=stride,
+                                unit='Hz', name='Event rate'))
+        if column:
+            rates[-1].name = ' '.join((column, str(operator), str(bin_)))
+    return rates
+
+
+def _parse_rate_bins(column, bins, operator):
+    """Parse the column bins for `get_binned_rates`
+
+    This follows :meth:`gwpy.table.EventTable.binned_event_rates`.
+    """
+    if not column:
+        return [None], None
+    if not bins:
+        bins = [(-numpy.inf, numpy.inf)]
+    if operator == 'in' and not isinstance(bins[0], tuple):
+        return [(bin_, bins[i+1]) for i, bin_ in enumerate(bins[:-1])], None
+    if isinstance(operator, string_types):
+        return list(bins), parse_operator(operator)
+    return list(bins), operator
+
+
+def _get_rate_masks(table, column, bins, opfunc):
+    """Get the boolean mask of events in each bin for `get_binned_rates`
+    """
+    if not column:
+        return [numpy.ones(len(table), dtype=bool)]
+    coldata = numpy.asarray(table[column])
+    masks = []
+    for bin_ in bins:
+        if isinstance(bin_, tuple):
+            masks.append((coldata >= bin_[0]) & (coldata < bin_[1]))
+        else:
+            masks.append(numpy.asarray(opfunc(coldata, bin_), dtype=bool))
+    return masks
+
+
+# -- loudest events -----------------------------------------------------------
+
+class LoudestEvents(object):
+    """Candidates for the loudest events in a trigger table
+
+    Only those events that rank at least as high as the quietest of the
+    loudest events (the ``threshold``) are kept, so that the loudest
+    events can be updated from new events alone (see
+    `get_loudest_events`), rather than by sorting all events each time.
+
+    Parameters
+    ----------
+    rank : `str`
+        the name of the column by which to rank events
+
+    n : `int`
+        the number of loudest events to find
+
+    dt : `float`, optional
+        the minimum separation (seconds) between loudest events
+
+    candidates : `~gwpy.table.EventTable`, optional
+        the candidate events
+
+    segments : `~gwpy.segments.SegmentList`, optional
+        the segments for which events have been considered
+
+    threshold : `float`, optional
+        the rank of the quietest of the loudest events, all events
+        ranked below this have been discarded
+
+    complete : `bool`, optional
+        `True` if no events have ever been discarded
+    """
+    def __init__(self, rank, n, dt=0, candidates=None, segments=None,
+                 threshold=-numpy.inf, complete=True):
+        self.rank = rank
+        self.n = int(n)
+        self.dt = float(dt)
+        self.candidates = candidates
+        self.segments = SegmentList(segments or [])
+        self.threshold = float(threshold)
+        self.complete = bool(complete)
+
+
+def get_loudest_events(channel, etg, segments, rank, n, dt=0,
+                       filterstr=None, timecolumn=None, state=None):
+    """Find the loudest events, with a minimum separation in time
+
+    The candidate loudest events for each channel, ETG, rank column and
+    state are stored as `LoudestEvents` (in `globalv.TRIGGER_LOUDEST`),
+    and only events in new ``segments`` are ranked against them; all
+    events are ranked again only if the new events displace so many of
+    the loudest events that the discarded events are needed.
+
+    Parameters
+    ----------
+    channel : `str`
+        the name of the channel
+
+    etg : `str`
+        the name of the trigger generator
+
+    segments : `~gwpy.segments.SegmentList`
+        the segments in which to find events
+
+    rank : `str`
+        the name of the column by which to rank events
+
+    n : `int`
+        the number of loudest events to find
+
+    dt : `float`, optional
+        the minimum separation (seconds) between loudest events, see
+        `find_loudest`
+
+    filterstr : `str`, optional
+        a filter to apply to events before ranking
+
+    timecolumn : `str`, optional
+        the name of the time column
+
+    state : `str`, optional
+        the name of the state for these ``segments``
+
+    Returns
+    -------
+    table : `~gwpy.table.EventTable`
+        the loudest events, in descending order of ``rank``
+    """
+    store = globalv.TRIGGERS['%s,%s' % (str(channel), etg.lower())]
+    key = ','.join(map(str, (channel, etg.lower(), rank, n, float(dt),
+                             filterstr, state)))
+    segments = SegmentList(segments).coalesce()
+    span = store.meta['segments'] & segments
+
+    def _read(segs):
+        table = keep_in_segments(store, segs, etg)
+        if filterstr is not None:
+            table = table.filter(filterstr)
+        return table
+
+    def _rank(loudest, table):
+        if timecolumn:
+            times = table[timecolumn]
+        else:
+            times = get_times(table, etg)
+        ranks = numpy.asarray(table[rank], dtype='float64')
+        idx = find_loudest(times, ranks, n, dt=dt)
+        # events ranked below the old threshold may have been discarded
+        if not loudest.complete and (
+                (ranks[idx] >= loudest.threshold).sum() < loudest.n):
+            return None
+        if idx.size:
+            loudest.threshold = ranks[idx[-1]]
+        keep = ranks >= loudest.threshold
+        loudest.complete &= bool(keep.all())
+        loudest.candidates = table[keep]
+        return table[idx]
+
+    loudest = globalv.TRIGGER_LOUDEST.get(key)
+    out = None
+    # rank new events against the stored candidates
+    if loudest is not None and not abs(loudest.segments - segments):
+        table = _read(span - loudest.segments)
+        if loudest.candidates is not None:
+            table = vstack_tables([loudest.candidates, table],
+                                  metadata_conflicts='silent')
+        out = _rank(loudest, table)
+    # otherwise rank all events
+    if out is None:
+        loudest = globalv.TRIGGER_LOUDEST[key] = LoudestEvents(rank, n, dt)
+        out = _rank(loudest, _read(span))
+    loudest.segments = span
+    out.meta['segments'] = span
+    return out
+
+
+def find_loudest(times, ranks, n, dt=0, threshold=None):
+    """Find the loudest events, with a minimum separation in time
+
+    Events are taken in descending order of rank, ignoring any event
+    within ``dt`` seconds of a louder event already taken.
+
+    Parameters
+    ----------
+    times : `numpy.ndarray`
+        the time of each event
+
+    ranks : `numpy.ndarray`
+        the rank of each event
+
+    n : `int`
+        the maximum number of events to find
+
+    dt : `float`, optional
+        the minimum separation (seconds) between events
+
+    threshold : `float`, optional
+        the minimum rank of events to find
+
+    Returns
+    -------
+    index : `numpy.ndarray`
+        the index of each of the loudest events, in descending order of
+        rank
+    """
+    times = numpy.asarray(times, dtype='float64')
+    ranks = numpy.asarray(ranks, dtype='float64')
+    order = numpy.argsort(ranks, kind='mergesort')[::-1]
+    if threshold is not None:
+        order = order[ranks[order] >= threshold]
+    if not dt:
+        return order[:n]
+    loudest = []
+    taken = numpy.zeros(0)  # sorted times of the events taken so far
+    chunk = max(n, 256)
+    for i in range(0, order.size, chunk):
+        block = order[i:i+chunk]
+        # discard events near those already taken in one pass
+        if taken.size:
+            t = times[block]
+            j = taken.searchsorted(t)
+            after = taken[numpy.minimum(j, taken.size - 1)]
+            before = taken[numpy.maximum(j - 1, 0)]
+            block = block[(numpy.abs(after - t) >= dt) &
+                          (numpy.abs(t - before) >= dt)]
+        # then take events in order, as each may exclude the next
+        for idx in block:
+            t = times[idx]
+            j = taken.searchsorted(t)
+            if ((j < taken.size and taken[j] - t < dt) or
+                    (j and t - taken[j-1] < dt)):
+                continue
+            taken = numpy.insert(taken, j, t)
+            loudest.append(idx)
+            if len(loudest) == n:
+                return numpy.array(loudest, dtype=int)
+    return numpy.array(loudest, dtype=int)